@@ -0,0 +1,693 @@
+import numpy as np
+from utils.params import r_c, jail_period, kill_threshold, citizen_vision, cop_vision
+from utils.population import STATES, STATUSES
+from agents.authority import (
+    ACCOUNTS,
+    settle_books,
+    settle_books_sequential,
+    loan_ceilings,
+)
+
+
+# Integer codes of the citizen state and status, index into STATES and STATUSES
+CALM, REVOLT, JAIL = (STATES.index(state) for state in ("Calm", "Revolt", "Jail"))
+NONE, RICH, MIDDLE, POOR = (
+    STATUSES.index(status) for status in ("None", "Rich", "Middle", "Poor")
+)
+
+
+class ArrayEngine:
+    """
+    The array engine of the World. It stores the whole population as NumPy
+    arrays (one array per attribute) and applies the rules of Citizen and Cop
+    to every agent at once instead of stepping the agents one by one.
+
+    The engine can also hold several replicates of the same World at once, as
+    used by the Ensemble. Every agent then carries the index of its replicate,
+    the count rasters get a leading replicate axis and the bank keeps one
+    ledger per replicate, so one step advances every replicate together.
+
+    The rules are the same as in agents/citizen.py and agents/authority.py,
+    and the agents take their turns in the same order as in the mesa engine,
+    so every agent sees the moves, revolts and jailings of the agents before
+    it (see Turns). One step runs the phases in this order:
+        1. agents take their turns: citizens count their neighbors, update
+           their state, move and kill cops, jailed citizens serve their time
+           and cops kill veterans, move to empty cells and jail revolting
+           citizens
+        2. citizens free at the end of their turn trade and settle their
+           books with the bank, one after the other in citizen order with the
+           sequential ledger
+        3. every citizen measures its confidence
+        4. killed agents are removed
+
+    Attributes:
+        model: World model, or Ensemble model
+        width, height: dimensions of the grid, cell id is
+            replicate * width * height + x * height + y
+        populations: population counters of every replicate
+        replicates: number of replicates stepped together
+        rng: NumPy random generator seeded from the model random generator
+        rep, x, y: replicate and position of every citizen
+        turn, cop_turn: cell every citizen and cop was placed on, which
+            orders their turns
+        hardship, risk_aversion, grievance, confidence, net_risk,
+        arrest_probability, savings, loans, wallet, wealth: per citizen floats
+        state, status: per citizen codes, see STATES and STATUSES
+        j_time, n_j: jail timestep and total number of jailing of every citizen
+        n_revolt, n_cops: revolting citizens and cops a citizen saw when it
+            last looked around
+        cop_rep, cop_x, cop_y: replicate and position of every cop
+    """
+
+    def __init__(self, model, gridsize, populations=None):
+        self.model = model
+        self.width = gridsize
+        self.height = gridsize
+        self.populations = populations or [model.population]
+        self.replicates = len(self.populations)
+        self.rng = np.random.default_rng(model.random.getrandbits(64))
+
+    def placement(self):
+        """
+        Fills every cell with a cop, a citizen or nothing with the densities
+        of the model, in the same way World.placement does cell by cell, in
+        every replicate. Agents are stored grouped by replicate.
+        """
+        model = self.model
+        size = self.width * self.height
+        cells = self.replicates * size
+        cop = self.rng.random(cells) < model.cop_density
+        citizen = ~cop & (
+            self.rng.random(cells) < model.cop_density + model.citizen_density
+        )
+
+        # Agents take their turns in the order of the cells they were placed on
+        self.cop_turn = np.flatnonzero(cop)
+        self.cop_rep, cop_cells = np.divmod(self.cop_turn, size)
+        self.cop_x, self.cop_y = np.divmod(cop_cells, self.height)
+
+        self.turn = np.flatnonzero(citizen)
+        self.rep, citizen_cells = np.divmod(self.turn, size)
+        n = len(citizen_cells)
+        self.x, self.y = np.divmod(citizen_cells, self.height)
+        self.hardship = self.rng.random(n)
+        self.risk_aversion = self.rng.random(n)
+        self.grievance = np.zeros(n)
+        self.confidence = np.zeros(n)
+        self.net_risk = np.zeros(n)
+        self.arrest_probability = np.zeros(n)
+        self.state = np.full(n, CALM, dtype=np.int8)
+        self.status = np.full(n, NONE, dtype=np.int8)
+        self.j_time = np.zeros(n, dtype=np.int64)
+        self.n_j = np.zeros(n, dtype=np.int64)
+        self.n_revolt = np.zeros(n, dtype=np.int64)
+        self.n_cops = np.zeros(n, dtype=np.int64)
+        self.savings = np.zeros(n)
+        self.loans = np.zeros(n)
+        self.wallet = self.rng.integers(1, model.rich_threshold + 2, n).astype(float)
+        self.wealth = np.zeros(n)
+
+        # The bank keeps one ledger per replicate
+        bank = model.bank
+        for name in ACCOUNTS:
+            setattr(bank, name, np.zeros(self.replicates))
+
+    @property
+    def citizens(self):
+        return len(self.x)
+
+    @property
+    def cops(self):
+        return len(self.cop_x)
+
+    def cells(self, rep, x, y):
+        return (rep * self.width + x) * self.height + y
+
+    def per_replicate(self, value):
+        """
+        A model value which is either shared by every replicate or kept per
+        replicate, as an array with one value per replicate.
+        """
+        return np.broadcast_to(value, (self.replicates,))
+
+    def offsets(self, radius):
+        d = np.arange(-radius, radius + 1)
+        dx, dy = np.meshgrid(d, d, indexing="ij")
+        center = (dx == 0) & (dy == 0)
+        return dx[~center], dy[~center]
+
+    def buckets(self, rep, x, y):
+        """
+        Groups the positions by cell. Returns the indices sorted by cell, the
+        start of every cell in the sorted indices and the count of every cell.
+        """
+        cells = self.cells(rep, x, y)
+        order = np.argsort(cells, kind="stable")
+        count = np.bincount(cells, minlength=self.replicates * self.width * self.height)
+        start = np.cumsum(count) - count
+        return order, start, count
+
+    def turn_levels(self, rep, x, y, key, active, reach):
+        """
+        Splits the agents taking a turn into levels which can be stepped at
+        once. An agent reads and changes the grid within reach / 2 cells of
+        its position, so two agents closer than reach + 1 cells may depend on
+        each other, unless neither is active: calm citizens only move, and no
+        calm citizen reads where the others are. The later of two dependent
+        agents in turn order (key) goes in a later level than the earlier
+        one, so the agents of a level are independent and stepping the levels
+        in order gives the same result as stepping the agents in turn order.
+        Returns the indices of the agents of every level.
+        """
+        n = len(x)
+        order, start, count = self.buckets(rep, x, y)
+        sources = np.flatnonzero(active)
+        d = np.arange(-reach, reach + 1)
+        dx, dy = (c.ravel() for c in np.meshgrid(d, d, indexing="ij"))
+        nx = x[sources, None] + dx
+        ny = y[sources, None] + dy
+        valid = (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+        cell = np.where(valid, self.cells(rep[sources, None], nx, ny), 0).ravel()
+        counts = np.where(valid.ravel(), count[cell], 0)
+        first = np.repeat(np.repeat(sources, len(dx)), counts)
+        second = order[expand(start[cell], counts)]
+        # Two active agents find each other, keep the pair once
+        keep = (first != second) & (~active[second] | (first < second))
+        first, second = first[keep], second[keep]
+        later = key[second] > key[first]
+        first, second = np.where(later, first, second), np.where(later, second, first)
+
+        waiting = np.bincount(second, minlength=n)
+        edges = np.argsort(first, kind="stable")
+        first, second = first[edges], second[edges]
+        bounds = np.searchsorted(first, np.arange(n + 1))
+        levels = []
+        level = np.flatnonzero(waiting == 0)
+        while len(level):
+            levels.append(level)
+            after = second[expand(bounds[level], bounds[level + 1] - bounds[level])]
+            after, drops = np.unique(after, return_counts=True)
+            waiting[after] -= drops
+            level = after[waiting[after] == 0]
+        return levels
+
+    def take_turns(self):
+        """
+        Steps the citizens and the cops in turn order, see Turns. Returns the
+        Turns with what happened during the step.
+        """
+        turns = Turns(self)
+        waiting = (self.state == JAIL) & (self.j_time < jail_period)
+        turns.wait(np.flatnonzero(waiting))
+
+        citizens = np.flatnonzero(~waiting)
+        split = len(citizens)
+        pad = turns.pad
+        levels = self.turn_levels(
+            np.concatenate((self.rep[citizens], self.cop_rep)),
+            np.concatenate((self.x[citizens], self.cop_x)),
+            np.concatenate((self.y[citizens], self.cop_y)),
+            np.concatenate((self.turn[citizens], self.cop_turn)),
+            np.concatenate(
+                (
+                    (self.state[citizens] == REVOLT) | turns.revolts[citizens],
+                    np.ones(self.cops, dtype=bool),
+                )
+            ),
+            2 * pad,
+        )
+        for level in levels:
+            cop = level >= split
+            turns.citizen_turns(citizens[level[~cop]])
+            turns.cop_turns(level[cop] - split)
+        return turns
+
+    def sigmoid(self, x):
+        return 1 / (1 + np.exp(-x))
+
+    def do_business(self, free, before):
+        """
+        Every free citizen with money (or a bank able to loan) trades with a
+        random citizen at its location with a 50% chance, giving $5 or $2.
+        Returns what every citizen got from traders after it, which in the
+        sequential ledger it only settles at its next step.
+
+        As in Citizen.do_business a citizen trades during its turn, after it
+        moved: the citizens before it in citizen order are on the cells they
+        moved to, the ones after it still on the cells they stood on before
+        the moves, given as cell ids in before.
+        """
+        bank = self.model.bank
+        n = self.citizens
+        order, start, _ = self.buckets(self.rep, self.x, self.y)
+        cells = self.cells(self.rep, self.x, self.y)
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n) - start[cells[order]]
+        # Citizens sorted by the cell they stood on, then by citizen
+        keys = before * n + np.arange(n)
+        old_order = np.argsort(keys, kind="stable")
+        old_keys = keys[old_order]
+        old_upto = np.searchsorted(old_keys, cells[free] * n + free, side="right")
+        old_end = np.searchsorted(old_keys, (cells[free] + 1) * n)
+
+        # The citizens before a citizen on its new cell and after it on its
+        # old cell are its cellmates at its turn
+        ahead = rank[free]
+        behind = old_end - old_upto
+        mates = ahead + behind
+
+        # The trade every citizen would make if it has money, drawn up front
+        chosen = (mates > 0) & (self.rng.random(len(free)) < 0.5)
+        traders = free[chosen]
+        pick = np.floor(self.rng.random(len(traders)) * mates[chosen]).astype(np.int64)
+        ahead, old_upto = ahead[chosen], old_upto[chosen]
+        customers = np.empty(len(traders), dtype=np.int64)
+        new = pick < ahead
+        customers[new] = order[start[cells[traders[new]]] + pick[new]]
+        customers[~new] = old_order[old_upto[~new] + pick[~new] - ahead[~new]]
+        amount = np.where(self.rng.random(len(traders)) < 0.5, 5.0, 2.0)
+
+        # Whether a trader has money is read at its turn, as in do_business of
+        # the citizens: its wallet holds what the traders before it gave it
+        # and with the sequential ledger the bank has settled the citizens
+        # before it. That only depends on the trades of the citizens before
+        # it, so the check is repeated until no trader changes, which fixes
+        # at least one more trader in citizen order every round.
+        trading = np.ones(len(traders), dtype=bool)
+        while True:
+            early = trading & (customers > traders)
+            wallet = self.wallet + np.bincount(
+                customers[early], weights=amount[early], minlength=self.citizens
+            )
+            if bank.batched:
+                loanable = bank.bank_to_loan[self.rep[traders]] > 0
+            else:
+                books = wallet - np.bincount(
+                    traders[trading], weights=amount[trading], minlength=self.citizens
+                )
+                ceilings = np.zeros(self.citizens)
+                ceilings[free] = loan_ceilings(
+                    bank,
+                    self.model.legitimacy,
+                    self.rep[free],
+                    self.replicates,
+                    books[free],
+                    self.savings[free],
+                    self.loans[free],
+                )
+                loanable = ceilings[traders] > 0
+            has_money = (self.savings[traders] > 0) | (wallet[traders] > 0) | loanable
+            if (has_money == trading).all():
+                break
+            trading = has_money
+
+        traders = traders[trading]
+        customers = customers[trading]
+        amount = amount[trading]
+        self.wallet -= np.bincount(traders, weights=amount, minlength=self.citizens)
+        self.wallet += np.bincount(customers, weights=amount, minlength=self.citizens)
+        late = customers < traders
+        return np.bincount(
+            customers[late], weights=amount[late], minlength=self.citizens
+        )
+
+    def balance_books(self, free, late):
+        """
+        Settles the books of every free citizen with the bank in one pass,
+        with agents.authority.settle_books_sequential or settle_books for the
+        batched ledger. late is what the citizens got after settling, see
+        do_business.
+        """
+        bank = self.model.bank
+        if bank.batched:
+            settle = settle_books
+        else:
+            settle = settle_books_sequential
+            self.wallet -= late
+        wallet, savings, loans, wealth = settle(
+            bank,
+            self.model.legitimacy,
+            self.rep[free],
+            self.replicates,
+            self.wallet[free],
+            self.savings[free],
+            self.loans[free],
+        )
+        self.wealth[free] = wealth
+        self.wallet[free] = wallet
+        self.savings[free] = savings
+        self.loans[free] = loans
+        if not bank.batched:
+            self.wallet += late
+
+    def update_status(self, free):
+        """
+        Updates the status of the given citizens based on the rich_threshold.
+        """
+        status = self.status[free]
+        savings = self.savings[free]
+        loans = self.loans[free]
+        status = np.where(savings > self.model.rich_threshold, RICH, status)
+        status = np.where((savings < 10) & (loans < 10), MIDDLE, status)
+        status = np.where(loans > 10, POOR, status)
+        self.status[free] = status
+
+    def measure_confidence(self):
+        model = self.model
+        if model.include_wealth:
+            mean = self.per_replicate(model.mean)[self.rep]
+            zero = mean == 0
+            self.hardship = np.where(
+                zero, 0, 1 - self.sigmoid(self.wealth / np.where(zero, 1, mean))
+            )
+
+        self.grievance = self.hardship * (1 - model.legitimacy)
+        # Citizen.measure_confidence compares the status with "Jail", which a
+        # status never is, so the jail period exponent is always 0
+        n_g = self.n_revolt + 1
+        self.arrest_probability = 1 - np.exp(
+            -1 * model.ap_constant * (self.n_cops / n_g)
+        )
+        self.net_risk = self.arrest_probability * self.risk_aversion
+        self.confidence = self.grievance - self.net_risk
+
+    def remove_citizens(self, killed):
+        keep = np.ones(self.citizens, dtype=bool)
+        keep[killed] = False
+        for name in (
+            "rep",
+            "turn",
+            "x",
+            "y",
+            "hardship",
+            "risk_aversion",
+            "grievance",
+            "confidence",
+            "net_risk",
+            "arrest_probability",
+            "state",
+            "status",
+            "j_time",
+            "n_j",
+            "n_revolt",
+            "n_cops",
+            "savings",
+            "loans",
+            "wallet",
+            "wealth",
+        ):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def remove_cops(self, killed):
+        keep = np.ones(self.cops, dtype=bool)
+        keep[killed] = False
+        self.cop_rep = self.cop_rep[keep]
+        self.cop_turn = self.cop_turn[keep]
+        self.cop_x = self.cop_x[keep]
+        self.cop_y = self.cop_y[keep]
+
+    def update_population(self):
+        """
+        Loads the counts of the arrays into the population counters of every
+        replicate.
+        """
+        cells = len(STATUSES) * len(STATES)
+        tables = np.bincount(
+            self.rep * cells + self.status.astype(np.int64) * len(STATES) + self.state,
+            minlength=self.replicates * cells,
+        ).reshape(self.replicates, cells)
+        cops = np.bincount(self.cop_rep, minlength=self.replicates)
+        for population, table, count in zip(self.populations, tables, cops):
+            population.load(table.tolist(), int(count))
+
+    def step(self):
+        before = self.cells(self.rep, self.x, self.y)
+        turns = self.take_turns()
+        if self.model.include_wealth:
+            free = np.flatnonzero(turns.free)
+            late = self.do_business(free, before)
+            self.balance_books(free, late)
+            self.update_status(free)
+        self.measure_confidence()
+
+        if turns.killed_cops.any():
+            self.remove_cops(np.flatnonzero(turns.killed_cops))
+        if turns.killed_citizens.any():
+            self.remove_citizens(np.flatnonzero(turns.killed_citizens))
+        self.update_population()
+
+
+class Turns:
+    """
+    One step of the agents of an ArrayEngine in the turn order of the mesa
+    engine, where the agents are stepped in the order they were placed, cell
+    by cell. The levels of ArrayEngine.turn_levels are stepped one after the
+    other, all the agents of a level at once, against count rasters which are
+    updated as the agents move and change state, so every agent sees what
+    the agents before it did. The random numbers of every agent are drawn up
+    front.
+
+    The rasters are flat, with a border of pad cells around the grid of every
+    replicate so the neighborhood of any cell is a fixed set of offsets. The
+    border is occupied, so cops never move onto it.
+
+    Attributes:
+        engine: ArrayEngine stepped
+        pad: width of the border
+        stride: padded height, the offset of one step in x
+        revolt, cops, veterans, occupied: number of revolting citizens, cops,
+            citizens jailed more than kill_threshold times and agents on
+            every cell
+        sight, cop_sight, moves: offsets of the neighborhood seen by the
+            citizens, seen by the cops and moved to by the cops
+        revolts: whether every citizen revolts when it updates its state
+        steps, kill_draws: draws of the moves and kills of every citizen
+        cop_draws: draws of the moves, jail chance and jail pick of every cop
+        free: whether every citizen was free at the end of its turn
+        killed_citizens, killed_cops: agents killed during the step
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        model = engine.model
+        rng = engine.rng
+        self.pad = max(citizen_vision, cop_vision, 1)
+        self.width = engine.width + 2 * self.pad
+        self.stride = engine.height + 2 * self.pad
+
+        n = engine.citizens
+        self.revolts = (engine.confidence > model.active_threshold) & (
+            rng.random(n) > r_c
+        )
+        self.steps = rng.random((2, n))
+        self.kill_draws = rng.random(n)
+        self.cop_draws = rng.random((3, engine.cops))
+        self.free = np.zeros(n, dtype=bool)
+        self.killed_citizens = np.zeros(n, dtype=bool)
+        self.killed_cops = np.zeros(engine.cops, dtype=bool)
+
+        cells = self.cells(engine.rep, engine.x, engine.y)
+        cop_cells = self.cells(engine.cop_rep, engine.cop_x, engine.cop_y)
+        size = engine.replicates * self.width * self.stride
+        self.revolt = np.bincount(
+            cells, weights=engine.state == REVOLT, minlength=size
+        ).astype(np.int64)
+        self.veterans = np.bincount(
+            cells, weights=engine.n_j > kill_threshold, minlength=size
+        ).astype(np.int64)
+        self.cops = np.bincount(cop_cells, minlength=size)
+        border = np.ones((engine.replicates, self.width, self.stride), dtype=np.int64)
+        border[:, self.pad : -self.pad, self.pad : -self.pad] = 0
+        self.occupied = (
+            np.bincount(cells, minlength=size)
+            + np.bincount(cop_cells, minlength=size)
+            + border.ravel()
+        )
+
+        self.sight = self.offsets(citizen_vision)[0]
+        self.cop_sight = self.offsets(cop_vision)[0]
+        self.moves, self.move_x, self.move_y = self.offsets(1)
+
+    def cells(self, rep, x, y):
+        return (rep * self.width + x + self.pad) * self.stride + y + self.pad
+
+    def offsets(self, radius):
+        dx, dy = self.engine.offsets(radius)
+        return dx * self.stride + dy, dx, dy
+
+    def add(self, raster, cells, weights):
+        np.add.at(raster, cells, np.asarray(weights, dtype=np.int64))
+
+    def wait(self, jailed):
+        """
+        Citizens staying in jail this step only count their time. They read
+        and change nothing the other agents see, so they take no turn.
+        """
+        self.engine.j_time[jailed] += 1
+
+    def citizen_turns(self, idx):
+        """
+        Turn of independent citizens: the jailed ones serve their time, the
+        free ones look around, update their state, move and kill cops.
+        """
+        engine = self.engine
+        jailed = engine.state[idx] == JAIL
+        self.serve_jail(idx[jailed])
+        idx = idx[~jailed]
+        if len(idx) == 0:
+            return
+
+        cells = self.cells(engine.rep[idx], engine.x[idx], engine.y[idx])
+        n_revolt = self.revolt[cells[:, None] + self.sight].sum(1)
+        cops_seen = self.cops[cells[:, None] + self.sight]
+        n_cops = cops_seen.sum(1)
+        engine.n_revolt[idx] = n_revolt
+        engine.n_cops[idx] = n_cops
+        was = engine.state[idx] == REVOLT
+        revolt = self.revolts[idx]
+        engine.state[idx] = np.where(revolt, REVOLT, CALM)
+        self.free[idx] = True
+
+        # Every step to any cell of the Moore neighborhood, staying in place
+        # included, is the product of an x and a y step drawn independently
+        for coord, size, draw in (
+            (engine.x, engine.width, self.steps[0]),
+            (engine.y, engine.height, self.steps[1]),
+        ):
+            c = coord[idx]
+            low = np.where(c > 0, -1, 0)
+            high = np.where(c < size - 1, 1, 0)
+            coord[idx] = c + low + np.floor(draw[idx] * (high - low + 1)).astype(
+                coord.dtype
+            )
+        moved = self.cells(engine.rep[idx], engine.x[idx], engine.y[idx])
+        both = np.concatenate((cells, moved))
+        veteran = engine.n_j[idx] > kill_threshold
+        self.add(self.revolt, both, np.concatenate((-1 * was, revolt)))
+        self.add(self.occupied, both, np.repeat((-1, 1), len(idx)))
+        self.add(self.veterans, both, np.concatenate((-1 * veteran, veteran)))
+
+        # Revolting citizens outnumbering the cops around them kill one of them
+        killers = (
+            revolt
+            & (n_cops > 0)
+            & ((n_revolt + 1 - n_cops) >= (8 * citizen_vision) // 2)
+        )
+        if killers.any():
+            column, within = pick(cops_seen[killers], self.kill_draws[idx[killers]])
+            targets = cells[killers] + self.sight[column]
+            cop_cells = self.cells(engine.cop_rep, engine.cop_x, engine.cop_y)
+            victims = members(cop_cells, np.arange(engine.cops), targets, within)
+            self.killed_cops[victims] = True
+
+    def serve_jail(self, idx):
+        """
+        Jailed citizens count their time and are released once it crosses
+        the jail period.
+        """
+        engine = self.engine
+        engine.j_time[idx] += 1
+        idx = idx[engine.j_time[idx] > jail_period]
+        engine.state[idx] = np.where(self.revolts[idx], REVOLT, CALM)
+        engine.j_time[idx] = 0
+        engine.n_j[idx] += 1
+        self.free[idx] = True
+        cells = self.cells(engine.rep[idx], engine.x[idx], engine.y[idx])
+        self.add(self.revolt, cells, engine.state[idx] == REVOLT)
+        self.add(self.veterans, cells, engine.n_j[idx] == kill_threshold + 1)
+
+    def cop_turns(self, idx):
+        """
+        Turn of independent cops: they look around, kill the veterans they
+        see, move to an empty neighboring cell and jail one of the revolting
+        citizens they saw.
+        """
+        if len(idx) == 0:
+            return
+        engine = self.engine
+        model = engine.model
+        rep = engine.cop_rep[idx]
+        cells = self.cells(rep, engine.cop_x[idx], engine.cop_y[idx])
+
+        seen = self.veterans[cells[:, None] + self.cop_sight].sum(1)
+        if seen.any():
+            kills = np.bincount(rep, weights=seen, minlength=engine.replicates)
+            if isinstance(model.agents_killed, np.ndarray):
+                model.agents_killed += kills.astype(model.agents_killed.dtype)
+            else:
+                model.agents_killed += int(kills.sum())
+            killers = seen > 0
+            veterans = np.flatnonzero(engine.n_j > kill_threshold)
+            distance = np.maximum(
+                abs(engine.x[veterans] - engine.cop_x[idx[killers], None]),
+                abs(engine.y[veterans] - engine.cop_y[idx[killers], None]),
+            )
+            near = (
+                (engine.rep[veterans] == rep[killers, None])
+                & (distance > 0)
+                & (distance <= cop_vision)
+            )
+            self.killed_citizens[veterans[near.any(0)]] = True
+
+        revolt_seen = self.revolt[cells[:, None] + self.cop_sight]
+        jailers = (
+            self.cop_draws[1, idx] > engine.per_replicate(model.legitimacy)[rep]
+        ) & (revolt_seen.sum(1) > 0)
+
+        empty = self.occupied[cells[:, None] + self.moves] == 0
+        count = empty.sum(1)
+        movers = np.flatnonzero(count > 0)
+        k = np.floor(self.cop_draws[0, idx[movers]] * count[movers])
+        column = np.argmax(empty[movers].cumsum(1) > k[:, None], axis=1)
+        moved = cells[movers] + self.moves[column]
+        both = np.concatenate((cells[movers], moved))
+        self.add(self.occupied, both, np.repeat((-1, 1), len(movers)))
+        self.add(self.cops, both, np.repeat((-1, 1), len(movers)))
+        engine.cop_x[idx[movers]] += self.move_x[column]
+        engine.cop_y[idx[movers]] += self.move_y[column]
+
+        # The revolting citizens seen before moving are jailed after it
+        if jailers.any():
+            column, within = pick(revolt_seen[jailers], self.cop_draws[2, idx[jailers]])
+            targets = cells[jailers] + self.cop_sight[column]
+            revolting = np.flatnonzero(engine.state == REVOLT)
+            revolting_cells = self.cells(
+                engine.rep[revolting], engine.x[revolting], engine.y[revolting]
+            )
+            jailed = members(revolting_cells, revolting, targets, within)
+            engine.state[jailed] = JAIL
+            self.add(self.revolt, targets, -1)
+
+
+def expand(starts, counts):
+    """
+    The ranges starts[i], ..., starts[i] + counts[i] - 1 one after the other.
+    """
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(
+        ends[-1] if len(ends) else 0
+    )
+
+
+def pick(counts, draws):
+    """
+    Picks one item in every row of counts, each item of a row with the same
+    chance, using one draw in [0, 1) per row. Every row has at least one
+    item. Returns the column and the rank within the column of the pick.
+    """
+    cumulative = counts.cumsum(1)
+    k = np.floor(draws * cumulative[:, -1]).astype(np.int64)
+    column = np.argmax(cumulative > k[:, None], axis=1)
+    rows = np.arange(len(counts))
+    return column, k - cumulative[rows, column] + counts[rows, column]
+
+
+def members(cells, candidates, targets, within):
+    """
+    The candidate of rank within on every target cell, cells giving the cell
+    of every candidate.
+    """
+    order = np.argsort(cells, kind="stable")
+    first = np.searchsorted(cells[order], targets)
+    return candidates[order[first + within]]
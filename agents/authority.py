@@ -1,6 +1,15 @@
 from mesa import Agent
+from agents.base import SlotAgent
 import sys
-from utils.params import kill_threshold, cop_threshold, r_c
+import numpy as np
+from utils.params import kill_threshold, cop_threshold, r_c, cop_vision
+
+
+# Ledger modes of the bank
+LEDGERS = ("sequential", "batched")
+
+# Accounts of the bank, as attributes of Bank
+ACCOUNTS = ("bank_loans", "giveaway", "deposits", "bank_to_loan")
 
 
 class Bank(Agent):
@@ -8,14 +17,27 @@ class Bank(Agent):
     A central authority agent whose task is to update it's reserves
     depending on the saving of the agents and decide the amount to
     loan.
+    In the sequential ledger every citizen balances its books with the bank
+    right after it trades, one citizen after the other. In the batched ledger
+    the citizens only trade during their step and queue up, and the bank
+    settles all their books at once after the agents stepped, in the order
+    of settle_books.
     Attributes:
         unique_id: Every agent has a unique id allowing them to perform individual tasks
         model: World model
+        ledger: "sequential" or "batched"
+        pending: citizens waiting for the batched settlement, in step order
     """
 
-    def __init__(self, unique_id, model):
+    def __init__(self, unique_id, model, ledger="sequential"):
         # initialize the parent class with required parameters
         super().__init__(unique_id, model)
+        if ledger not in LEDGERS:
+            raise ValueError(
+                f"Unknown ledger {ledger!r}, use 'sequential' or 'batched'"
+            )
+        self.ledger = ledger
+        self.pending = []
         # for tracking total value of loans outstanding
         self.bank_loans = 0
         """percent of deposits the bank must keep in reserves - this is a
@@ -35,8 +57,239 @@ class Bank(Agent):
         self.giveaway = self.model.legitimacy * self.deposits
         self.bank_to_loan = self.deposits - (self.giveaway + self.bank_loans)
 
+    @property
+    def batched(self):
+        return self.ledger == "batched"
+
+    def settle(self):
+        """
+        Settles the books of the pending citizens in one pass, then updates
+        their status and confidence as they would at the end of their step.
+        """
+        citizens, self.pending = self.pending, []
+        if not citizens:
+            return
+        n = len(citizens)
+
+        # settle_ledger works on one ledger per replicate, this bank is the
+        # only replicate
+        ledger, wallet, savings, loans, wealth = settle_ledger(
+            [np.array([getattr(self, name)], dtype=float) for name in ACCOUNTS],
+            self.model.legitimacy,
+            np.zeros(n, dtype=np.intp),
+            1,
+            np.array([c.wallet for c in citizens], dtype=float),
+            np.array([c.savings for c in citizens], dtype=float),
+            np.array([c.loans for c in citizens], dtype=float),
+        )
+        for name, value in zip(ACCOUNTS, ledger):
+            setattr(self, name, value.item())
+
+        for citizen, *books in zip(
+            citizens, wallet.tolist(), savings.tolist(), loans.tolist(), wealth.tolist()
+        ):
+            citizen.wallet, citizen.savings, citizen.loans, citizen.wealth = books
+            citizen.update_status()
+            citizen.measure_confidence()
+
+
+def settle_books(bank, legitimacy, rep, replicates, wallet, savings, loans):
+    """
+    Settles the books of a batch of citizens with the bank, see
+    settle_ledger, and returns their new wallet, savings, loans and wealth.
+    The bank keeps one ledger per replicate, its accounts are arrays.
+    """
+    ledger, *books = settle_ledger(
+        [getattr(bank, name) for name in ACCOUNTS],
+        legitimacy,
+        rep,
+        replicates,
+        wallet,
+        savings,
+        loans,
+    )
+    for name, value in zip(ACCOUNTS, ledger):
+        setattr(bank, name, value)
+    return books
+
+
+def settle_ledger(ledger, legitimacy, rep, replicates, wallet, savings, loans):
+    """
+    Settles the books of a batch of citizens with a bank in one pass. The
+    ledger holds the accounts of the bank (see ACCOUNTS) as arrays with one
+    value per replicate and rep is the replicate of every citizen, the
+    citizens being grouped by replicate. Nothing is changed in place: returns
+    the new ledger and the new wallet, savings, loans and wealth of the
+    citizens. The books are settled in this order:
+        1. positive wallets are deposited, negative wallets are covered
+           from the savings as far as they go
+        2. the bank recomputes the amount it can loan
+        3. remaining negative wallets are covered by loans granted first
+           come first served in citizen order until the bank runs out
+        4. outstanding loans are repaid from the savings
+        5. the bank recomputes the amount it can loan
+    """
+
+    def total(values):
+        return np.bincount(rep, weights=values, minlength=replicates)
+
+    def balance(deposits, bank_loans):
+        # Same as Bank.bank_balance
+        giveaway = legitimacy * deposits
+        return giveaway, deposits - (giveaway + bank_loans)
+
+    bank_loans, _, deposits, _ = ledger
+    negative = wallet < 0
+    deposit = np.where(negative, 0, wallet)
+    withdraw = np.where(negative, np.minimum(savings, -wallet), 0)
+    withdraw = np.maximum(withdraw, 0)
+    savings = savings + deposit - withdraw
+    wallet = wallet - deposit + withdraw
+    deposits = deposits + (total(deposit) - total(withdraw))
+    giveaway, bank_to_loan = balance(deposits, bank_loans)
+
+    # Citizens are grouped by replicate, the loans of every replicate are
+    # granted from the running total of the needs within the replicate
+    need = np.where(wallet < 0, -wallet, 0)
+    available = bank_to_loan
+    needs = total(need)
+    granted = np.cumsum(need) - need - (np.cumsum(needs) - needs)[rep]
+    loan = np.clip(available[rep] - granted, 0, need)
+    borrowers = np.flatnonzero(need > 0)
+    _, first = np.unique(rep[borrowers], return_index=True)
+    first = borrowers[first]
+    first = first[available[rep[first]] < 0]
+    # The first borrower takes out whatever the bank can loan, even
+    # when it is negative, after which the bank has nothing left
+    loan[first] = available[rep[first]]
+    loans = loans + loan
+    wallet = wallet + loan
+    bank_loans = bank_loans + total(loan)
+    bank_to_loan = bank_to_loan - total(loan)
+
+    repaying = (loans > 0) & (savings > 0)
+    full = repaying & (savings >= loans)
+    partial = repaying & ~full
+    repay = np.where(full, loans, 0) + np.where(partial, wallet + savings, 0)
+    deposits = deposits - total(
+        np.where(full, loans, 0) + np.where(partial, savings, 0)
+    )
+    savings = np.where(full, savings - loans, np.where(partial, 0, savings))
+    wallet = np.where(partial, 0, wallet)
+    loans = loans - repay
+    bank_to_loan = bank_to_loan + total(repay)
+    bank_loans = bank_loans - total(repay)
+    giveaway, bank_to_loan = balance(deposits, bank_loans)
+
+    wealth = savings * legitimacy - loans
+    ledger = (bank_loans, giveaway, deposits, bank_to_loan)
+    return ledger, wallet, savings, loans, np.where(wealth == 0.0, 1, wealth)
+
 
-class Cop(Agent):
+def sequential_moves(wallet, savings, loans):
+    """
+    What every citizen moves with the bank in the sequential ledger apart
+    from its loan, see Citizen.balance_books: its deposit, its withdrawal
+    to cover a negative wallet, its repayment and the loan it needs. A
+    borrower is left without savings, so only the others repay, from their
+    savings since their wallet is empty.
+    """
+    negative = wallet < 0
+    deposit = np.where(negative, 0, wallet)
+    withdraw = np.where(negative, np.maximum(np.minimum(savings, -wallet), 0), 0)
+    savings = savings + deposit - withdraw
+    need = np.where(negative, -wallet - withdraw, 0)
+    repay = np.where((need <= 0) & (loans > 0), np.clip(savings, 0, loans), 0)
+    return deposit, withdraw, repay, need
+
+
+def loan_ceilings(bank, legitimacy, rep, replicates, wallet, savings, loans):
+    """
+    Amount the bank can loan to every citizen when its turn comes in the
+    sequential ledger, the citizens settling one after the other in citizen
+    order, grouped by replicate like in settle_books. The first citizen of a
+    replicate gets the amount left by the last Bank.bank_balance, the others
+    the one computed from the deposits and loans left by the citizen before.
+
+    Once the bank loaned everything the amount is 0 up to the rounding of
+    bank_balance, and whether it is positive decides if a citizen without
+    money trades in do_business, so the amounts are computed as bank_balance
+    does, from the deposits and loans summed up in the order the citizens
+    move them. The deposits do not depend on the loans and are summed up at
+    once, the loans are followed from borrower to borrower.
+    """
+    deposit, withdraw, repay, need = sequential_moves(wallet, savings, loans)
+    available = np.empty(len(wallet))
+    for r in range(replicates):
+        lo, hi = np.searchsorted(rep, (r, r + 1))
+        if lo == hi:
+            continue
+        deposits = running_total(
+            bank.deposits[r], deposit[lo:hi] - withdraw[lo:hi], -repay[lo:hi]
+        )
+        totals = deposits.tolist()
+        needs = need[lo:hi].tolist()
+        repays = repay[lo:hi].tolist()
+        loan = np.zeros(hi - lo)
+        owed = bank.bank_loans[r]
+        for k in np.flatnonzero((need[lo:hi] > 0) | (repay[lo:hi] > 0)).tolist():
+            if needs[k] > 0:
+                if k == 0:
+                    left = bank.bank_to_loan[r]
+                else:
+                    left = totals[k - 1] - (legitimacy * totals[k - 1] + owed)
+                loan[k] = min(needs[k], left)
+                owed = owed + loan[k]
+            owed = owed - repays[k]
+
+        bank_loans = running_total(bank.bank_loans[r], loan, -repay[lo:hi])
+        available[lo] = bank.bank_to_loan[r]
+        available[lo + 1 : hi] = (deposits - (legitimacy * deposits + bank_loans))[:-1]
+    return available
+
+
+def running_total(start, first, second):
+    """
+    Total after every citizen when it adds first then second to start, one
+    citizen after the other, rounded like the sequential ledger does.
+    """
+    return np.cumsum(np.append(start, np.stack((first, second), axis=1)))[2::2]
+
+
+def settle_books_sequential(bank, legitimacy, rep, replicates, wallet, savings, loans):
+    """
+    Same as settle_books with the sequential ledger: the citizens settle one
+    after the other in citizen order, each with the amount the bank could
+    loan after the previous one settled (see loan_ceilings), as
+    Citizen.balance_books followed by Bank.bank_balance does.
+    """
+    available = loan_ceilings(bank, legitimacy, rep, replicates, wallet, savings, loans)
+    deposit, withdraw, repay, need = sequential_moves(wallet, savings, loans)
+    loan = np.where(need > 0, np.minimum(need, available), 0)
+    savings = savings + deposit - withdraw - repay
+    wallet = wallet - deposit + withdraw + loan
+    loans = loans + loan - repay
+
+    for r in range(replicates):
+        lo, hi = np.searchsorted(rep, (r, r + 1))
+        if lo == hi:
+            continue
+        bank.deposits[r] = running_total(
+            bank.deposits[r], deposit[lo:hi] - withdraw[lo:hi], -repay[lo:hi]
+        )[-1]
+        bank.bank_loans[r] = running_total(
+            bank.bank_loans[r], loan[lo:hi], -repay[lo:hi]
+        )[-1]
+        bank.giveaway[r] = legitimacy * bank.deposits[r]
+        bank.bank_to_loan[r] = bank.deposits[r] - (
+            bank.giveaway[r] + bank.bank_loans[r]
+        )
+
+    wealth = savings * legitimacy - loans
+    return wallet, savings, loans, np.where(wealth == 0.0, 1, wealth)
+
+
+class Cop(SlotAgent):
 
     """
     A central authority agent whose task to capture or eliminate revolting citizen.
@@ -49,20 +302,31 @@ class Cop(Agent):
         model: model instance under which the agent is running
     """
 
+    __slots__ = ()
+
+    alignment = "Cop"
+
     def __init__(self, unique_id, model):
 
         #  Initialize the Cop agent with a unique_id and the model instance
 
         super().__init__(unique_id, model)
-        self.alignment = "Cop"
+
+    def __hash__(self):
+        # Same as Citizen.__hash__
+        return self.unique_id
 
     def move(self):
         """
         Move the agent to a new empty position on the grid
         """
-        if self.empty_cells:
-            pos = self.random.choice(self.empty_cells)
-            self.model.grid.move_agent(self, pos)
+        empty_cells = self.model.cop_buffers.empty_cells
+        if empty_cells:
+            cell = self.random.choice(empty_cells)
+            old_pos = self.pos
+            self.model.grid.move_agent(self, self.model.grid.position(cell))
+            if self.model.fields is not None:
+                self.model.fields.move(self, old_pos)
 
     def get_neighbors(self):
         """
@@ -70,37 +334,40 @@ class Cop(Agent):
         citizen or cops
         """
 
-        neighborhood = self.model.grid.get_neighborhood(self.pos, moore=True, radius=1)
-        self.empty_cells = [c for c in neighborhood if self.model.grid.is_cell_empty(c)]
-        neighbors = self.model.grid.get_neighbors(self.pos, True)
-        self.citizens = []
-        self.cops = []
-        if neighbors:
-            for neighbor in neighbors:
-                if neighbor.alignment == "Citizen":
-                    self.citizens.append(neighbor)
-                elif neighbor.alignment == "Cop":
-                    self.cops.append(neighbor)
-
-        self.revolt_citizens = [a for a in self.citizens if a.state == "Revolt"]
+        grid = self.model.grid
+        neighborhood = grid.neighborhood_cells(self.pos, moore=True, radius=1)
+        buffers = self.model.cop_buffers
+        buffers.empty_cells[:] = grid.empty_cells(neighborhood)
+        neighbors = grid.get_neighbors(self.pos, True, radius=cop_vision)
+        citizens, cops, revolt = buffers.citizens, buffers.cops, buffers.revolt_citizens
+        citizens.clear()
+        cops.clear()
+        revolt.clear()
+        for neighbor in neighbors:
+            if neighbor.alignment == "Citizen":
+                citizens.append(neighbor)
+                if neighbor.state == "Revolt":
+                    revolt.append(neighbor)
+            elif neighbor.alignment == "Cop":
+                cops.append(neighbor)
 
     def jail_citizen(self):
 
         # Jail or eliminate the citizen based on the number of times a citizen
         # has been jailed before
 
-        for i in self.citizens:
+        buffers = self.model.cop_buffers
+        for i in buffers.citizens:
             if i.n_j > kill_threshold:
-                self.model.kill_agents.append(i)
+                self.model.kill(i)
                 self.model.agents_killed += 1
             # elif i.state == "Revolt" and self.random.random() > 0.2:
             #     i.state = "Jail"
             #     i.movement = False
         if self.random.random() > self.model.legitimacy:
-            if self.revolt_citizens:
-                r_c = self.random.choice(self.revolt_citizens)
-                r_c.state = "Jail"
-                r_c.movement = False
+            if buffers.revolt_citizens:
+                r_c = self.random.choice(buffers.revolt_citizens)
+                self.model.jail(r_c)
 
     def step(self):
         """
@@ -0,0 +1,59 @@
+# The file contains the base class of the citizens and cops. mesa.Agent keeps
+# its attributes in a per instance __dict__, which a subclass cannot drop by
+# declaring __slots__, so the agents of the World derive from this slotted
+# copy of it instead. The Bank, a single agent, stays a mesa.Agent.
+#
+# The neighbor lists an agent fills during its step are scratch buffers kept by
+# the World, one set for the citizens and one for the cops, cleared and filled
+# in place instead of being allocated per agent per step. Every World has its
+# own, so Worlds stepped in different threads do not share them.
+
+
+class SlotAgent:
+    """
+    Same interface as mesa.Agent with the attributes stored in slots.
+    Subclasses list their own attributes in __slots__ as well.
+
+    Attributes:
+        unique_id: Every agent has a unique id allowing them to perform individual tasks
+        model: World model
+        pos: position of the agent on the grid, None until it is placed
+    """
+
+    __slots__ = ("unique_id", "model", "pos")
+
+    def __init__(self, unique_id, model):
+        self.unique_id = unique_id
+        self.model = model
+        self.pos = None
+
+    def step(self):
+        pass
+
+    def advance(self):
+        pass
+
+    @property
+    def random(self):
+        return self.model.random
+
+
+class NeighborBuffers:
+    """
+    Scratch buffers of the neighbor lists of one kind of agent, only valid
+    during the step of the agent which filled them.
+
+    Attributes:
+        citizens: citizens in sight
+        cops: cops in sight
+        revolt_citizens: revolting citizens in sight
+        empty_cells: empty cells a cop can move to
+    """
+
+    __slots__ = ("citizens", "cops", "revolt_citizens", "empty_cells")
+
+    def __init__(self):
+        self.citizens = []
+        self.cops = []
+        self.revolt_citizens = []
+        self.empty_cells = []
@@ -1,12 +1,12 @@
 import numpy as np
 import math
-from mesa import Agent
+from agents.base import SlotAgent
 from utils.params import k_c, k_d, k_e, k_p, k_af, r_c
 from utils.params import wealth_inc, timestep
 from utils.params import jail_period, citizen_vision
 
 
-class Citizen(Agent):
+class Citizen(SlotAgent):
     """
     An agent that emulates the behavior of a citizen, he can be a rich
     class citizen, middle class citizen or poor citizen.
@@ -18,24 +18,65 @@ class Citizen(Agent):
         risk_aversion: Varying aversion constant of a single agent
         bank: Bank agent
         rich_threshold: Thresold constant for status separation
+        wallet: initial wallet, drawn between 1 and rich_threshold + 1 if None
     """
 
-    def __init__(self, unique_id, model, hardship, risk_aversion, bank, rich_threshold):
+    __slots__ = (
+        "_status",
+        "_state",
+        "movement",
+        "grievance",
+        "confidence",
+        "net_risk",
+        "arrest_probability",
+        "n_revolt",
+        "n_cops",
+        "seen_from",
+        "hardship",
+        "risk_aversion",
+        "j_time",
+        "n_j",
+        "t",
+        "savings",
+        "loans",
+        "wallet",
+        "wealth",
+        "customer",
+        "bank",
+    )
+
+    # Indicating whether the agent is citizen or cop
+    alignment = "Citizen"
+
+    def __init__(
+        self,
+        unique_id,
+        model,
+        hardship,
+        risk_aversion,
+        bank,
+        rich_threshold,
+        wallet=None,
+    ):
 
         super().__init__(unique_id, model)
-        # Indicating whether the agent is citizen or cop
-        self.alignment = "Citizen"
 
         # Set initial status of the agent
-        self.status = "None"
+        self._status = "None"
 
         # State of the agent ["Calm", "Revolt", "Jail"]
-        self.state = "Calm"
+        self._state = "Calm"
         self.movement = True
 
         self.grievance = 0.0
         self.confidence = 0.0
         self.net_risk = 0.0
+        self.arrest_probability = 0.0
+
+        # Revolting citizens and cops seen around the agent and where from
+        self.n_revolt = 0
+        self.n_cops = 0
+        self.seen_from = None
         self.hardship = hardship
         self.risk_aversion = risk_aversion
 
@@ -49,8 +90,10 @@ class Citizen(Agent):
         # total loan amount person has outstanding
         self.loans = 0
         """start everyone off with a random amount in their wallet from 1 to a
-           user settable rich threshold amount"""
-        self.wallet = self.random.randint(1, rich_threshold + 1)
+           user settable rich threshold amount, unless the wallet is given"""
+        if wallet is None:
+            wallet = self.random.randint(1, rich_threshold + 1)
+        self.wallet = wallet
         # savings minus loans, see balance_books() below
         self.wealth = 0
         # person to trade with, see do_business() below
@@ -58,6 +101,39 @@ class Citizen(Agent):
         # person's bank, set at __init__, all people have the same bank in this model
         self.bank = bank
 
+    def __hash__(self):
+        # MultiGrid cells are sets, hashing by id keeps their order and so a
+        # seeded run independent of where the agents sit in memory
+        return self.unique_id
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        # Emit the transition into the population counters of the World, and
+        # into its neighborhood counts once the citizen is placed
+        if state != self._state:
+            model = self.model
+            model.population.transition(self._status, self._state, self._status, state)
+            if model.fields is not None and self.pos is not None:
+                model.fields.transition(self.pos, self._state, state)
+            self._state = state
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, status):
+        # Emit the transition into the population counters of the World
+        if status != self._status:
+            self.model.population.transition(
+                self._status, self._state, status, self._state
+            )
+            self._status = status
+
     def do_business(self):
         """check if person has any savings, any money in wallet, or if the
         bank can loan them any money"""
@@ -188,6 +264,15 @@ class Citizen(Agent):
         else:
             pass
 
+    def wake(self):
+        """
+        Called when the jail wheel releases the citizen, before its step.
+        Catches up the jail time served while it was parked and measures its
+        confidence with the current mean wealth and legitimacy.
+        """
+        self.j_time = jail_period
+        self.measure_confidence()
+
     def update_status(self):
         """
         Updates the status of the agent
@@ -216,20 +301,39 @@ class Citizen(Agent):
         agents radius and separates them
         based on their alignment and state.
         """
-        self.neighborhood = self.model.grid.get_neighborhood(
-            self.pos, moore=True, radius=citizen_vision
+        self.seen_from = self.pos
+        if self.model.fields is not None:
+            # Only the counts are needed, read them from the count rasters
+            self.n_revolt, self.n_cops = self.model.fields.counts(self.pos)
+            return
+
+        neighbors = self.model.grid.get_neighbors(self.pos, True, radius=citizen_vision)
+        buffers = self.model.citizen_buffers
+        citizens, cops, revolt = buffers.citizens, buffers.cops, buffers.revolt_citizens
+        citizens.clear()
+        cops.clear()
+        revolt.clear()
+        for neighbor in neighbors:
+            if neighbor.alignment == "Citizen":
+                citizens.append(neighbor)
+                if neighbor.state == "Revolt":
+                    revolt.append(neighbor)
+            elif neighbor.alignment == "Cop":
+                cops.append(neighbor)
+
+        self.n_revolt = len(revolt)
+        self.n_cops = len(cops)
+
+    def cops_in_sight(self):
+        """
+        The cops seen by the last update_neighbors.
+        """
+        if self.model.fields is None:
+            return self.model.citizen_buffers.cops
+        neighbors = self.model.grid.get_neighbors(
+            self.seen_from, True, radius=citizen_vision
         )
-        neighbors = self.model.grid.get_neighbors(self.pos, True)
-        self.citizens = []
-        self.cops = []
-        if neighbors:
-            for neighbor in neighbors:
-                if neighbor.alignment == "Citizen":
-                    self.citizens.append(neighbor)
-                elif neighbor.alignment == "Cop":
-                    self.cops.append(neighbor)
-
-        self.revolt_citizens = [a for a in self.citizens if a.state == "Revolt"]
+        return [a for a in neighbors if a.alignment == "Cop"]
 
     def kill_cops(self):
         """
@@ -238,11 +342,13 @@ class Citizen(Agent):
         condition.
         """
         if self.state == "Revolt":
-            citizens = len(self.revolt_citizens) + 1
-            cops = len(self.cops)
+            citizens = self.n_revolt + 1
+            cops = self.n_cops
             if cops:
                 if (citizens - cops) >= (8 * citizen_vision) // 2:
-                    self.model.kill_agents.append(self.random.choice(self.cops))
+                    cops = self.cops_in_sight()
+                    if cops:
+                        self.model.kill(self.random.choice(cops))
 
     def sigmoid(self, x):
         """
@@ -262,8 +368,8 @@ class Citizen(Agent):
         self.grievance = self.hardship * (1 - self.model.legitimacy)
         alpha = self.status == "Jail"
 
-        n_g = len(self.revolt_citizens) + 1
-        n_c = len(self.cops)
+        n_g = self.n_revolt + 1
+        n_c = self.n_cops
         self.arrest_probability = 1 - math.exp(
             -1 * self.model.ap_constant * (n_c / n_g)
         )
@@ -277,10 +383,14 @@ class Citizen(Agent):
         Step one cell in any allowable direction.
         """
         # Pick the next cell from the adjacent cells.
-        next_moves = self.model.grid.get_neighborhood(self.pos, True, True)
+        grid = self.model.grid
+        next_moves = grid.neighborhood_cells(self.pos, True, True)
         next_move = self.random.choice(next_moves)
         # Now move:
-        self.model.grid.move_agent(self, next_move)
+        old_pos = self.pos
+        grid.move_agent(self, grid.position(next_move))
+        if self.model.fields is not None:
+            self.model.fields.move(self, old_pos)
 
     def step(self):
         if self.movement:
@@ -290,7 +400,13 @@ class Citizen(Agent):
             self.kill_cops()
         self.update_jail_time()
         if self.model.include_wealth and self.state != "Jail":
-            self.do_business()
+            if self.model.market is None:
+                self.do_business()
+            if self.bank.batched:
+                # The market trades and the bank settles the books, status
+                # and confidence after the agents stepped
+                self.bank.pending.append(self)
+                return
             self.balance_books()
             self.bank.bank_balance()
             self.update_status()
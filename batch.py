@@ -0,0 +1,401 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from env import World
+from ensemble import Ensemble
+from utils.checkpoint import load_checkpoint
+from utils.config import ResultCache, RunConfig
+from utils.stopping import RULES
+
+# Headless batch runner. Runs the World without the browser UI over a grid of
+# parameter values, every point repeated with a number of seeds, fanned out over
+# a process pool. The model reporters of every run are written to their own CSV
+# file and one line per run is appended to index.csv in the output directory.
+#
+# Example:
+#   python batch.py --cop-density 0.02 0.04 --legitimacy 0.8 0.9 \
+#       --include-wealth true false --replicates 10 --steps 200 --output runs
+#
+# With --sink csv or --sink npz every run streams its reporter rows to disk while
+# it runs (see utils/sinks.py), instead of keeping them in memory until the end.
+#
+# With --checkpoint-every N every run is saved to a .ckpt file every N steps. A
+# sweep started again with the same arguments resumes every run from its
+# checkpoint, and one started with more --steps extends the runs. With
+# --warm-start every run starts from one checkpoint, e.g. after a burn-in, with
+# its own seed. --steps counts the steps from the start of the World.
+#
+# With --record every run records a snapshot of its grid and its reporters at
+# every --record-every-th step to a .rec directory (see utils/recording.py),
+# which the server replays without running the World (replay in
+# utils/params.py).
+#
+# With --cache DIR the outputs of every run are stored in DIR under the digest
+# of its configuration (see utils/config.py), and a run whose configuration was
+# already made is copied from there instead of running again. The index marks
+# such runs as cached. Warm started and profiled runs are never cached.
+#
+# With --stop RULE ... every run stops as soon as one of the rules applies,
+# e.g. once its counts are steady or every cop was killed (see
+# utils/stopping.py), and the index records the reason it stopped.
+#
+# With --profile the time spent in every phase of every step of a run (see
+# utils/profiling.py) is written to a _profile.csv file next to its reporters.
+#
+# With --ensemble the replicates of every point are stepped together in one
+# Ensemble instead of one World each. Every point then writes the series of all
+# its replicates to one CSV file and their mean and confidence interval to a
+# summary CSV file. It cannot be combined with --sink, --checkpoint-every,
+# --warm-start, --record, --profile, --stop or --cache.
+
+
+# World parameters which can be swept
+SWEEP = (
+    "cop_density",
+    "citizen_density",
+    "legitimacy",
+    "active_threshold",
+    "rich_threshold",
+    "include_wealth",
+)
+
+
+def str2bool(value):
+    if value.lower() in ("true", "yes", "1"):
+        return True
+    if value.lower() in ("false", "no", "0"):
+        return False
+    raise argparse.ArgumentTypeError(f"Expected a boolean, got {value!r}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run parameter sweeps of the World")
+    parser.add_argument("--cop-density", type=float, nargs="+", default=[0.01])
+    parser.add_argument("--citizen-density", type=float, nargs="+", default=[0.7])
+    parser.add_argument("--legitimacy", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--active-threshold", type=float, nargs="+", default=[0.2])
+    parser.add_argument("--rich-threshold", type=int, nargs="+", default=[10])
+    parser.add_argument("--include-wealth", type=str2bool, nargs="+", default=[True])
+    parser.add_argument("--gridsize", type=int, default=50)
+    parser.add_argument("--l-state", type=str2bool, default=False)
+    parser.add_argument("--reduction-constant", type=float, default=0.01)
+    parser.add_argument("--engine", choices=("mesa", "array"), default="mesa")
+    parser.add_argument("--grid-backend", choices=("multi", "array"), default="multi")
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument(
+        "--ensemble",
+        action="store_true",
+        help="step the replicates of every point together with the array engine",
+    )
+    parser.add_argument("--level", type=float, default=0.95, help="ensemble CI level")
+    parser.add_argument(
+        "--sink",
+        choices=("memory", "csv", "npz"),
+        default="memory",
+        help="where the reporter rows of a run are kept while it runs",
+    )
+    parser.add_argument("--flush-every", type=int, default=100)
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=0,
+        help="save every run every N steps and resume it from there, 0 disables",
+    )
+    parser.add_argument(
+        "--warm-start", help="checkpoint of a warmed up World every run starts from"
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="record the grid of every run to be replayed in the server",
+    )
+    parser.add_argument("--record-every", type=int, default=1)
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="write the per step time of every phase of a run next to its reporters",
+    )
+    parser.add_argument(
+        "--stop",
+        nargs="+",
+        choices=tuple(RULES),
+        default=[],
+        help="stop every run early once one of these rules applies",
+    )
+    parser.add_argument("--stop-window", type=int, default=100)
+    parser.add_argument("--stop-tolerance", type=float, default=0.01)
+    parser.add_argument(
+        "--cache", help="directory of the results reused by runs with the same config"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="base seed of the sweep")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="runs")
+    args = parser.parse_args(argv)
+
+    # The options which only apply to the runs of a World
+    if args.ensemble:
+        unsupported = [
+            option
+            for option, used in (
+                ("--sink", args.sink != "memory"),
+                ("--checkpoint-every", args.checkpoint_every),
+                ("--warm-start", args.warm_start),
+                ("--record", args.record),
+                ("--profile", args.profile),
+                ("--stop", args.stop),
+                ("--cache", args.cache),
+            )
+            if used
+        ]
+        if unsupported:
+            parser.error(f"--ensemble does not support {', '.join(unsupported)}")
+    return args
+
+
+def sweep_points(args):
+    """
+    Every combination of the swept parameter values, as dicts of World kwargs.
+    """
+    values = [getattr(args, name) for name in SWEEP]
+    fixed = {
+        "gridsize": args.gridsize,
+        "agent_type": "Poor",
+        "l_state": args.l_state,
+        "reduction_constant": args.reduction_constant,
+        "engine": args.engine,
+        "grid_backend": args.grid_backend,
+    }
+    return [
+        dict(fixed, **dict(zip(SWEEP, combo))) for combo in itertools.product(*values)
+    ]
+
+
+def run_seeds(base_seed, runs):
+    """
+    One independent seed per run, derived from the base seed so that a run
+    can be reproduced on its own whatever worker it landed on.
+    """
+    children = np.random.SeedSequence(base_seed).spawn(runs)
+    return [int(child.generate_state(1, np.uint64)[0]) for child in children]
+
+
+def run_world(
+    params, steps, seed, checkpoint=None, warm_start=None, profile=False, **kwargs
+):
+    """
+    Runs one World until it has made the given number of steps, or until it
+    stops running, with its phases profiled if profile is set. Returns the
+    World.
+
+    A run whose checkpoint exists is resumed from it. Otherwise a run with a
+    warm start is restored from that checkpoint, reseeded with its own seed,
+    and given the swept parameters (the densities only matter at placement)
+    and its own collector and recorder, so it never writes to the files of
+    the warm up run.
+    """
+    if checkpoint is not None and os.path.exists(checkpoint):
+        model = load_checkpoint(checkpoint)
+    elif warm_start is not None:
+        model = load_checkpoint(warm_start, seed=seed)
+        for name in SWEEP:
+            setattr(model, name, params[name])
+        model.checkpoint = checkpoint
+        model.sink = None
+        model.record = None
+        for name, value in kwargs.items():
+            setattr(model, name, value)
+        model.datacollector = model.new_collector()
+        model.recorder = model.new_recorder()
+        model.stop_rules = model.new_stop_rules()
+    else:
+        model = World(seed=seed, checkpoint=checkpoint, **params, **kwargs)
+
+    model.set_profiling(profile)
+    while model.running and model.schedule.steps < steps:
+        model.step()
+    return model
+
+
+def run_task(task):
+    """
+    Worker entry point: runs one (point, replicate) and writes its model
+    reporters. Returns the lines of the run in index.csv.
+    """
+    point, replicate, params, seed, options = task
+    start = time.perf_counter()
+    output = options["output"]
+    name = f"point{point:05d}_rep{replicate:03d}"
+    kwargs = {"warm_start": options["warm_start"], "profile": options["profile"]}
+    kwargs["record"] = None
+    if options["record"]:
+        kwargs["record"] = os.path.join(output, f"{name}.rec")
+        kwargs["record_every"] = options["record_every"]
+    if options["checkpoint_every"]:
+        kwargs["checkpoint"] = os.path.join(output, f"{name}.ckpt")
+        kwargs["checkpoint_every"] = options["checkpoint_every"]
+    for option in ("stop", "stop_window", "stop_tolerance"):
+        kwargs[option] = options[option]
+
+    if options["sink"] == "memory":
+        path = os.path.join(output, f"{name}.csv")
+        outputs = {".csv": path}
+    else:
+        path = os.path.join(output, f"{name}.{options['sink']}")
+        outputs = {f".sink.{options['sink']}": path}
+    if options["record"]:
+        outputs[f".every{options['record_every']}.rec"] = kwargs["record"]
+
+    # Profiles and warm started runs depend on more than their configuration
+    config = RunConfig(
+        **params,
+        stop=options["stop"],
+        stop_window=options["stop_window"],
+        stop_tolerance=options["stop_tolerance"],
+        seed=seed,
+        steps=options["steps"],
+    )
+    cache = None
+    if options["cache"] and not options["profile"] and not options["warm_start"]:
+        cache = ResultCache(options["cache"])
+        result = cache.get(config, outputs)
+        if result is not None:
+            cache.restore(config, outputs)
+            return [
+                index_line(point, replicate, seed, params, config, path, start, result)
+            ]
+
+    if options["sink"] == "memory":
+        model = run_world(params, options["steps"], seed, **kwargs)
+        frame = model.datacollector.get_model_vars_dataframe()
+        # A warm started run collects from the step of its warm start
+        frame.index += model.schedule.steps - len(frame)
+        frame.to_csv(path, index_label="Step")
+    else:
+        kwargs.update(sink=path, flush_every=options["flush_every"])
+        model = run_world(params, options["steps"], seed, **kwargs)
+        model.datacollector.flush()
+    if model.recorder is not None:
+        model.recorder.flush()
+    if model.profiler is not None:
+        profile = os.path.join(output, f"{name}_profile.csv")
+        model.set_profiling(False).report().to_csv(profile)
+    result = {"steps": model.schedule.steps, "stopped": model.stop_reason}
+    if cache is not None:
+        cache.put(config, outputs, result)
+        result["cached"] = False
+    return [index_line(point, replicate, seed, params, config, path, start, result)]
+
+
+def index_line(point, replicate, seed, params, config, path, start, result):
+    """
+    Line of one run in index.csv, cached if its outputs were restored from
+    the result cache.
+    """
+    return dict(
+        point=point,
+        replicate=replicate,
+        seed=seed,
+        steps=result["steps"],
+        stopped=result.get("stopped") or "",
+        seconds=round(time.perf_counter() - start, 3),
+        file=os.path.basename(path),
+        config=config.digest,
+        cached=result.get("cached", True),
+        **{name: params[name] for name in SWEEP},
+    )
+
+
+def run_ensemble_task(task):
+    """
+    Worker entry point of the ensemble mode: runs every replicate of one
+    point together and writes the series of every replicate and their
+    summary. Returns the lines of the replicates in index.csv.
+    """
+    point, replicates, params, seed, options = task
+    start = time.perf_counter()
+    output = options["output"]
+    params = {k: v for k, v in params.items() if k not in ("engine", "grid_backend")}
+    model = Ensemble(replicates=replicates, seed=seed, **params)
+    for _ in range(options["steps"]):
+        if not model.running:
+            break
+        model.step()
+
+    path = os.path.join(output, f"point{point:05d}_replicates.csv")
+    frame = model.replicate_frame()
+    frame.to_csv(path)
+    summary = os.path.join(output, f"point{point:05d}_summary.csv")
+    model.summary(options["level"]).to_csv(summary)
+    seconds = round(time.perf_counter() - start, 3)
+    recorded = frame.groupby(level="Replicate").size()
+    return [
+        dict(
+            point=point,
+            replicate=replicate,
+            seed=seed,
+            steps=int(recorded.get(replicate, 0)),
+            seconds=seconds,
+            file=os.path.basename(path),
+            **{name: params[name] for name in SWEEP},
+        )
+        for replicate in range(replicates)
+    ]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+    points = sweep_points(args)
+    options = {
+        "steps": args.steps,
+        "output": args.output,
+        "level": args.level,
+        "sink": args.sink,
+        "flush_every": args.flush_every,
+        "checkpoint_every": args.checkpoint_every,
+        "warm_start": args.warm_start,
+        "profile": args.profile,
+        "record": args.record,
+        "record_every": args.record_every,
+        "cache": args.cache,
+        "stop": tuple(args.stop),
+        "stop_window": args.stop_window,
+        "stop_tolerance": args.stop_tolerance,
+    }
+    if args.ensemble:
+        worker = run_ensemble_task
+        seeds = run_seeds(args.seed, len(points))
+        tasks = [
+            (point, args.replicates, params, seed, options)
+            for (point, params), seed in zip(enumerate(points), seeds)
+        ]
+    else:
+        worker = run_task
+        seeds = iter(run_seeds(args.seed, len(points) * args.replicates))
+        tasks = [
+            (point, replicate, params, next(seeds), options)
+            for point, params in enumerate(points)
+            for replicate in range(args.replicates)
+        ]
+
+    fields = ["point", "replicate", "seed", "steps", "stopped", "seconds", "file"]
+    fields += ["config", "cached", *SWEEP]
+    with open(os.path.join(args.output, "index.csv"), "w", newline="") as index:
+        writer = csv.DictWriter(index, fieldnames=fields)
+        writer.writeheader()
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            futures = [pool.submit(worker, task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                writer.writerows(future.result())
+                index.flush()
+                print(f"{done}/{len(tasks)} runs done", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import itertools
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from env import World
+from batch import str2bool
+
+# Benchmark suite of the World. Times World.__init__ (placement included) and
+# the steady state World.step over a grid of sizes, densities, wealth modes and
+# engines. Every case runs in a fresh process, one at a time, so the cases do
+# not share caches or memory and the peak memory of the process is the one of
+# the case. Results are written to a JSON file, which a later run can be
+# compared against to flag regressions.
+#
+# Example:
+#   python benchmark.py --output baseline.json
+#   python benchmark.py --output current.json --baseline baseline.json
+#   python benchmark.py --results current.json --baseline baseline.json
+
+
+# Parameters which make up a benchmark case
+CASE = (
+    "gridsize",
+    "citizen_density",
+    "cop_density",
+    "include_wealth",
+    "engine",
+    "stats",
+)
+
+# Case parameters missing from older result files -> the value they ran with
+DEFAULTS = {"stats": False}
+
+# Result metric -> whether higher is better
+METRICS = {
+    "init_seconds": False,
+    "steps_per_sec": True,
+    "agent_steps_per_sec": True,
+    "peak_rss_mb": False,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark World.step")
+    parser.add_argument(
+        "--gridsize", type=int, nargs="+", default=[25, 50, 100, 200, 500]
+    )
+    parser.add_argument("--citizen-density", type=float, nargs="+", default=[0.7])
+    parser.add_argument("--cop-density", type=float, nargs="+", default=[0.04])
+    parser.add_argument(
+        "--include-wealth", type=str2bool, nargs="+", default=[True, False]
+    )
+    parser.add_argument(
+        "--engine", choices=("mesa", "array"), nargs="+", default=["mesa"]
+    )
+    parser.add_argument(
+        "--stats",
+        type=str2bool,
+        nargs="+",
+        default=[False],
+        help="also compute the statistics reporters",
+    )
+    parser.add_argument("--warmup", type=int, default=2, help="untimed steps")
+    parser.add_argument("--steps", type=int, default=10, help="timed steps")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per case, the best one is kept"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file the results are written to")
+    parser.add_argument("--results", help="compare this JSON file instead of running")
+    parser.add_argument("--baseline", help="JSON file of the baseline results")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="relative change of a metric flagged as a regression",
+    )
+    return parser.parse_args(argv)
+
+
+def cases(args):
+    values = [getattr(args, name) for name in CASE]
+    return [dict(zip(CASE, combo)) for combo in itertools.product(*values)]
+
+
+def run_case(case, warmup, steps, seed):
+    """
+    Runs one benchmark case and returns its measurements. Meant to run in a
+    fresh process.
+    """
+    # World.new_collector imports mesa's DataCollector, and pandas with it, on
+    # first use. Imported here so init_seconds only times the World.
+    import mesa.datacollection  # noqa: F401
+
+    start = time.perf_counter()
+    model = World(
+        case["gridsize"],
+        case["cop_density"],
+        case["citizen_density"],
+        "Poor",
+        0.8,
+        False,
+        0.01,
+        0.2,
+        case["include_wealth"],
+        10,
+        engine=case["engine"],
+        stats=case["stats"],
+        seed=seed,
+    )
+    init_seconds = time.perf_counter() - start
+
+    for _ in range(warmup):
+        model.step()
+
+    agent_steps = 0
+    timed = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        if not model.running:
+            break
+        agent_steps += model.population.citizens + model.population.cops
+        model.step()
+        timed += 1
+    seconds = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    return dict(
+        case,
+        agents=model.population.citizens + model.population.cops,
+        steps=timed,
+        init_seconds=round(init_seconds, 4),
+        step_seconds=round(seconds, 4),
+        steps_per_sec=round(timed / seconds, 3) if seconds else None,
+        agent_steps_per_sec=round(agent_steps / seconds, 1) if seconds else None,
+        peak_rss_mb=round(peak / 2 ** 20, 1),
+    )
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_key(result):
+    # Parameters of the case of a result, older result files included
+    return tuple(result.get(name, DEFAULTS.get(name)) for name in CASE)
+
+
+def best(runs):
+    """
+    Best of the repeated runs of one case for every metric, the timings of
+    the other runs being slowed down by noise.
+    """
+    result = dict(runs[0])
+    for metric, higher_is_better in METRICS.items():
+        values = [run[metric] for run in runs if run[metric] is not None]
+        if values:
+            result[metric] = max(values) if higher_is_better else min(values)
+    return result
+
+
+def run_suite(args):
+    results = []
+    for case in cases(args):
+        runs = []
+        for _ in range(args.repeat):
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                runs.append(
+                    pool.submit(
+                        run_case, case, args.warmup, args.steps, args.seed
+                    ).result()
+                )
+        result = best(runs)
+        print(
+            " ".join(f"{k}={v}" for k, v in result.items()),
+            file=sys.stderr,
+        )
+        results.append(result)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "warmup": args.warmup,
+        "steps": args.steps,
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    Compares every case found in both result sets. Returns the lines of the
+    report and the number of regressions, a metric being worse than the
+    baseline by more than the tolerance.
+    """
+    base = {case_key(r): r for r in baseline["results"]}
+    lines = []
+    regressions = 0
+    for result in current["results"]:
+        key = case_key(result)
+        old = base.get(key)
+        if old is None:
+            lines.append(f"{key}: not in the baseline")
+            continue
+        for metric, higher_is_better in METRICS.items():
+            new_value, old_value = result.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = new_value / old_value - 1
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > tolerance else "ok"
+            regressions += flag == "REGRESSION"
+            lines.append(
+                f"{key} {metric}: {old_value} -> {new_value} ({change:+.1%}) {flag}"
+            )
+    return lines, regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.results:
+        with open(args.results) as f:
+            current = json.load(f)
+    else:
+        current = run_suite(args)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(current, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(current, baseline, args.tolerance)
+        print("\n".join(lines))
+        print(f"{regressions} regression(s)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
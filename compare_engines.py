@@ -0,0 +1,199 @@
+import argparse
+import sys
+from statistics import NormalDist
+import numpy as np
+from batch import str2bool
+from ensemble import Ensemble
+from env import World
+from utils.params import model_params
+
+# Regression check of the array engine and of the ensemble against the mesa
+# engine. Both engines run the same configurations over the same seeds, with
+# wealth for every ledger and without wealth. The mesa engine places its agents
+# in bulk, which draws the same World as the array engine for a seed, so the
+# runs of a seed only differ by their steps. The number of revolting and jailed
+# citizens and of cops and the shares of Middle, Rich and Poor citizens,
+# averaged over the steps after a burn-in, are compared: a difference of more
+# than z standard errors (from the spread of the differences of the seeds) is
+# flagged.
+#
+# The ensemble runs the configurations with the sequential ledger and the ones
+# without wealth. The confidence interval of its summary at the last step has
+# to overlap the confidence interval of the mean of the mesa runs at that step.
+# Anything flagged makes the command exit with status 1.
+#
+# Example:
+#   python compare_engines.py
+#   python compare_engines.py --legitimacy 0.5 --l-state true --gridsize 30 \
+#       --cop-density 0.05 --include-wealth false --seeds 40 --steps 40
+
+# Counts compared between the engines, and the classes compared as shares of
+# the citizens when the World includes wealth
+SERIES = ("Revolt", "Jail", "Cops")
+CLASSES = ("Middle", "Rich", "Poor")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the array engine and the ensemble to the mesa engine"
+    )
+    parser.add_argument("--legitimacy", type=float, nargs="+", default=[0.82, 0.6])
+    parser.add_argument(
+        "--l-state", type=str2bool, default=False, help="legitimacy declines"
+    )
+    parser.add_argument(
+        "--include-wealth", type=str2bool, nargs="+", default=[True, False]
+    )
+    parser.add_argument(
+        "--ledger",
+        choices=("sequential", "batched"),
+        nargs="+",
+        default=["sequential", "batched"],
+    )
+    parser.add_argument("--gridsize", type=int, default=30)
+    parser.add_argument("--cop-density", type=float, default=0.04)
+    parser.add_argument("--seeds", type=int, default=20, help="runs per engine")
+    parser.add_argument("--steps", type=int, default=120)
+    parser.add_argument(
+        "--burn-in", type=int, default=40, help="steps left out of the averages"
+    )
+    parser.add_argument(
+        "--z", type=float, default=4.0, help="standard errors of a flagged difference"
+    )
+    parser.add_argument(
+        "--replicates", type=int, default=40, help="replicates of the ensemble"
+    )
+    parser.add_argument(
+        "--level", type=float, default=0.95, help="level of the confidence intervals"
+    )
+    return parser.parse_args(argv)
+
+
+def configurations(args):
+    """
+    (legitimacy, include_wealth, ledger) of every compared configuration, the
+    ledger only matters with wealth.
+    """
+    for legitimacy in args.legitimacy:
+        for include_wealth in args.include_wealth:
+            for ledger in args.ledger if include_wealth else ["sequential"]:
+                yield legitimacy, include_wealth, ledger
+
+
+def names(include_wealth):
+    return SERIES + CLASSES if include_wealth else SERIES
+
+
+def parameters(legitimacy, include_wealth, args):
+    return dict(
+        model_params,
+        legitimacy=legitimacy,
+        l_state=args.l_state,
+        gridsize=args.gridsize,
+        cop_density=args.cop_density,
+        include_wealth=include_wealth,
+    )
+
+
+def measures(values, include_wealth):
+    """
+    The compared counts, and the class shares with wealth, of one step.
+    """
+    row = [values[name] for name in SERIES]
+    if include_wealth:
+        citizens = values["Calm"] + values["Revolt"] + values["Jail"]
+        row += [values[name] / citizens for name in CLASSES]
+    return row
+
+
+def run(engine, legitimacy, include_wealth, ledger, seed, args):
+    """
+    Runs one World. Returns its measures averaged over the steps after the
+    burn-in, and its reporter values at the last step.
+    """
+    params = parameters(legitimacy, include_wealth, args)
+    model = World(
+        **params, seed=seed, engine=engine, ledger=ledger, bulk_placement=True
+    )
+    rows = []
+    while model.running and model.schedule.steps < args.steps:
+        model.step()
+        if model.schedule.steps > args.burn_in:
+            rows.append(measures(model.metrics.values, include_wealth))
+    last = [model.metrics.values[name] for name in names(include_wealth)]
+    return np.mean(rows, axis=0), np.array(last)
+
+
+def compare(label, mesa, array, include_wealth, args):
+    """
+    Prints the difference of every measure between the engines and returns
+    the number of flagged ones.
+    """
+    flagged = 0
+    for i, name in enumerate(names(include_wealth)):
+        a, b = mesa[:, i], array[:, i]
+        difference = b.mean() - a.mean()
+        error = (b - a).std(ddof=1) / np.sqrt(args.seeds)
+        flag = "DIVERGES" if abs(difference) > args.z * error else "ok"
+        flagged += flag == "DIVERGES"
+        print(
+            f"{label} {name}: mesa {a.mean():.3f} array {b.mean():.3f} "
+            f"({difference:+.3f} ± {error:.3f}) {flag}"
+        )
+    return flagged
+
+
+def compare_ensemble(label, legitimacy, include_wealth, last, args):
+    """
+    Runs the ensemble of the configuration and checks that the confidence
+    interval of its summary at the last step overlaps the one of the mean of
+    the mesa runs, given as their values at the last step. Returns the number
+    of flagged reporters.
+    """
+    params = parameters(legitimacy, include_wealth, args)
+    ensemble = Ensemble(**params, replicates=args.replicates, seed=0)
+    while ensemble.running and ensemble.steps < args.steps:
+        ensemble.step()
+    summary = ensemble.summary(args.level).iloc[-1]
+    z = NormalDist().inv_cdf((1 + args.level) / 2)
+    flagged = 0
+    for i, name in enumerate(names(include_wealth)):
+        mean = last[:, i].mean()
+        half = z * last[:, i].std(ddof=1) / np.sqrt(args.seeds)
+        low, high = summary[name, "low"], summary[name, "high"]
+        flag = "ok" if low <= mean + half and mean - half <= high else "DIVERGES"
+        flagged += flag == "DIVERGES"
+        print(
+            f"{label} ensemble {name}: mesa {mean:.1f} [{mean - half:.1f}, "
+            f"{mean + half:.1f}] ensemble {summary[name, 'mean']:.1f} "
+            f"[{low:.1f}, {high:.1f}] {flag}"
+        )
+    return flagged
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    flagged = 0
+    for legitimacy, include_wealth, ledger in configurations(args):
+        label = f"legitimacy={legitimacy} include_wealth={include_wealth}"
+        if include_wealth:
+            label += f" ledger={ledger}"
+        runs = {}
+        for engine in ("mesa", "array"):
+            results = [
+                run(engine, legitimacy, include_wealth, ledger, seed, args)
+                for seed in range(args.seeds)
+            ]
+            runs[engine] = [np.array(r) for r in zip(*results)]
+        mesa, array = runs["mesa"], runs["array"]
+        flagged += compare(label, mesa[0], array[0], include_wealth, args)
+        if ledger == "sequential":
+            flagged += compare_ensemble(
+                label, legitimacy, include_wealth, mesa[1], args
+            )
+    print(f"{flagged} divergence(s)")
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
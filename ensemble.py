@@ -0,0 +1,153 @@
+import math
+import random
+from statistics import NormalDist
+import numpy as np
+from agents.arrays import ArrayEngine
+from agents.authority import Bank
+from utils.metrics import REPORTERS, EnsembleMetrics
+from utils.population import Population
+from utils.params import ap_constant
+
+# The file contains the ensemble mode of the World. Replicates of the same
+# configuration only differ in their random draws, so instead of building one
+# World per replicate the ensemble keeps all of them in a single array engine
+# with a leading replicate axis and advances every replicate in one step.
+
+
+class Ensemble:
+    """
+    Replicates of one World configuration stepped together by the array
+    engine. The replicates share one random generator, so a replicate can only
+    be reproduced together with the whole ensemble from the same seed.
+
+    A replicate stops when it has less than 2 citizens left, like a World
+    does. It is still stepped with the others but no longer recorded.
+
+    The agents of every replicate take their turns in the same order as in
+    a World of the mesa engine, and with include_wealth the bank keeps the
+    sequential ledger of a World for every replicate, its citizens settling
+    one after the other in citizen order. The summary of the ensemble thus
+    follows the mesa engine (see compare_engines.py).
+
+    Attributes:
+        replicates: number of replicates
+        gridsize, cop_density, citizen_density, agent_type, legitimacy,
+        l_state, reduction_constant, active_threshold, include_wealth,
+        rich_threshold: parameters of every replicate, same as World
+        populations: population counters of every replicate
+        mean: mean savings of the citizens of every replicate
+        agents_killed: number of citizens killed by cops in every replicate
+        active: whether every replicate is still running
+        series: one (reporters, replicates) array per recorded step
+    """
+
+    def __init__(
+        self,
+        gridsize,
+        cop_density,
+        citizen_density,
+        agent_type,
+        legitimacy,
+        l_state,
+        reduction_constant,
+        active_threshold,
+        include_wealth,
+        rich_threshold,
+        replicates=100,
+        seed=None,
+    ):
+        self.random = random.Random(seed)
+        self.replicates = replicates
+
+        self.gridsize = gridsize
+        self.cop_density = cop_density
+        self.citizen_density = citizen_density
+        self.agent_type = agent_type
+        self.legitimacy = legitimacy
+        self.l_state = l_state
+        self.reduction_constant = reduction_constant
+        self.active_threshold = active_threshold
+        self.include_wealth = include_wealth
+        self.rich_threshold = rich_threshold
+        self.ap_constant = ap_constant
+
+        self.mean = np.zeros(replicates)
+        self.agents_killed = np.zeros(replicates, dtype=np.int64)
+        self.metrics = EnsembleMetrics(replicates)
+        self.populations = [Population() for _ in range(replicates)]
+        self.bank = Bank(1, self)
+        self.arrays = ArrayEngine(self, gridsize, self.populations)
+        self.arrays.placement()
+        self.arrays.update_population()
+
+        self.steps = 0
+        self.series = []
+        self.active = np.ones(replicates, dtype=bool)
+        self.running = True
+
+    def update_core(self):
+        if self.l_state:
+            if self.legitimacy > 0.0:
+                self.legitimacy -= self.reduction_constant
+            else:
+                self.legitimacy = 0.0
+
+    def record(self):
+        """
+        Records the reporter values of every running replicate, the stopped
+        replicates are recorded as NaN.
+        """
+        values = self.metrics.values
+        self.series.append(
+            np.where(self.active, [values[name] for name in REPORTERS], math.nan)
+        )
+
+    def step(self):
+
+        # One step of every replicate, recorded before stepping like World does
+
+        self.metrics.collect(self)
+        self.record()
+        self.mean = self.metrics.mean_savings
+        self.arrays.step()
+        self.steps += 1
+        self.update_core()
+
+        citizens = np.array([p.citizens for p in self.populations])
+        self.active &= citizens >= 2
+        self.running = bool(self.active.any())
+
+    def replicate_frame(self):
+        """
+        Reporter series of every replicate as a DataFrame indexed by
+        (Step, Replicate), with the same columns as the DataCollector of World.
+        """
+        import pandas as pd
+
+        series = np.array(self.series).reshape(-1, len(REPORTERS), self.replicates)
+        index = pd.MultiIndex.from_product(
+            [range(len(series)), range(self.replicates)], names=["Step", "Replicate"]
+        )
+        frame = pd.DataFrame(
+            series.transpose(0, 2, 1).reshape(-1, len(REPORTERS)),
+            index=index,
+            columns=REPORTERS,
+        )
+        return frame.dropna(how="all")
+
+    def summary(self, level=0.95):
+        """
+        Mean of every reporter across the running replicates at every step
+        with the normal approximation confidence interval at the given level.
+        Columns are (reporter, "mean" | "low" | "high" | "n").
+        """
+        import pandas as pd
+
+        grouped = self.replicate_frame().groupby(level="Step")
+        mean = grouped.mean()
+        n = grouped.count()
+        half = NormalDist().inv_cdf((1 + level) / 2) * grouped.std() / np.sqrt(n)
+        half = half.fillna(0)
+        return pd.concat(
+            {"mean": mean, "low": mean - half, "high": mean + half, "n": n}, axis=1
+        ).swaplevel(axis=1)[list(REPORTERS)]
@@ -1,13 +1,24 @@
+import gc
 import sys
 import random
-import statistics as s
+import numpy as np
 from mesa import Model
-from mesa.space import MultiGrid
-from mesa.time import SimultaneousActivation
-from mesa.datacollection import DataCollector
 from agents.citizen import Citizen
 from agents.authority import Cop, Bank
-from utils.params import reduction_factor
+from agents.arrays import ArrayEngine
+from agents.base import NeighborBuffers
+from utils.params import reduction_factor, citizen_vision, jail_period, ap_constant
+from utils.metrics import Metrics
+from utils.population import Population
+from utils.space import ArrayGrid, IndexedMultiGrid
+from utils.fields import NeighborFields
+from utils.market import Market
+from utils.sinks import StreamingCollector
+from utils.recording import Recorder, snapshot
+from utils.checkpoint import save_checkpoint
+from utils.profiling import Profiler
+from utils.schedule import AgentStore
+from utils.stopping import StopRules
 
 
 class World(Model):
@@ -37,6 +48,26 @@ class World(Model):
         active_threshold,
         include_wealth,
         rich_threshold,
+        debug_counts=False,
+        engine="mesa",
+        grid_backend="multi",
+        neighbor_counts="lists",
+        seed=None,
+        sink=None,
+        flush_every=100,
+        checkpoint=None,
+        checkpoint_every=1000,
+        profile=False,
+        jail_wheel=False,
+        ledger="sequential",
+        trades="agents",
+        stats=False,
+        bulk_placement=False,
+        record=None,
+        record_every=1,
+        stop=(),
+        stop_window=100,
+        stop_tolerance=0.01,
     ):
 
         # Create a new World instance.
@@ -49,6 +80,51 @@ class World(Model):
         #    l_state: the legitimacy state
         #    reduction_constant: the constant attribute which decide by what rate
         #        the state of l_state will reduce
+        #    debug_counts: cross check the population counters against a full
+        #        recount every step
+        #    engine: "mesa" steps every agent object through the scheduler,
+        #        "array" steps the whole population at once in NumPy arrays
+        #    grid_backend: grid of the mesa engine, "multi" for mesa's MultiGrid,
+        #        "array" for the array backed grid meant for large worlds
+        #    neighbor_counts: how citizens of the mesa engine count revolting
+        #        citizens and cops around them, "lists" from their neighbor
+        #        objects, "fields" from neighborhood counts kept up to date as
+        #        the agents move and change state
+        #    seed: seed of the random generator of this World, a given seed
+        #        always reproduces the same run
+        #    sink: path the model reporters are streamed to instead of being
+        #        kept in memory, a .csv file or a directory of .npz chunks
+        #    flush_every: number of reporter rows buffered before they are
+        #        written to the sink
+        #    checkpoint: path the World is saved to every checkpoint_every
+        #        steps, see utils/checkpoint.py to restore it
+        #    profile: time every phase of the step, see set_profiling
+        #    jail_wheel: park the citizens of the mesa engine while they are
+        #        jailed instead of stepping them every step, see jail
+        #    ledger: how the citizens of the mesa engine settle with the bank,
+        #        "sequential" one after the other during their step,
+        #        "batched" all at once after the agents stepped, see Bank
+        #    trades: how the citizens of the mesa engine find who to trade
+        #        with, "agents" each during its step, "cells" all at once after
+        #        the agents stepped (utils/market.py), which needs the batched
+        #        ledger
+        #    stats: also report the spread of the wealth and confidence of the
+        #        citizens, standard deviations per status and quantiles, see
+        #        utils/metrics.py
+        #    bulk_placement: place the agents of the mesa engine from arrays
+        #        drawn at once instead of cell by cell, see place_bulk
+        #    record: directory the grid snapshots and reporter rows of every
+        #        record_every-th step are recorded to, to be replayed later
+        #        without running the World, see utils/recording.py
+        #    stop: rules which stop the run early, by name ("steady",
+        #        "legitimacy", "no_cops", "cycles") or as rule objects, see
+        #        utils/stopping.py. The reason is kept in stop_reason.
+        #    stop_window, stop_tolerance: window and tolerance of the steady
+        #        rule
+
+        # Every World gets its own generator, mesa keeps a single one on the class
+        self.random = random.Random(seed)
+        self._seed = seed
 
         self.cop_density = cop_density
         self.citizen_density = citizen_density
@@ -61,8 +137,24 @@ class World(Model):
         self.active_threshold = active_threshold
         self.include_wealth = include_wealth
         self.rich_threshold = rich_threshold
-
-        self.ap_constant = 2.3
+        self.debug_counts = debug_counts
+        self.sink = sink
+        self.flush_every = flush_every
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.record = record
+        self.record_every = record_every
+        self.recorder = self.new_recorder()
+        self.stop = stop
+        self.stop_window = stop_window
+        self.stop_tolerance = stop_tolerance
+        self.stop_rules = self.new_stop_rules()
+        self.stop_reason = None
+        self.profiler = Profiler() if profile else None
+        self.jail_wheel = jail_wheel
+        self.ledger = ledger
+
+        self.ap_constant = ap_constant
 
         # Agent count r_c: rich_count, r_a_c: rich_active_count, m_c: middle_count, m_a_c: middle_active_count, p_c: poor_count, p_a_c: poor_active_count,.
         self.r_c = 0
@@ -73,11 +165,50 @@ class World(Model):
         self.p_a_c = 0
 
         self.mean = 0
-        self.kill_agents = []
+        self.metrics = Metrics(stats)
+        self.population = Population()
+        self.kill_agents = {}
         self.agents_killed = 0
-        self.grid = MultiGrid(gridsize, gridsize, False)
-        self.schedule = SimultaneousActivation(self)
+
+        self.engine = engine
+        self.arrays = None
+        if engine == "array":
+            self.grid = None
+            self.arrays = ArrayEngine(self, gridsize)
+        elif engine == "mesa":
+            if grid_backend == "array":
+                self.grid = ArrayGrid(gridsize, gridsize, False)
+            elif grid_backend == "multi":
+                self.grid = IndexedMultiGrid(gridsize, gridsize, False)
+            else:
+                raise ValueError(
+                    f"Unknown grid backend {grid_backend!r}, use 'multi' or 'array'"
+                )
+        else:
+            raise ValueError(f"Unknown engine {engine!r}, use 'mesa' or 'array'")
+
+        self.fields = None
+        if neighbor_counts == "fields" and self.arrays is None:
+            self.fields = NeighborFields(gridsize, gridsize, citizen_vision)
+        elif neighbor_counts not in ("lists", "fields"):
+            raise ValueError(
+                f"Unknown neighbor counts {neighbor_counts!r}, use 'lists' or 'fields'"
+            )
+        self.market = None
+        if trades == "cells" and self.arrays is None:
+            if ledger != "batched":
+                raise ValueError("Trades matched by cells need ledger='batched'")
+            self.market = Market(self)
+        elif trades not in ("agents", "cells"):
+            raise ValueError(f"Unknown trades {trades!r}, use 'agents' or 'cells'")
+        # Neighbor lists filled by the citizens and cops during their step
+        self.citizen_buffers = NeighborBuffers()
+        self.cop_buffers = NeighborBuffers()
+        self.schedule = AgentStore(self)
+        self.bulk_placement = bulk_placement
         self.placement(gridsize)
+        if self.fields is not None:
+            self.fields.refresh(self.schedule.agents)
         self.running = True
 
     def placement(self, gridsize):
@@ -92,7 +223,18 @@ class World(Model):
         if self.cop_density + self.citizen_density > 1:
             print("Density ratios must not exceed 1", file=sys.stderr)
 
-        self.bank = Bank(1, self)
+        self.bank = Bank(1, self, self.ledger)
+
+        if self.arrays is not None:
+            self.arrays.placement()
+            self.arrays.update_population()
+            self.datacollector = self.new_collector()
+            return
+
+        if self.bulk_placement:
+            self.place_bulk(gridsize)
+            self.datacollector = self.new_collector()
+            return
 
         for (_, x, y) in self.grid.coord_iter():
 
@@ -100,6 +242,7 @@ class World(Model):
                 a = Cop(unique_id, self)
                 self.schedule.add(a)
                 self.grid.place_agent(a, (x, y))
+                self.population.add(a)
                 unique_id += 1
 
             elif self.random.random() < (self.cop_density + self.citizen_density):
@@ -113,101 +256,115 @@ class World(Model):
                 )
                 self.schedule.add(a)
                 self.grid.place_agent(a, (x, y))
+                self.population.add(a)
                 unique_id += 1
 
-        self.datacollector = DataCollector(
-            model_reporters={
-                "Poor Grievance": lambda m: self.measure_poor_grievance(m),
-                "Middle Grievance": lambda m: self.measure_middle_grievance(m),
-                "Rich Grievance": lambda m: self.measure_rich_grievance(m),
-                "Calm": lambda m: self.count_calm(m),
-                "Revolt": lambda m: self.count_revolt(m),
-                "Jail": lambda m: self.count_jailed(m),
-                "Cops": lambda m: self.count_cops(m),
-                "Rich": lambda m: self.count_rich(m),
-                "Middle": lambda m: self.count_middle(m),
-                "Poor": lambda m: self.count_poor(m),
-                "Rich Wealth": lambda m: self.measure_rich_wealth(m),
-                "Middle Wealth": lambda m: self.measure_middle_wealth(m),
-                "Poor Wealth": lambda m: self.measure_poor_wealth(m),
-                "Rich Confidence": lambda m: self.measure_rich_confidence(m),
-                "Middle Confidence": lambda m: self.measure_middle_confidence(m),
-                "Poor Confidence": lambda m: self.measure_poor_confidence(m),
-                "Rich Hardship": lambda m: self.measure_rich_hardship(m),
-                "Middle Hardship": lambda m: self.measure_middle_hardship(m),
-                "Poor Hardship": lambda m: self.measure_poor_hardship(m),
-                "Legitimacy": lambda m: self.measure_legitimacy(m),
-                "WO Revolt": lambda m: self.wo_wealth_active(m),
-                "WO Calm": lambda m: self.wo_wealth_calm(m),
-                "WO Jail": lambda m: self.wo_wealth_jail(m),
-            }
+        self.datacollector = self.new_collector()
+
+    def place_bulk(self, gridsize):
+
+        # Same placement as the cell by cell loop, with every cell assignment,
+        # hardship, risk aversion and wallet drawn at once from a NumPy
+        # generator seeded from the random generator of the World, then the
+        # agents built and added to the grid and schedule in one go. Agents
+        # get their unique_id in cell order as in the loop.
+
+        rng = np.random.default_rng(self.random.getrandbits(64))
+        cells = gridsize * gridsize
+        cop = rng.random(cells) < self.cop_density
+        citizen = ~cop & (rng.random(cells) < self.cop_density + self.citizen_density)
+        occupied = np.flatnonzero(cop | citizen)
+        n = int(citizen.sum())
+        citizens = zip(
+            rng.random(n).tolist(),
+            rng.random(n).tolist(),
+            rng.integers(1, self.rich_threshold + 2, n).tolist(),
         )
 
-    def update_agent_count(self):
+        # Building that many objects would trigger the cycle collector over
+        # and over, none of them is garbage yet
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            agents = []
+            for unique_id, is_cop in enumerate(cop[occupied].tolist(), 1):
+                if is_cop:
+                    agents.append(Cop(unique_id, self))
+                else:
+                    hardship, risk_aversion, wallet = next(citizens)
+                    agents.append(
+                        Citizen(
+                            unique_id,
+                            self,
+                            hardship=hardship,
+                            risk_aversion=risk_aversion,
+                            bank=self.bank,
+                            rich_threshold=self.rich_threshold,
+                            wallet=wallet,
+                        )
+                    )
+            self.grid.place_agents(agents, occupied.tolist())
+            self.schedule.add_many(agents)
+            self.population.add_placed(len(agents) - n, n)
+        finally:
+            if collecting:
+                gc.enable()
+
+    def new_collector(self):
+
+        # DataCollector of the model reporters, streaming to the sink if any.
+        # mesa's DataCollector pulls in pandas, so it is only imported when a
+        # World keeps its reporters in memory.
+
+        if self.sink is None:
+            from mesa.datacollection import DataCollector
+
+            return DataCollector(model_reporters=Metrics.reporters(self.metrics.stats))
+        return StreamingCollector.to_path(
+            Metrics.reporters(self.metrics.stats),
+            self.sink,
+            flush_every=self.flush_every,
+            start=self.schedule.steps,
+        )
 
-        # Updates the number of current and active agents
+    def new_recorder(self):
 
-        self.r_c = len(
-            [
-                a
-                for a in self.schedule.agents
-                if a.alignment == "Citizen" and a.status == "Rich"
-            ]
-        )
-        self.r_a_c = len(
-            [
-                a
-                for a in self.schedule.agents
-                if a.alignment == "Citizen"
-                and a.status == "Rich"
-                and a.state == "Revolt"
-            ]
-        )
+        # Recorder of the grid snapshots and reporter rows, if recording
 
-        self.m_c = len(
-            [
-                a
-                for a in self.schedule.agents
-                if a.alignment == "Citizen" and a.status == "Middle"
-            ]
-        )
-        self.m_a_c = len(
-            [
-                a
-                for a in self.schedule.agents
-                if a.alignment == "Citizen"
-                and a.status == "Middle"
-                and a.state == "Revolt"
-            ]
-        )
+        if self.record is None:
+            return None
+        return Recorder(self.record, every=self.record_every)
 
-        self.p_c = len(
-            [
-                a
-                for a in self.schedule.agents
-                if a.alignment == "Citizen" and a.status == "Poor"
-            ]
-        )
-        self.p_a_c = len(
-            [
-                a
-                for a in self.schedule.agents
-                if a.alignment == "Citizen"
-                and a.status == "Poor"
-                and a.state == "Revolt"
-            ]
-        )
+    def new_stop_rules(self):
+
+        # Stop rules of the run, if any
+
+        if not self.stop:
+            return None
+        return StopRules(self.stop, self.stop_window, self.stop_tolerance)
+
+    def snapshot(self):
+
+        # Grid snapshot of the citizens and cops, see utils/recording.py
+
+        return snapshot(self)
+
+    def update_agent_count(self):
+
+        # Updates the number of current and active agents from the population counters
+
+        self.r_c = self.population.statuses["Rich"]
+        self.r_a_c = self.population.active("Rich")
+        self.m_c = self.population.statuses["Middle"]
+        self.m_a_c = self.population.active("Middle")
+        self.p_c = self.population.statuses["Poor"]
+        self.p_a_c = self.population.active("Poor")
 
     def mean_wealth(self):
 
-        # Calculate the mean wealth of all the citizen agents
+        # Mean savings of all the citizen agents from the latest metrics pass
 
-        self.agents = [
-            agent.savings
-            for agent in self.schedule.agents
-            if agent.alignment == "Citizen"
-        ]
-        self.mean = s.mean(self.agents)
+        self.mean = self.metrics.mean_savings
 
     def update_core(self):
         if self.l_state:
@@ -216,291 +373,142 @@ class World(Model):
             else:
                 self.legitimacy = 0.0
 
-    def step(self):
+    def set_profiling(self, enabled):
 
-        # Calculation of world attributes in one step(iteration) of execution
+        # Switches the per phase profiler (utils/profiling.py) on or off.
+        # Switching it off returns the profiler with its report.
+
+        if enabled and self.profiler is None:
+            self.profiler = Profiler()
+        elif not enabled and self.profiler is not None:
+            profiler, self.profiler = self.profiler, None
+            profiler.close()
+            return profiler
+        return self.profiler
 
+    def collect(self):
+
+        # Refreshes the metrics and agent counts, collects the model reporters
+        # and passes them to the stop rules
+
+        self.metrics.collect(self)
         self.update_agent_count()
         self.datacollector.collect(self)
-        self.mean_wealth()
-        self.schedule.step()
-        self.update_core()
+        if self.recorder is not None:
+            self.recorder.record(self)
+        if self.stop_rules is not None and self.stop_reason is None:
+            self.stop_reason = self.stop_rules.update(self.metrics.values)
 
-        if self.kill_agents:
-            self.kill_agents = list(dict.fromkeys(self.kill_agents))
-            for i in self.kill_agents:
-                self.grid.remove_agent(i)
-                self.schedule.remove(i)
-            self.kill_agents = []
+    def step_agents(self):
 
-        total_agents = len(
-            [a for a in self.schedule.agents if a.alignment == "Citizen"]
-        )
-        if total_agents < 2:
-            self.running = False
+        # Steps every agent with the engine of the World
 
-    @staticmethod
-    def count_calm(model):
-        a = len(
-            [
-                a
-                for a in model.schedule.agents
-                if a.alignment == "Citizen" and a.state == "Calm"
-            ]
-        )
-        return a
+        if self.arrays is not None:
+            self.arrays.step()
+            self.schedule.steps += 1
+            self.schedule.time += 1
+        else:
+            if self.market is not None:
+                self.market.open(self.schedule.agents)
+            self.schedule.step()
+            if self.market is not None:
+                self.market.trade(self.bank.pending)
+            if self.bank.batched:
+                self.bank.settle()
 
-    @staticmethod
-    def count_revolt(model):
-        a = len(
-            [
-                a
-                for a in model.schedule.agents
-                if a.alignment == "Citizen" and a.state == "Revolt"
-            ]
-        )
-        return a
+    def jail(self, citizen):
 
-    @staticmethod
-    def count_jailed(model):
-        a = len(
-            [
-                a
-                for a in model.schedule.agents
-                if a.alignment == "Citizen" and a.state == "Jail"
-            ]
-        )
-        return a
+        # Jails the citizen. With the jail wheel the citizen is parked until the
+        # step its jail time crosses jail_period: it serves its first step of
+        # jail in its next turn, this step if it has not been stepped yet. A
+        # parked citizen is not stepped, so its confidence is only measured
+        # again when it is released, see Citizen.wake.
 
-    @staticmethod
-    def count_cops(model):
-        a = len([a for a in model.schedule.agents if a.alignment == "Cop"])
-        return a
+        citizen.state = "Jail"
+        citizen.movement = False
+        if self.jail_wheel and self.arrays is None:
+            first = self.schedule.steps + self.schedule.stepped(citizen)
+            self.schedule.park(citizen, first + jail_period - citizen.j_time)
 
-    @staticmethod
-    def count_rich(model):
-        a = len(
-            [
-                a
-                for a in model.schedule.agents
-                if a.alignment == "Citizen" and a.status == "Rich"
-            ]
-        )
-        return a
+    def kill(self, agent):
 
-    @staticmethod
-    def count_middle(model):
-        a = len(
-            [
-                a
-                for a in model.schedule.agents
-                if a.alignment == "Citizen" and a.status == "Middle"
-            ]
-        )
-        return a
+        # Marks the agent to be removed at the end of the step. An agent
+        # killed several times in a step is only removed once.
 
-    @staticmethod
-    def count_poor(model):
-        a = len(
-            [
-                a
-                for a in model.schedule.agents
-                if a.alignment == "Citizen" and a.status == "Poor"
-            ]
-        )
-        return a
+        self.kill_agents[agent.unique_id] = agent
 
-    @staticmethod
-    def measure_poor_grievance(model):
-        if model.include_wealth:
-            confidence = [
-                a.grievance
-                for a in model.schedule.agents
-                if a.alignment == "Citizen" and a.status == "Poor"
-            ]
-            if confidence:
-                total = sum(confidence)
-                return total
-            else:
-                return 0
-        else:
-            confidence = [
-                a.grievance for a in model.schedule.agents if a.alignment == "Citizen"
-            ]
-            return sum(confidence)
+    def remove_killed(self):
 
-    @staticmethod
-    def measure_middle_grievance(model):
-        confidence = [
-            a.grievance
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Middle"
-        ]
-        if confidence:
-            total = sum(confidence)
-            return total
-        else:
-            return 0
+        # Removes the agents killed during the step from the world, in the
+        # order they were first killed
 
-    @staticmethod
-    def measure_rich_grievance(model):
-        confidence = [
-            a.grievance
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Rich"
-        ]
-        if confidence:
-            total = sum(confidence)
-            return total
-        else:
-            return 0
+        if self.kill_agents:
+            for i in self.kill_agents.values():
+                if self.fields is not None:
+                    self.fields.remove(i)
+                self.grid.remove_agent(i)
+                self.schedule.remove(i)
+                self.population.remove(i)
+            self.kill_agents = {}
 
-    @staticmethod
-    def measure_rich_wealth(model):
-        wealth = [
-            a.wealth
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Rich"
-        ]
-        return s.mean(wealth) if wealth else 0
+    def step(self):
 
-    @staticmethod
-    def measure_middle_wealth(model):
-        wealth = [
-            a.wealth
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Middle"
-        ]
-        return s.mean(wealth) if wealth else 0
+        # Calculation of world attributes in one step(iteration) of execution
 
-    @staticmethod
-    def measure_poor_wealth(model):
-        wealth = [
-            a.wealth
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Poor"
-        ]
-        return s.mean(wealth) if wealth else 0
+        if self.profiler is not None:
+            self.profiler.begin_step()
 
-    @staticmethod
-    def measure_poor_confidence(model):
-        confidence = [
-            a.confidence
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Poor"
-        ]
-        if confidence:
-            total = s.mean(confidence)
-            return total
-        else:
-            return 0
+        if self.debug_counts and self.arrays is None:
+            self.population.verify(self.schedule.agents)
 
-    @staticmethod
-    def measure_middle_confidence(model):
-        confidence = [
-            a.confidence
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Middle"
-        ]
-        if confidence:
-            total = s.mean(confidence)
-            return total
-        else:
-            return 0
+        self.collect()
+        self.mean_wealth()
+        self.step_agents()
+        self.update_core()
+        self.remove_killed()
 
-    @staticmethod
-    def measure_rich_confidence(model):
-        confidence = [
-            a.confidence
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Rich"
-        ]
-        if confidence:
-            total = s.mean(confidence)
-            return total
-        else:
-            return 0
+        if self.population.citizens < 2 and self.stop_reason is None:
+            self.stop_reason = "no_citizens"
+        if self.stop_reason is not None:
+            self.running = False
+            if self.sink is not None:
+                self.datacollector.flush()
+            if self.recorder is not None:
+                self.recorder.flush()
 
-    @staticmethod
-    def measure_total_reserves(model):
-        return s.mean(model.bank.total_reserves)
+        if (
+            self.checkpoint is not None
+            and self.schedule.steps % self.checkpoint_every == 0
+        ):
+            save_checkpoint(self, self.checkpoint)
+
+        if self.profiler is not None:
+            self.profiler.end_step(self.schedule.steps)
 
     @staticmethod
-    def measure_poor_hardship(model):
-
-        confidence = [
-            a.hardship
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Poor"
-        ]
-        if confidence:
-            total = sum(confidence)
-            return total
-        else:
-            return 0
+    def count_calm(model):
+        return model.population.states["Calm"]
 
     @staticmethod
-    def measure_middle_hardship(model):
-        confidence = [
-            a.hardship
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Middle"
-        ]
-        if confidence:
-            total = sum(confidence)
-            return total
-        else:
-            return 0
+    def count_revolt(model):
+        return model.population.states["Revolt"]
 
     @staticmethod
-    def measure_rich_hardship(model):
-        confidence = [
-            a.hardship
-            for a in model.schedule.agents
-            if a.alignment == "Citizen" and a.status == "Rich"
-        ]
-        if confidence:
-            total = sum(confidence)
-            return total
-        else:
-            return 0
+    def count_jailed(model):
+        return model.population.states["Jail"]
 
     @staticmethod
-    def measure_legitimacy(model):
-        return model.legitimacy * 100
+    def count_cops(model):
+        return model.population.cops
 
     @staticmethod
-    def wo_wealth_active(model):
-        if model.include_wealth == False:
-            active = [
-                a
-                for a in model.schedule.agents
-                if a.alignment == "Citizen" and a.state == "Revolt"
-            ]
-            return len(active)
-        else:
-            return 0
+    def count_rich(model):
+        return model.population.statuses["Rich"]
 
     @staticmethod
-    def wo_wealth_calm(model):
-        if model.include_wealth == False:
-            active = [
-                a
-                for a in model.schedule.agents
-                if a.alignment == "Citizen" and a.state == "Calm"
-            ]
-            return len(active)
-        else:
-            return 0
+    def count_middle(model):
+        return model.population.statuses["Middle"]
 
     @staticmethod
-    def wo_wealth_jail(model):
-        if model.include_wealth == False:
-            active = [
-                a
-                for a in model.schedule.agents
-                if a.alignment == "Citizen" and a.state == "Jail"
-            ]
-            return len(active)
-        else:
-            return 0
+    def count_poor(model):
+        return model.population.statuses["Poor"]
@@ -1,6 +1,11 @@
 from env import World
 from agents.citizen import Citizen
 from utils.params import model_params, gridsize
+from utils.params import background, render_every, raster, replay, replay_speed
+from utils.background import BatchedChartModule, BackgroundServer
+from utils.raster import RasterGrid, RasterServer
+from utils.recording import Replay
+from utils.replay import ReplayControl, ReplayServer
 from utils.portrayal import agent_portrayal, grievance_portrayal
 from mesa.visualization.modules import (
     CanvasGrid,
@@ -9,9 +14,44 @@ from mesa.visualization.modules import (
     PieChartModule,
 )
 from mesa.visualization.ModularVisualization import ModularServer
+from mesa.visualization.UserParam import UserSettableParameter
+
+# Parameters the user can change in the browser, starting from the values of
+# utils/params.py
+user_params = dict(
+    model_params,
+    cop_density=UserSettableParameter(
+        "slider", "Cop Density", model_params["cop_density"], 0, 1, 0.001
+    ),
+    citizen_density=UserSettableParameter(
+        "slider", "Citizen Density", model_params["citizen_density"], 0, 1, 0.001
+    ),
+    legitimacy=UserSettableParameter(
+        "slider", "Legitimacy", model_params["legitimacy"], 0.001, 1, 0.001
+    ),
+    l_state=UserSettableParameter(
+        "checkbox", "Decrease Legitimacy", value=model_params["l_state"]
+    ),
+    reduction_constant=UserSettableParameter(
+        "number", "Reduction Constant", value=model_params["reduction_constant"]
+    ),
+    active_threshold=UserSettableParameter(
+        "slider", "Active Threshold", model_params["active_threshold"], 0, 1, 0.1
+    ),
+    include_wealth=UserSettableParameter(
+        "checkbox", "Include Wealth", value=model_params["include_wealth"]
+    ),
+    rich_threshold=UserSettableParameter(
+        "slider", "Rich Threshold", model_params["rich_threshold"], 1, 20
+    ),
+)
+
+# In the background and replay modes the charts receive every row since the
+# previous frame
+Chart = BatchedChartModule if background or replay is not None else ChartModule
 
 # Chart showing the varying grievance levels of agents
-grievance_chart = ChartModule(
+grievance_chart = Chart(
     [
         {"Label": "Poor Grievance", "Color": "Red"},
         {"Label": "Middle Grievance", "Color": "Yellow"},
@@ -21,7 +61,7 @@ grievance_chart = ChartModule(
 )
 
 # Chart showing the varying confidence levels of agents
-confidence_chart = ChartModule(
+confidence_chart = Chart(
     [
         {"Label": "Poor Confidence", "Color": "Red"},
         {"Label": "Middle Confidence", "Color": "Yellow"},
@@ -31,7 +71,7 @@ confidence_chart = ChartModule(
 )
 
 # Chart showing the varying hardship levels of agents
-hardship_chart = ChartModule(
+hardship_chart = Chart(
     [
         {"Label": "Poor Hardship", "Color": "Red"},
         {"Label": "Middle Hardship", "Color": "Yellow"},
@@ -41,7 +81,7 @@ hardship_chart = ChartModule(
 )
 
 # Chart showing the varying wealth of agents
-wealth_chart = ChartModule(
+wealth_chart = Chart(
     [
         {"Label": "Poor Wealth", "Color": "Red"},
         {"Label": "Middle Wealth", "Color": "Yellow"},
@@ -51,7 +91,7 @@ wealth_chart = ChartModule(
 )
 
 # Chart showing the overall count agents
-citizen_count_chart = ChartModule(
+citizen_count_chart = Chart(
     [
         {"Label": "Poor", "Color": "Red"},
         {"Label": "Middle", "Color": "Yellow"},
@@ -63,7 +103,7 @@ citizen_count_chart = ChartModule(
 )
 
 # Chart showing the state of agents when wealth is not included
-without_chart = ChartModule(
+without_chart = Chart(
     [
         {"Label": "WO Calm", "Color": "Green"},
         {"Label": "WO Revolt", "Color": "Red"},
@@ -75,7 +115,7 @@ without_chart = ChartModule(
 )
 
 # Chart showing the state of agents when wealth is included
-state_chart = ChartModule(
+state_chart = Chart(
     [
         {"Label": "Calm", "Color": "Green"},
         {"Label": "Revolt", "Color": "Red"},
@@ -86,26 +126,45 @@ state_chart = ChartModule(
     data_collector_name="datacollector",
 )
 
-# Main grid showcasing the simulation of agents
-grid = CanvasGrid(agent_portrayal, gridsize, gridsize, 500, 500)
-# Grievance grid potratying the varying grievance levels of agents
-grievance_grid = CanvasGrid(grievance_portrayal, gridsize, gridsize, 500, 500)
+if replay is not None:
+    # A replay shows the grids of the size it was recorded with
+    recording = Replay(replay)
+    grid = RasterGrid("agents", recording.width, recording.height, 500, 500)
+    grievance_grid = RasterGrid(
+        "grievance", recording.width, recording.height, 500, 500
+    )
+elif raster:
+    # Same grids sent as packed cell codes, with the labels on hover
+    grid = RasterGrid("agents", gridsize, gridsize, 500, 500)
+    grievance_grid = RasterGrid("grievance", gridsize, gridsize, 500, 500)
+else:
+    # Main grid showcasing the simulation of agents
+    grid = CanvasGrid(agent_portrayal, gridsize, gridsize, 500, 500)
+    # Grievance grid potratying the varying grievance levels of agents
+    grievance_grid = CanvasGrid(grievance_portrayal, gridsize, gridsize, 500, 500)
 
 # Initializing the environment and placement of grids
-server = ModularServer(
-    World,
-    [
-        grid,
-        grievance_grid,
-        state_chart,
-        citizen_count_chart,
-        grievance_chart,
-        hardship_chart,
-        wealth_chart,
-        without_chart,
-    ],
-    "World",
-    model_params,
-)
+elements = [
+    grid,
+    grievance_grid,
+    state_chart,
+    citizen_count_chart,
+    grievance_chart,
+    hardship_chart,
+    wealth_chart,
+    without_chart,
+]
+if replay is not None:
+    server = ReplayServer(
+        [ReplayControl()] + elements, "World replay", replay, speed=replay_speed
+    )
+elif background:
+    server = BackgroundServer(
+        World, elements, "World", user_params, render_every=render_every
+    )
+elif raster:
+    server = RasterServer(World, elements, "World", user_params)
+else:
+    server = ModularServer(World, elements, "World", user_params)
 # Port number for visualization
 server.port = 8521
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The tests import the modules of the repository the way run.py and batch.py
+# do, from the repository root.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
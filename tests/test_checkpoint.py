@@ -0,0 +1,46 @@
+import pytest
+from env import World
+from utils.checkpoint import load_checkpoint, save_checkpoint
+from utils.params import model_params
+
+# A World restored from a checkpoint continues exactly like the World which
+# was never saved.
+
+PARAMS = dict(model_params, gridsize=20, cop_density=0.1, legitimacy=0.6)
+STEPS = 40
+SAVED = 15
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        dict(),
+        dict(jail_wheel=True, ledger="batched", trades="cells"),
+        dict(neighbor_counts="fields", stats=True),
+        dict(engine="array"),
+    ],
+)
+def test_round_trip(tmp_path, options):
+    path = str(tmp_path / "world.ckpt")
+    world = World(**PARAMS, seed=7, **options)
+    for _ in range(STEPS):
+        world.step()
+
+    saved = World(**PARAMS, seed=7, **options)
+    for _ in range(SAVED):
+        saved.step()
+    save_checkpoint(saved, path)
+    restored = load_checkpoint(path)
+    for _ in range(STEPS - SAVED):
+        restored.step()
+
+    expected = world.datacollector.get_model_vars_dataframe()
+    assert restored.datacollector.get_model_vars_dataframe().equals(expected)
+    assert restored.agents_killed == world.agents_killed
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "world.ckpt"
+    path.write_bytes(b"not a checkpoint")
+    with pytest.raises(ValueError):
+        load_checkpoint(str(path))
@@ -0,0 +1,43 @@
+from utils.config import ResultCache, RunConfig
+
+# The result cache hands back the outputs of a run only for the same
+# configuration and only once the entry is complete.
+
+
+def run_outputs(tmp_path, name):
+    path = tmp_path / f"{name}.csv"
+    path.write_text("Step,Revolt\n0,1\n")
+    return {".csv": str(path)}
+
+
+def test_hit_and_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    config = RunConfig(gridsize=10, seed=1, steps=5)
+    assert cache.get(config, [".csv"]) is None
+
+    cache.put(config, run_outputs(tmp_path, "run"), {"steps": 5})
+    assert cache.get(config, [".csv"]) == {"steps": 5}
+    assert cache.get(RunConfig(gridsize=10, seed=1, steps=5), [".csv"]) == {
+        "steps": 5
+    }
+    assert cache.get(config.replace(seed=2), [".csv"]) is None
+    assert cache.get(config.replace(steps=6), [".csv"]) is None
+    assert cache.get(config, [".csv", ".rec"]) is None
+
+    restored = tmp_path / "restored.csv"
+    cache.restore(config, {".csv": str(restored)})
+    assert restored.read_text() == "Step,Revolt\n0,1\n"
+
+
+def test_incomplete_entry_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    config = RunConfig(gridsize=10, seed=1, steps=5)
+    cache.put(config, run_outputs(tmp_path, "run"), {"steps": 5})
+    (tmp_path / "cache" / config.digest / "config.json").unlink()
+    assert cache.get(config, [".csv"]) is None
+
+
+def test_digest_is_stable():
+    config = RunConfig(gridsize=10, seed=1, steps=5, stop=("steady",))
+    again = RunConfig.from_dict(config.to_dict())
+    assert again == config and again.digest == config.digest
@@ -0,0 +1,60 @@
+from statistics import NormalDist
+import numpy as np
+from ensemble import Ensemble
+from env import World
+from utils.params import model_params
+
+# The ensemble steps its replicates with the array engine. Its summary has to
+# agree with separate World runs of the mesa engine, on the revolt counts which
+# depend on the turn order of the agents as well as on the wealth classes.
+
+PARAMS = dict(
+    model_params,
+    gridsize=30,
+    cop_density=0.05,
+    legitimacy=0.5,
+    l_state=True,
+    include_wealth=False,
+)
+STEPS = 40
+RUNS = 30
+LEVEL = 0.95
+
+
+def world_intervals(params, names):
+    """
+    Confidence interval of the mean of every reporter over separate runs.
+    """
+    values = []
+    for seed in range(RUNS):
+        world = World(**params, seed=seed)
+        for _ in range(STEPS):
+            world.step()
+        values.append([world.metrics.values[name] for name in names])
+    values = np.array(values, dtype=float)
+    mean = values.mean(0)
+    half = NormalDist().inv_cdf((1 + LEVEL) / 2) * values.std(0, ddof=1)
+    half /= np.sqrt(RUNS)
+    return dict(zip(names, zip(mean - half, mean + half)))
+
+
+def test_summary_overlaps_world_runs():
+    ensemble = Ensemble(**PARAMS, replicates=RUNS, seed=0)
+    for _ in range(STEPS):
+        ensemble.step()
+    summary = ensemble.summary(LEVEL).iloc[-1]
+    names = ("Revolt", "Jail", "Cops")
+    for name, (low, high) in world_intervals(PARAMS, names).items():
+        assert summary[name, "low"] <= high and low <= summary[name, "high"], name
+
+
+def test_summary_counts_every_running_replicate():
+    ensemble = Ensemble(**PARAMS, replicates=5, seed=1)
+    for _ in range(3):
+        ensemble.step()
+    summary = ensemble.summary()
+    assert list(summary["Revolt", "n"]) == [5, 5, 5]
+    frame = ensemble.replicate_frame()
+    assert np.allclose(
+        summary["Revolt", "mean"], frame["Revolt"].groupby(level="Step").mean()
+    )
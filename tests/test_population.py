@@ -0,0 +1,48 @@
+import pytest
+from env import World
+from utils.params import model_params
+
+# The population counters are kept up to date by the agents as they change,
+# and have to agree with a full recount whatever happened to the agents.
+
+PARAMS = dict(model_params, gridsize=20, cop_density=0.1, legitimacy=0.6)
+
+
+def citizens(world):
+    return [a for a in world.schedule.agents if a.alignment == "Citizen"]
+
+
+def test_verify_after_kill_jail_and_wake():
+    world = World(**PARAMS, seed=2, jail_wheel=True)
+    world.step()
+    citizen, other = citizens(world)[:2]
+    world.jail(citizen)
+    world.population.verify(world.schedule.agents)
+    assert citizen.unique_id in world.schedule.parked
+
+    cop = next(a for a in world.schedule.agents if a.alignment == "Cop")
+    world.kill(other)
+    world.kill(cop)
+    world.kill(other)
+    world.remove_killed()
+    world.population.verify(world.schedule.agents)
+
+    while citizen.unique_id in world.schedule.parked:
+        world.step()
+    assert citizen.state != "Jail"
+    world.population.verify(world.schedule.agents)
+
+
+def test_debug_counts_follow_a_run():
+    world = World(**PARAMS, seed=4, jail_wheel=True, debug_counts=True)
+    for _ in range(60):
+        world.step()
+    assert world.agents_killed or world.population.states["Jail"]
+
+
+def test_verify_names_drifted_counters():
+    world = World(**PARAMS, seed=2)
+    world.population.cops += 1
+    world.population.states["Revolt"] += 1
+    with pytest.raises(RuntimeError, match="cops"):
+        world.population.verify(world.schedule.agents)
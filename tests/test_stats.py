@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from utils.stats import QuantileSketch, RunningStats
+
+# The online statistics have to agree with NumPy on the values they summarize,
+# however the values are split into batches and merged.
+
+
+def test_running_stats_match_numpy():
+    rng = np.random.default_rng(0)
+    values = rng.normal(50, 20, 1000)
+    stats = RunningStats()
+    for value in values[:10]:
+        stats.push(value)
+    stats.push_array(values[10:400])
+    other = RunningStats()
+    other.push_array(values[400:])
+    stats.merge(other)
+    stats.merge(RunningStats())
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.variance == pytest.approx(values.var())
+    assert stats.std == pytest.approx(values.std())
+
+
+def test_running_stats_clear():
+    stats = RunningStats()
+    stats.push_array([1.0, 2.0, 3.0])
+    stats.clear()
+    assert stats.count == 0 and np.isnan(stats.variance)
+
+
+def test_quantile_sketch_relative_accuracy():
+    rng = np.random.default_rng(1)
+    values = np.concatenate([rng.lognormal(2, 1, 5000), -rng.lognormal(1, 1, 500)])
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for part in np.array_split(values, 4):
+        other = QuantileSketch(relative_accuracy=0.01)
+        other.push_array(part)
+        sketch.merge(other)
+    assert sketch.count == len(values)
+    for q in (0.05, 0.1, 0.5, 0.9):
+        exact = np.sort(values)[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
@@ -0,0 +1,236 @@
+import json
+import threading
+import time
+import tornado.escape
+import tornado.gen
+from mesa.visualization.modules import ChartModule
+from utils.raster import LabelSocketHandler, RasterServer
+
+# The file contains the background mode of the visualization server. Instead of
+# the browser driving World.step one step per frame, the model runs on its own
+# in a worker thread and the browser samples it: a frame renders the latest
+# state once every render_every steps, and the charts get every row collected
+# since the previous frame in one batch.
+
+
+class BatchedChartModule(ChartModule):
+    """
+    ChartModule which sends every row since the previous frame instead of
+    only the latest one. Rows are sampled with collect() after every step and
+    handed over by render(), together with their steps.
+
+    Attributes:
+        max_points: number of points the browser keeps on the chart, the
+            oldest ones are dropped
+        rows: (step, values) collected since the previous frame
+        rewound: whether the browser clears the chart before the next rows
+    """
+
+    local_includes = ["utils/js/BatchedChartModule.js"]
+
+    def __init__(
+        self,
+        series,
+        canvas_height=200,
+        canvas_width=500,
+        data_collector_name="datacollector",
+        max_points=1000,
+    ):
+        super().__init__(series, canvas_height, canvas_width, data_collector_name)
+        self.package_includes = ["Chart.min.js"]
+        self.max_points = max_points
+        self.rows = []
+        self.rewound = False
+        self.js_code = "elements.push(new BatchedChartModule({}, {}, {}, {}));".format(
+            json.dumps(series), canvas_width, canvas_height, max_points
+        )
+
+    def collect(self, model):
+        self.rows.append((model.schedule.steps, super().render(model)))
+
+    def render(self, model):
+        rows, self.rows = self.rows, []
+        rewound, self.rewound = self.rewound, False
+        return {
+            "steps": [step for step, _ in rows],
+            "values": [values for _, values in rows],
+            "reset": rewound,
+        }
+
+    def reset(self):
+        self.rows = []
+        self.rewound = False
+
+    def rewind(self):
+        """
+        Drops the collected rows and clears the chart in the browser with the
+        next frame, e.g. when a replay jumps back.
+        """
+        self.rows = []
+        self.rewound = True
+
+
+class SimulationWorker(threading.Thread):
+    """
+    Thread stepping the model of a BackgroundServer until the model stops,
+    max_steps is reached or the worker is stopped. Every step is made under
+    the lock of the server, after which the batched charts sample it.
+
+    Attributes:
+        server: BackgroundServer the model belongs to
+        model: model stepped by the worker
+        stopped: event set to stop the worker
+        finished: event set once the worker made its last step
+    """
+
+    def __init__(self, server, model):
+        super().__init__(daemon=True)
+        self.server = server
+        self.model = model
+        self.stopped = threading.Event()
+        self.finished = threading.Event()
+
+    def run(self):
+        server = self.server
+        model = self.model
+        try:
+            while not self.stopped.is_set():
+                with server.lock:
+                    if not model.running or model.schedule.steps >= server.max_steps:
+                        break
+                    model.step()
+                    for chart in server.batched_charts:
+                        chart.collect(model)
+                # Let the socket handler take the lock between two steps
+                time.sleep(0)
+        finally:
+            self.finished.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class BackgroundSocketHandler(LabelSocketHandler):
+    """
+    Socket handler of the BackgroundServer. A step request of the browser
+    does not step the model, it starts the worker if needed and waits for the
+    next frame of it.
+    """
+
+    @tornado.gen.coroutine
+    def on_message(self, message):
+        msg = tornado.escape.json_decode(message)
+        application = self.application
+
+        if msg["type"] == "reset":
+            application.reset_model()
+            self.write_message({"type": "viz_state", "data": application.take_frame()})
+            return
+        if msg["type"] != "get_step":
+            super().on_message(message)
+            return
+
+        application.start_worker()
+        while True:
+            # Read before the frame, so the last steps are rendered before the end
+            finished = application.worker.finished.is_set()
+            frame = application.take_frame()
+            if frame is not None:
+                self.write_message({"type": "viz_state", "data": frame})
+                return
+            if finished:
+                self.write_message({"type": "end"})
+                return
+            yield tornado.gen.sleep(application.poll_seconds)
+
+
+class BackgroundServer(RasterServer):
+    """
+    RasterServer whose model runs continuously in a SimulationWorker while
+    the browser renders frames of it. The worker starts with the first frame
+    request and keeps running until the model stops or is reset. A frame is
+    rendered when the browser asks for one and the model made at least
+    render_every steps since the previous frame, or stopped.
+
+    Attributes:
+        render_every: number of steps between two frames
+        poll_seconds: how often a waiting frame request checks the worker
+        lock: lock held by the worker while it steps the model
+        worker: SimulationWorker of the current model
+        batched_charts: the BatchedChartModule elements
+        rendered_at: step of the model at the previous frame
+    """
+
+    socket_handler = (r"/ws", BackgroundSocketHandler)
+    handlers = [
+        RasterServer.page_handler,
+        socket_handler,
+        RasterServer.static_handler,
+        RasterServer.local_handler,
+    ]
+
+    def __init__(
+        self,
+        model_cls,
+        visualization_elements,
+        name="Mesa Model",
+        model_params={},
+        render_every=10,
+        poll_seconds=0.01,
+    ):
+        if render_every < 1:
+            raise ValueError("render_every must be at least 1")
+        self.render_every = render_every
+        self.poll_seconds = poll_seconds
+        self.lock = threading.Lock()
+        self.worker = None
+        self.batched_charts = [
+            element
+            for element in visualization_elements
+            if isinstance(element, BatchedChartModule)
+        ]
+        super().__init__(model_cls, visualization_elements, name, model_params)
+
+    def reset_model(self):
+        """
+        Stops the worker of the current model and creates a new model with
+        the current parameters, with a worker waiting for the first frame
+        request to start.
+        """
+        if self.worker is not None and self.worker.is_alive():
+            self.worker.stop()
+        super().reset_model()
+        for chart in self.batched_charts:
+            chart.reset()
+        self.rendered_at = None
+        self.worker = SimulationWorker(self, self.model)
+
+    def start_worker(self):
+        """
+        Starts the worker of the current model if it is not running yet.
+        """
+        if self.worker.ident is None:
+            self.worker.start()
+
+    def take_frame(self):
+        """
+        Renders a frame if render_every steps were made since the previous
+        one or the model stopped since, None otherwise. The first frame is
+        the model as it was created.
+        """
+        with self.lock:
+            step = self.model.schedule.steps
+            due = (
+                self.rendered_at is None
+                or step - self.rendered_at >= self.render_every
+                or (self.worker.finished.is_set() and step != self.rendered_at)
+            )
+            if not due:
+                return None
+            self.rendered_at = step
+            return self.render_model()
+
+    def label(self, element, x, y):
+        with self.lock:
+            return super().label(element, x, y)
@@ -0,0 +1,79 @@
+import os
+import pickle
+import zlib
+import numpy as np
+
+# The file contains the checkpoints of the World. A checkpoint is the whole
+# model pickled and compressed: grid positions, agents with their jail timers
+# and books, the bank ledger, legitimacy, collected reporters and the state of
+# the random generators, so a restored World continues exactly as the original.
+
+
+# First bytes of every checkpoint file, with the version of the format
+MAGIC = b"CVCKPT6\n"
+
+
+def save_checkpoint(model, path, level=6):
+    """
+    Writes the model to path. The rows buffered by a streaming collector and
+    the steps buffered by a recorder are flushed first so the files on disk
+    match the checkpoint. The file is
+    written next to path and renamed, so an interrupted save never leaves a
+    broken checkpoint behind.
+    """
+    collector = getattr(model, "datacollector", None)
+    if hasattr(collector, "flush"):
+        collector.flush()
+    recorder = getattr(model, "recorder", None)
+    if recorder is not None:
+        recorder.flush()
+    data = zlib.compress(pickle.dumps(model, pickle.HIGHEST_PROTOCOL), level)
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC)
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(path, seed=None):
+    """
+    Restores the model saved at path. When the saved run is continued, its
+    streaming sink and recording are cut back to what they had when the
+    checkpoint was written. A reseeded model is a new run forked from the
+    saved one, which leaves the files of the saved run alone: the caller
+    gives it its own sink and recording.
+
+    Args:
+        path: checkpoint file written by save_checkpoint
+        seed: reseeds the random generators, so that several runs started
+            from one warmed up state diverge. None continues the saved run
+            exactly.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a World checkpoint")
+        model = pickle.loads(zlib.decompress(f.read()))
+
+    if seed is not None:
+        reseed(model, seed)
+        return model
+
+    collector = getattr(model, "datacollector", None)
+    if hasattr(collector, "sink"):
+        collector.sink.truncate()
+    recorder = getattr(model, "recorder", None)
+    if recorder is not None:
+        recorder.truncate()
+    return model
+
+
+def reseed(model, seed):
+    """
+    Reseeds the random generator of the model and the ones of its array
+    engine and market, if any.
+    """
+    model.random.seed(seed)
+    model._seed = seed
+    if getattr(model, "arrays", None) is not None:
+        model.arrays.rng = np.random.default_rng(model.random.getrandbits(64))
+    if getattr(model, "market", None) is not None:
+        model.market.rng = np.random.default_rng(model.random.getrandbits(64))
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass, field, fields, asdict, replace
+from functools import lru_cache
+import utils.params as params
+from env import World
+
+# The file contains the run configuration of the World and the result cache of
+# the sweeps. A RunConfig holds everything a run depends on: the parameters of
+# the World, the options of its engine which change the results, the seed, the
+# number of steps, the constants of utils/params.py and the version of the code.
+# Its digest is stable across processes and machines, so it names the results
+# of the run in the ResultCache and a sweep skips the runs it already made.
+
+
+# Source of the model, hashed into the code version
+SOURCES = ("env.py", "agents", "utils")
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """
+    Hash of the Python sources of the model, so any edit of the code makes
+    new run configurations.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = []
+    for source in SOURCES:
+        path = os.path.join(root, source)
+        if os.path.isdir(path):
+            paths += [
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if name.endswith(".py")
+            ]
+        else:
+            paths.append(path)
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.relpath(path, root).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def hashable(value):
+    """
+    The value with its dicts turned into sorted tuples of items.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, hashable(item)) for key, item in value.items()))
+    return value
+
+
+def frozen(value):
+    """
+    The value read back from JSON with its lists turned into tuples.
+    """
+    if isinstance(value, list):
+        return tuple(frozen(item) for item in value)
+    return value
+
+
+def model_constants():
+    """
+    Current (name, value) of every constant listed in params.CONSTANTS.
+    """
+    return tuple((name, hashable(getattr(params, name))) for name in params.CONSTANTS)
+
+
+@dataclass(frozen=True)
+class RunConfig:
+    """
+    Frozen configuration of one run of the World. Equal configurations make
+    the same run, the digest identifies the configuration on disk.
+
+    Attributes:
+        gridsize ... rich_threshold: parameters of the World
+        engine, grid_backend, neighbor_counts, jail_wheel, ledger, trades,
+            stats, bulk_placement, stop, stop_window, stop_tolerance:
+            options of the World which change its results
+        seed: seed of the World, None for a random run
+        steps: number of steps of the run
+        constants: (name, value) of the constants of utils/params.py
+        code_version: hash of the source of the model, see code_version
+    """
+
+    gridsize: int = params.model_params["gridsize"]
+    cop_density: float = params.model_params["cop_density"]
+    citizen_density: float = params.model_params["citizen_density"]
+    agent_type: str = params.model_params["agent_type"]
+    legitimacy: float = params.model_params["legitimacy"]
+    l_state: bool = params.model_params["l_state"]
+    reduction_constant: float = params.model_params["reduction_constant"]
+    active_threshold: float = params.model_params["active_threshold"]
+    include_wealth: bool = params.model_params["include_wealth"]
+    rich_threshold: int = params.model_params["rich_threshold"]
+    engine: str = "mesa"
+    grid_backend: str = "multi"
+    neighbor_counts: str = "lists"
+    jail_wheel: bool = False
+    ledger: str = "sequential"
+    trades: str = "agents"
+    stats: bool = False
+    bulk_placement: bool = False
+    stop: tuple = ()
+    stop_window: int = 100
+    stop_tolerance: float = 0.01
+    seed: int = None
+    steps: int = 100
+    constants: tuple = field(default_factory=model_constants)
+    code_version: str = field(default_factory=code_version)
+
+    def world_kwargs(self):
+        """
+        Keyword arguments of the World for this configuration.
+        """
+        skip = ("steps", "constants", "code_version")
+        names = [f.name for f in fields(self) if f.name not in skip]
+        return {name: getattr(self, name) for name in names}
+
+    def build(self, **kwargs):
+        """
+        A new World for this configuration, with the extra keyword arguments
+        (sink, record, ...). The constants and the code are the ones of this
+        process, so a configuration made for others raises a ValueError.
+        """
+        if self.constants != model_constants():
+            raise ValueError("The constants of utils/params.py differ from the config")
+        if self.code_version != code_version():
+            raise ValueError("The config was made for another version of the code")
+        return World(**self.world_kwargs(), **kwargs)
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        The configuration of a dict made by to_dict, e.g. read from JSON.
+        """
+        return cls(**{name: frozen(value) for name, value in values.items()})
+
+    @property
+    def digest(self):
+        """
+        Stable hash of the configuration: a sha256 of its canonical JSON.
+        """
+        text = json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def replace(self, **changes):
+        return replace(self, **changes)
+
+
+class ResultCache:
+    """
+    Directory of run results keyed by the digest of their RunConfig. An
+    entry holds the output files of one run, named by their suffix, and a
+    config.json written last, so an entry without it is incomplete and
+    ignored.
+
+    Attributes:
+        path: directory of the entries
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def entry(self, config):
+        return os.path.join(self.path, config.digest)
+
+    def get(self, config, suffixes):
+        """
+        The result stored with the entry of the configuration, if the entry
+        is complete and holds an output with every suffix, None otherwise.
+        """
+        entry = self.entry(config)
+        marker = os.path.join(entry, "config.json")
+        if not os.path.exists(marker):
+            return None
+        if not all(os.path.exists(os.path.join(entry, "run" + s)) for s in suffixes):
+            return None
+        with open(marker) as f:
+            return json.load(f)["result"]
+
+    def put(self, config, outputs, result):
+        """
+        Stores copies of the output files or directories of a run, keyed by
+        their suffix, with the result, a JSON object, e.g. the steps made.
+        Every output is copied aside and renamed, and config.json is written
+        last. Outputs already stored are kept.
+        """
+        entry = self.entry(config)
+        os.makedirs(entry, exist_ok=True)
+        staging = f".tmp{os.getpid()}"
+        for suffix, path in outputs.items():
+            stored = os.path.join(entry, "run" + suffix)
+            if os.path.exists(stored):
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(stored + staging, ignore_errors=True)
+                shutil.copytree(path, stored + staging)
+            else:
+                shutil.copy2(path, stored + staging)
+            try:
+                os.replace(stored + staging, stored)
+            except OSError:
+                # Stored meanwhile by another process
+                shutil.rmtree(stored + staging, ignore_errors=True)
+        marker = os.path.join(entry, "config.json")
+        if not os.path.exists(marker):
+            with open(marker + staging, "w") as f:
+                json.dump({"config": config.to_dict(), "result": result}, f, indent=1)
+            os.replace(marker + staging, marker)
+
+    def restore(self, config, outputs):
+        """
+        Copies the stored outputs of the configuration to the given paths,
+        keyed by suffix like in put.
+        """
+        entry = self.entry(config)
+        for suffix, path in outputs.items():
+            stored = os.path.join(entry, "run" + suffix)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            if os.path.isdir(stored):
+                shutil.copytree(stored, path)
+            else:
+                shutil.copy2(stored, path)
@@ -0,0 +1,143 @@
+import numpy as np
+
+# The file contains the count rasters of the World. Instead of building the list
+# of neighbors of every citizen, the number of revolting citizens and cops
+# around every cell is computed for the whole grid at once, so the cost does not
+# grow with the square of the vision radius for every agent.
+
+
+def window_sum(raster, radius):
+    """
+    Sum of the raster over the (2 * radius + 1) square window around every
+    cell, clipped at the borders of the grid, using a summed area table. The
+    grid is made of the last two axes, leading axes are summed independently.
+    """
+    width, height = raster.shape[-2:]
+    dtype = np.result_type(raster.dtype, np.int64)
+    table = np.zeros(raster.shape[:-2] + (width + 1, height + 1), dtype=dtype)
+    table[..., 1:, 1:] = raster.cumsum(-2, dtype=dtype).cumsum(-1)
+    lo_x = np.clip(np.arange(width) - radius, 0, width)[:, None]
+    hi_x = np.clip(np.arange(width) + radius + 1, 0, width)[:, None]
+    lo_y = np.clip(np.arange(height) - radius, 0, height)[None, :]
+    hi_y = np.clip(np.arange(height) + radius + 1, 0, height)[None, :]
+    return (
+        table[..., hi_x, hi_y]
+        - table[..., lo_x, hi_y]
+        - table[..., hi_x, lo_y]
+        + table[..., lo_x, lo_y]
+    )
+
+
+def neighbor_sum(raster, radius):
+    """
+    Sum of the raster over the neighborhood of every cell without the cell
+    itself, like Grid.get_neighbors counts the agents around a position.
+    """
+    return window_sum(raster, radius) - raster
+
+
+class NeighborFields:
+    """
+    Neighborhood counts of the revolting citizens and the cops of the World
+    for every cell. The counts are built from count rasters once the agents
+    are placed and then kept up to date as agents move, revolt, calm down,
+    get jailed or are removed, so every citizen reads the counts left by the
+    agents stepped before it, like its neighbor lists would give. The cops
+    keep scanning their neighbor lists, so they have no counts.
+
+    Attributes:
+        width, height: dimensions of the grid, cell id is x * height + y
+        radius: vision radius of the neighborhood counts
+        revolt_around, cops_around: per cell id neighborhood counts as lists
+    """
+
+    def __init__(self, width, height, radius):
+        self.width = width
+        self.height = height
+        self.radius = radius
+        self.revolt_around = [0] * (width * height)
+        self.cops_around = [0] * (width * height)
+
+    def raster(self, cells):
+        counts = np.bincount(
+            np.asarray(cells, dtype=np.int64), minlength=self.width * self.height
+        )
+        return counts.reshape(self.width, self.height)
+
+    def refresh(self, agents):
+        """
+        Rebuilds the neighborhood counts of every cell from the positions of
+        the agents.
+        """
+        height = self.height
+        revolt = []
+        cops = []
+        for a in agents:
+            x, y = a.pos
+            if a.alignment == "Citizen" and a.state == "Revolt":
+                revolt.append(x * height + y)
+            elif a.alignment == "Cop":
+                cops.append(x * height + y)
+
+        revolt = self.raster(revolt)
+        cops = self.raster(cops)
+        self.revolt_around = neighbor_sum(revolt, self.radius).ravel().tolist()
+        self.cops_around = neighbor_sum(cops, self.radius).ravel().tolist()
+
+    def counts(self, pos):
+        """
+        Number of revolting citizens and cops around pos.
+        """
+        x, y = pos
+        cell = x * self.height + y
+        return self.revolt_around[cell], self.cops_around[cell]
+
+    def shift(self, around, pos, n):
+        """
+        Adds n to the counts of the cells which see pos.
+        """
+        x, y = pos
+        radius = self.radius
+        height = self.height
+        rows = range(max(x - radius, 0), min(x + radius + 1, self.width))
+        columns = range(max(y - radius, 0), min(y + radius + 1, height))
+        for row in rows:
+            base = row * height
+            for column in columns:
+                around[base + column] += n
+        # A cell is not its own neighbor
+        around[x * height + y] -= n
+
+    def counted(self, agent):
+        """
+        The counts the agent is part of, None if it is in none.
+        """
+        if agent.alignment == "Cop":
+            return self.cops_around
+        if agent.state == "Revolt":
+            return self.revolt_around
+        return None
+
+    def move(self, agent, old_pos):
+        """
+        Moves the agent, now on its new position, out of the counts around
+        old_pos.
+        """
+        around = self.counted(agent)
+        if around is not None and old_pos != agent.pos:
+            self.shift(around, old_pos, -1)
+            self.shift(around, agent.pos, 1)
+
+    def transition(self, pos, state, new_state):
+        """
+        A citizen on pos changes from state to new_state.
+        """
+        if state == "Revolt":
+            self.shift(self.revolt_around, pos, -1)
+        elif new_state == "Revolt":
+            self.shift(self.revolt_around, pos, 1)
+
+    def remove(self, agent):
+        around = self.counted(agent)
+        if around is not None:
+            self.shift(around, agent.pos, -1)
@@ -0,0 +1,107 @@
+// Copy of the ChartModule of mesa which renders a batch of rows per frame, see
+// utils/background.py. Only the last max_points points are kept on the chart.
+var BatchedChartModule = function(series, canvas_width, canvas_height, max_points) {
+    // Create the tag:
+    var canvas_tag = "<canvas width='" + canvas_width + "' height='" + canvas_height + "' ";
+    canvas_tag += "style='border:1px dotted'></canvas>";
+    // Append it to #elements
+    var canvas = $(canvas_tag)[0];
+    $("#elements").append(canvas);
+    // Create the context and the drawing controller:
+    var context = canvas.getContext("2d");
+
+    var convertColorOpacity = function(hex) {
+
+        if (hex.indexOf('#') != 0) {
+            return 'rgba(0,0,0,0.1)';
+        }
+
+        hex = hex.replace('#', '');
+        r = parseInt(hex.substring(0, 2), 16);
+        g = parseInt(hex.substring(2, 4), 16);
+        b = parseInt(hex.substring(4, 6), 16);
+        return 'rgba(' + r + ',' + g + ',' + b + ',0.1)';
+    };
+
+    // Prep the chart properties and series:
+    var datasets = []
+    for (var i in series) {
+        var s = series[i];
+        var new_series = {
+            label: s.Label,
+            borderColor: s.Color,
+            backgroundColor: convertColorOpacity(s.Color),
+            data: []
+        };
+        datasets.push(new_series);
+    }
+
+    var chartData = {
+        labels: [],
+        datasets: datasets
+    };
+
+    var chartOptions = {
+        responsive: true,
+        tooltips: {
+            mode: 'index',
+            intersect: false
+        },
+        hover: {
+            mode: 'nearest',
+            intersect: true
+        },
+        scales: {
+            xAxes: [{
+                display: true,
+                scaleLabel: {
+                    display: true
+                },
+                ticks: {
+                    maxTicksLimit: 11
+                }
+            }],
+            yAxes: [{
+                display: true,
+                scaleLabel: {
+                    display: true
+                }
+            }]
+        }
+    };
+
+    var chart = new Chart(context, {
+        type: 'line',
+        data: chartData,
+        options: chartOptions
+    });
+
+    this.render = function(data) {
+        if (data.reset) {
+            this.reset();
+        }
+        for (var row = 0; row < data.steps.length; row++) {
+            chart.data.labels.push(data.steps[row]);
+            var values = data.values[row];
+            for (var i = 0; i < values.length; i++) {
+                chart.data.datasets[i].data.push(values[i]);
+            }
+        }
+        var excess = chart.data.labels.length - max_points;
+        if (excess > 0) {
+            chart.data.labels.splice(0, excess);
+            chart.data.datasets.forEach(function(dataset) {
+                dataset.data.splice(0, excess);
+            });
+        }
+        chart.update();
+    };
+
+    this.reset = function() {
+        while (chart.data.labels.length) { chart.data.labels.pop(); }
+        chart.data.datasets.forEach(function(dataset) {
+            while (dataset.data.length) { dataset.data.pop(); }
+        });
+        chart.update();
+    };
+};
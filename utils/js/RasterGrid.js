@@ -0,0 +1,110 @@
+// Browser side of the RasterGrid of utils/raster.py. The frames carry one code
+// per cell, base64 encoded, either for every cell or for the cells which changed
+// since the previous frame. Only the changed cells are drawn again. The label of
+// a cell is asked to the server when the pointer stops on it.
+var RasterGrid = function(canvas_width, canvas_height, grid_width, grid_height, palette, index) {
+    var canvas_tag = `<canvas width="${canvas_width}" height="${canvas_height}" class="world-grid"/>`;
+    var parent_div_tag = '<div style="position:relative; height:' + canvas_height + 'px;" class="world-grid-parent"></div>';
+    var canvas = $(canvas_tag)[0];
+    var parent = $(parent_div_tag)[0];
+    var tooltip = $('<div style="position:absolute; display:none; white-space:pre; ' +
+        'background:white; border:1px solid #999; padding:2px 4px; pointer-events:none;"></div>')[0];
+    $("#elements").append(parent);
+    parent.append(canvas);
+    parent.append(tooltip);
+
+    var context = canvas.getContext("2d");
+    var cellWidth = canvas_width / grid_width;
+    var cellHeight = canvas_height / grid_height;
+    var maxR = Math.min(cellHeight, cellWidth) / 2 - 1;
+    var codes = new Uint8Array(grid_width * grid_height);
+
+    var decode = function(text) {
+        var raw = atob(text);
+        var bytes = new Uint8Array(raw.length);
+        for (var i = 0; i < raw.length; i++) {
+            bytes[i] = raw.charCodeAt(i);
+        }
+        return bytes;
+    };
+
+    var drawCell = function(cell) {
+        var x = Math.floor(cell / grid_height);
+        var y = cell % grid_height;
+        var left = x * cellWidth;
+        var top = y * cellHeight;
+        context.clearRect(left, top, cellWidth, cellHeight);
+        var shape = palette[codes[cell]];
+        if (shape) {
+            context.fillStyle = shape.Color;
+            if (shape.Shape == "circle") {
+                context.beginPath();
+                context.arc(left + cellWidth / 2, top + cellHeight / 2, shape.r * maxR, 0, Math.PI * 2, false);
+                context.closePath();
+                context.fill();
+            } else {
+                var w = shape.w * cellWidth;
+                var h = shape.h * cellHeight;
+                context.fillRect(left + (cellWidth - w) / 2, top + (cellHeight - h) / 2, w, h);
+            }
+        }
+        context.strokeStyle = "#eee";
+        context.strokeRect(left, top, cellWidth, cellHeight);
+    };
+
+    this.render = function(data) {
+        if (data.full !== undefined) {
+            codes = decode(data.full);
+            for (var cell = 0; cell < codes.length; cell++) {
+                drawCell(cell);
+            }
+            return;
+        }
+        var cells = new DataView(decode(data.cells).buffer);
+        var changed = decode(data.codes);
+        for (var i = 0; i < changed.length; i++) {
+            var cell = cells.getUint32(4 * i, true);
+            codes[cell] = changed[i];
+            drawCell(cell);
+        }
+    };
+
+    this.reset = function() {
+        codes = new Uint8Array(grid_width * grid_height);
+        context.clearRect(0, 0, canvas_width, canvas_height);
+        tooltip.style.display = "none";
+    };
+
+    // Hover labels, asked once the pointer rests on a cell
+    var hovered = null;
+    var timer = null;
+    canvas.addEventListener("mousemove", function(event) {
+        var x = Math.floor(event.offsetX / cellWidth);
+        var y = Math.floor(event.offsetY / cellHeight);
+        tooltip.style.left = (event.offsetX + 12) + "px";
+        tooltip.style.top = (event.offsetY + 12) + "px";
+        if (hovered && hovered.x == x && hovered.y == y) {
+            return;
+        }
+        hovered = {x: x, y: y};
+        tooltip.style.display = "none";
+        clearTimeout(timer);
+        timer = setTimeout(function() {
+            send({type: "get_label", element: index, x: x, y: y});
+        }, 200);
+    });
+    canvas.addEventListener("mouseleave", function() {
+        hovered = null;
+        clearTimeout(timer);
+        tooltip.style.display = "none";
+    });
+    ws.addEventListener("message", function(message) {
+        var msg = JSON.parse(message.data);
+        if (msg.type != "label" || msg.element != index || !hovered ||
+            hovered.x != msg.x || hovered.y != msg.y) {
+            return;
+        }
+        tooltip.textContent = msg.text;
+        tooltip.style.display = msg.text ? "block" : "none";
+    });
+};
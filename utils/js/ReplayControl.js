@@ -0,0 +1,44 @@
+// Browser side of the ReplayControl of utils/replay.py: a slider over the rows
+// of the recording and buttons to go to the first, previous, next and last
+// recorded step. Every move asks the server for the frame of that row.
+var ReplayControl = function() {
+    var div = $('<div style="margin-bottom:15px;"></div>')[0];
+    var label = $('<div>Step 0</div>')[0];
+    var slider = $('<input type="range" min="0" max="0" value="0" style="width:500px;"/>')[0];
+    var buttons = $('<div></div>')[0];
+    $("#elements").append(div);
+    div.append(label);
+    div.append(slider);
+    div.append(buttons);
+
+    var row = 0;
+    var rows = 1;
+    var seek = function(target) {
+        target = Math.min(Math.max(target, 0), rows - 1);
+        send({type: "seek", row: target});
+    };
+    [["|<", function() { return 0; }],
+     ["<", function() { return row - 1; }],
+     [">", function() { return row + 1; }],
+     [">|", function() { return rows - 1; }]].forEach(function(button) {
+        var tag = $('<button class="btn btn-default" type="button"></button>')[0];
+        tag.textContent = button[0];
+        tag.onclick = function() { seek(button[1]()); };
+        buttons.append(tag);
+    });
+    slider.addEventListener("change", function() {
+        seek(parseInt(slider.value));
+    });
+
+    this.render = function(data) {
+        row = data.row;
+        rows = data.rows;
+        slider.max = rows - 1;
+        slider.value = row;
+        label.textContent = "Step " + data.step + " (" + (row + 1) + "/" + rows + " recorded)";
+    };
+
+    this.reset = function() {
+        row = 0;
+    };
+};
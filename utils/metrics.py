@@ -0,0 +1,328 @@
+import math
+import numpy as np
+from utils.population import STATUSES
+from utils.stats import RunningStats, QuantileSketch
+
+# The file contains the metrics engine that feeds the DataCollector of the World.
+# All the model reporters are computed together in one pass over the agents
+# instead of one list comprehension per reporter.
+
+
+# Economic status of a citizen which have their own reporters
+CLASSES = ("Rich", "Middle", "Poor")
+
+# Model reporter columns in the order they are registered in the DataCollector
+REPORTERS = (
+    "Poor Grievance",
+    "Middle Grievance",
+    "Rich Grievance",
+    "Calm",
+    "Revolt",
+    "Jail",
+    "Cops",
+    "Rich",
+    "Middle",
+    "Poor",
+    "Rich Wealth",
+    "Middle Wealth",
+    "Poor Wealth",
+    "Rich Confidence",
+    "Middle Confidence",
+    "Poor Confidence",
+    "Rich Hardship",
+    "Middle Hardship",
+    "Poor Hardship",
+    "Legitimacy",
+    "WO Revolt",
+    "WO Calm",
+    "WO Jail",
+)
+
+# Citizen attributes followed by the statistics reporters, see Metrics(stats=True)
+STAT_ATTRIBUTES = ("Wealth", "Confidence")
+
+# Quantiles of the statistics reporters
+QUANTILES = (0.1, 0.5, 0.9)
+
+# Statistics reporter columns, added after REPORTERS
+STAT_REPORTERS = tuple(
+    f"{status} {name} Std" for status in CLASSES for name in STAT_ATTRIBUTES
+) + tuple(f"{name} P{round(q * 100)}" for name in STAT_ATTRIBUTES for q in QUANTILES)
+
+
+class Reporter:
+    """
+    A model reporter which reads one column of the latest metrics pass.
+    Unlike a lambda it can be pickled together with the DataCollector.
+
+    Attributes:
+        name: name of the reporter column
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, model):
+        return model.metrics.values[self.name]
+
+
+class Metrics:
+    """
+    Computes the sums and means of every status of the citizens in a single
+    pass and keeps the values of the latest pass. The counts are read from the
+    population counters of the World.
+
+    With stats the metrics also follow the spread of the wealth and
+    confidence of the citizens: the standard deviation of every status and
+    the quantiles of all the citizens at every step, and over the whole run
+    their running mean and variance and a quantile sketch.
+
+    Attributes:
+        values: reporter column -> value of the latest pass
+        mean_savings: mean savings of the citizens in the latest pass
+        stats: whether the statistics reporters are computed
+        step_stats: (status, attribute) -> RunningStats of the latest pass
+        run_stats: attribute -> RunningStats of every citizen at every step
+        sketches: attribute -> QuantileSketch of every citizen at every step
+    """
+
+    def __init__(self, stats=False):
+        names = REPORTERS + (STAT_REPORTERS if stats else ())
+        self.values = dict.fromkeys(names, 0)
+        self.mean_savings = 0
+        self.stats = stats
+        self.step_stats = {
+            (status, name): RunningStats()
+            for status in CLASSES
+            for name in STAT_ATTRIBUTES
+        }
+        self.run_stats = {name: RunningStats() for name in STAT_ATTRIBUTES}
+        self.sketches = {name: QuantileSketch() for name in STAT_ATTRIBUTES}
+
+    @staticmethod
+    def reporters(stats=False):
+        """
+        Model reporters for the DataCollector keyed by column name, with the
+        statistics reporters if stats.
+        """
+        names = REPORTERS + (STAT_REPORTERS if stats else ())
+        return {name: Reporter(name) for name in names}
+
+    @staticmethod
+    def scan_agents(model, stats=False):
+        """
+        Sums of the citizen attributes in one pass over the scheduled agents.
+        Returns status -> [grievance, hardship, wealth, confidence], the total
+        grievance, the total savings and, with stats, the status code, wealth
+        and confidence of every citizen as arrays (None otherwise).
+        """
+        classes = {status: [0, 0, 0, 0] for status in CLASSES}
+        grievance = 0
+        savings = 0
+        statuses, wealths, confidences = [], [], []
+
+        for a in model.schedule.agents:
+            if a.alignment != "Citizen":
+                continue
+            status, wealth, confidence = a.status, a.wealth, a.confidence
+            grievance += a.grievance
+            savings += a.savings
+            totals = classes.get(status)
+            if totals is not None:
+                totals[0] += a.grievance
+                totals[1] += a.hardship
+                totals[2] += wealth
+                totals[3] += confidence
+            if stats:
+                statuses.append(status)
+                wealths.append(wealth)
+                confidences.append(confidence)
+
+        columns = None
+        if stats:
+            codes = {status: code for code, status in enumerate(STATUSES)}
+            columns = (
+                np.array([codes[status] for status in statuses], dtype=np.int64),
+                np.array(wealths, dtype=float),
+                np.array(confidences, dtype=float),
+            )
+        return classes, grievance, savings, columns
+
+    @staticmethod
+    def scan_arrays(arrays, stats=False):
+        """
+        Same sums and columns as scan_agents over the arrays of the array
+        engine.
+        """
+        codes = arrays.status.astype(np.int64)
+        sums = [
+            np.bincount(codes, weights=values, minlength=len(STATUSES))
+            for values in (
+                arrays.grievance,
+                arrays.hardship,
+                arrays.wealth,
+                arrays.confidence,
+            )
+        ]
+        classes = {
+            status: [float(column[STATUSES.index(status)]) for column in sums]
+            for status in CLASSES
+        }
+        columns = (codes, arrays.wealth, arrays.confidence) if stats else None
+        return (
+            classes,
+            float(arrays.grievance.sum()),
+            float(arrays.savings.sum()),
+            columns,
+        )
+
+    def collect(self, model):
+        """
+        Refreshes every reporter value from the population counters and one
+        pass over the citizens.
+        """
+        if model.arrays is not None:
+            scan = self.scan_arrays(model.arrays, self.stats)
+        else:
+            scan = self.scan_agents(model, self.stats)
+        classes, grievance, savings, columns = scan
+
+        population = model.population
+        values = self.values
+        for status, totals in classes.items():
+            count = population.statuses[status]
+            values[status] = count
+            values[f"{status} Grievance"] = totals[0]
+            values[f"{status} Hardship"] = totals[1]
+            values[f"{status} Wealth"] = totals[2] / count if count else 0
+            values[f"{status} Confidence"] = totals[3] / count if count else 0
+
+        # Without wealth every citizen is reported as poor grievance
+        if not model.include_wealth:
+            values["Poor Grievance"] = grievance
+
+        states = population.states
+        values["Calm"] = states["Calm"]
+        values["Revolt"] = states["Revolt"]
+        values["Jail"] = states["Jail"]
+        values["Cops"] = population.cops
+        values["Legitimacy"] = model.legitimacy * 100
+
+        wo_wealth = not model.include_wealth
+        values["WO Revolt"] = states["Revolt"] if wo_wealth else 0
+        values["WO Calm"] = states["Calm"] if wo_wealth else 0
+        values["WO Jail"] = states["Jail"] if wo_wealth else 0
+
+        citizens = population.citizens
+        self.mean_savings = savings / citizens if citizens else math.nan
+
+        if self.stats:
+            self.collect_stats(*columns)
+
+    def collect_stats(self, status, *columns):
+        """
+        Refreshes the statistics reporters from the status code and the
+        STAT_ATTRIBUTES columns of the citizens scanned by collect, and adds
+        them to the statistics of the run.
+        """
+        values = self.values
+        size = len(STATUSES)
+        count = np.bincount(status, minlength=size)
+        counted = np.maximum(count, 1)
+        for name, column in zip(STAT_ATTRIBUTES, columns):
+            # Moments of every status from the deviations to its own mean
+            mean = np.bincount(status, weights=column, minlength=size) / counted
+            deviation = column - mean[status]
+            m2 = np.bincount(status, weights=deviation * deviation, minlength=size)
+            for cls in CLASSES:
+                code = STATUSES.index(cls)
+                stats = self.step_stats[(cls, name)]
+                stats.clear()
+                stats.combine(int(count[code]), float(mean[code]), float(m2[code]))
+                values[f"{cls} {name} Std"] = stats.std if stats.count else 0
+            if len(column):
+                quantiles = np.quantile(column, QUANTILES).tolist()
+            else:
+                quantiles = [0] * len(QUANTILES)
+            for q, value in zip(QUANTILES, quantiles):
+                values[f"{name} P{round(q * 100)}"] = value
+            self.run_stats[name].push_array(column)
+            self.sketches[name].push_array(column)
+
+    def run_quantile(self, name, q):
+        """
+        Quantile q of the attribute over every citizen at every step so far,
+        from the sketch of the run.
+        """
+        return self.sketches[name].quantile(q)
+
+
+class EnsembleMetrics:
+    """
+    Same reporters as Metrics for every replicate of an Ensemble, computed
+    together over the arrays of the array engine.
+
+    Attributes:
+        values: reporter column -> array with the value of every replicate
+        mean_savings: mean savings of the citizens of every replicate
+    """
+
+    def __init__(self, replicates):
+        self.values = {name: np.zeros(replicates) for name in REPORTERS}
+        self.mean_savings = np.zeros(replicates)
+
+    def collect(self, model):
+        """
+        Refreshes every reporter value of every replicate from the population
+        counters and the arrays of the engine.
+        """
+        arrays = model.arrays
+        replicates = arrays.replicates
+        keys = arrays.rep * len(STATUSES) + arrays.status
+        sums = [
+            np.bincount(
+                keys, weights=values, minlength=replicates * len(STATUSES)
+            ).reshape(replicates, len(STATUSES))
+            for values in (
+                arrays.grievance,
+                arrays.hardship,
+                arrays.wealth,
+                arrays.confidence,
+            )
+        ]
+
+        populations = model.populations
+        values = self.values
+        for status in CLASSES:
+            column = STATUSES.index(status)
+            count = np.array([p.statuses[status] for p in populations], dtype=float)
+            counted = np.maximum(count, 1)
+            values[status] = count
+            values[f"{status} Grievance"] = sums[0][:, column]
+            values[f"{status} Hardship"] = sums[1][:, column]
+            values[f"{status} Wealth"] = np.where(
+                count, sums[2][:, column] / counted, 0
+            )
+            values[f"{status} Confidence"] = np.where(
+                count, sums[3][:, column] / counted, 0
+            )
+
+        # Without wealth every citizen is reported as poor grievance
+        if not model.include_wealth:
+            values["Poor Grievance"] = np.bincount(
+                arrays.rep, weights=arrays.grievance, minlength=replicates
+            )
+
+        wo_wealth = not model.include_wealth
+        for state in ("Calm", "Revolt", "Jail"):
+            count = np.array([p.states[state] for p in populations], dtype=float)
+            values[state] = count
+            values[f"WO {state}"] = count if wo_wealth else np.zeros(replicates)
+        values["Cops"] = np.array([p.cops for p in populations], dtype=float)
+        values["Legitimacy"] = np.full(replicates, model.legitimacy * 100)
+
+        citizens = np.array([p.citizens for p in populations], dtype=float)
+        savings = np.bincount(arrays.rep, weights=arrays.savings, minlength=replicates)
+        self.mean_savings = np.where(
+            citizens > 0, savings / np.maximum(citizens, 1), math.nan
+        )
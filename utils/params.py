@@ -1,30 +1,40 @@
 import numpy as np
-from mesa.visualization.UserParam import UserSettableParameter
 
 
 # The file contain the parameters that affect the flow of entire experiment.
+# It is plain data, so headless runs import it without the visualization.
 
 
 # grid size of one size of the model instance
 gridsize = 50
 
+# Whether the visualization server runs the model in a background thread and
+# renders it every render_every steps instead of rendering every step
+background = False
+render_every = 10
+
+# Whether the grids are sent as packed cell codes, only the changed cells after
+# the first frame, instead of one portrayal per agent, see utils/raster.py
+raster = False
+
+# Recording (see utils/recording.py) the server replays instead of running the
+# World, e.g. "runs/point00000_rep000.rec", and the recorded steps per frame
+replay = None
+replay_speed = 1
+
+# Parameters of the World, the server lets the user change most of them in the
+# browser (see server.py)
 model_params = {
     "gridsize": gridsize,
-    "cop_density": UserSettableParameter("slider", "Cop Density", 0.01, 0, 1, 0.001),
-    "citizen_density": UserSettableParameter(
-        "slider", "Citizen Density", 0.7, 0, 1, 0.001
-    ),
+    "cop_density": 0.01,
+    "citizen_density": 0.7,
     "agent_type": "Poor",
-    "legitimacy": UserSettableParameter("slider", "Legitimacy", 1.0, 0.001, 1, 0.001),
-    "l_state": UserSettableParameter("checkbox", "Decrease Legitimacy", value=False),
-    "reduction_constant": UserSettableParameter(
-        "number", "Reduction Constant", value=0.01
-    ),
-    "active_threshold": UserSettableParameter(
-        "slider", "Active Threshold", 0.2, 0, 1, 0.1
-    ),
-    "include_wealth": UserSettableParameter("checkbox", "Include Wealth", value=True),
-    "rich_threshold": UserSettableParameter("slider", "Rich Threshold", 10, 1, 20),
+    "legitimacy": 1.0,
+    "l_state": False,
+    "reduction_constant": 0.01,
+    "active_threshold": 0.2,
+    "include_wealth": True,
+    "rich_threshold": 10,
 }
 
 # Parameter Constants
@@ -58,3 +68,27 @@ r_c = 0.2
 # Vision
 citizen_vision = 1
 cop_vision = 1
+
+# Scale of the arrest probability estimated by a citizen from the cops around it
+ap_constant = 2.3
+
+# Constants of the model which make up a run configuration with the World
+# parameters, see utils/config.py. wealth_inc is drawn anew in every process
+# and left out.
+CONSTANTS = (
+    "k_c",
+    "k_d",
+    "k_e",
+    "k_p",
+    "k_af",
+    "timestep",
+    "confidence_threshold",
+    "reduction_factor",
+    "cop_threshold",
+    "jail_period",
+    "kill_threshold",
+    "r_c",
+    "citizen_vision",
+    "cop_vision",
+    "ap_constant",
+)
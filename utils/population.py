@@ -0,0 +1,123 @@
+# The file contains the counter table which keeps the number of agents of every
+# status/state combination up to date as the agents change, so that every count
+# is read in O(1) instead of scanning the schedule.
+
+
+# State of a citizen
+STATES = ("Calm", "Revolt", "Jail")
+
+# Status of a citizen, "None" until the citizen balances its books
+STATUSES = ("None", "Rich", "Middle", "Poor")
+
+
+class Population:
+    """
+    Counter table of the agents placed in the World. Citizens emit their state
+    and status transitions into it, the World adds the placed agents and removes
+    the killed ones.
+
+    Attributes:
+        cops: number of cops
+        citizens: number of citizens
+        states: state -> number of citizens in that state
+        statuses: status -> number of citizens with that status
+        table: (status, state) -> number of citizens
+    """
+
+    def __init__(self):
+        self.cops = 0
+        self.citizens = 0
+        self.states = dict.fromkeys(STATES, 0)
+        self.statuses = dict.fromkeys(STATUSES, 0)
+        self.table = {(status, state): 0 for status in STATUSES for state in STATES}
+
+    def _shift(self, status, state, n):
+        self.states[state] += n
+        self.statuses[status] += n
+        self.table[(status, state)] += n
+
+    def add(self, agent):
+        """
+        Counts a newly placed agent.
+        """
+        if agent.alignment == "Cop":
+            self.cops += 1
+        elif agent.alignment == "Citizen":
+            self.citizens += 1
+            self._shift(agent.status, agent.state, 1)
+
+    def add_placed(self, cops, citizens):
+        """
+        Counts newly placed cops and citizens at once, the citizens being
+        Calm without a status like every citizen when it is placed.
+        """
+        self.cops += cops
+        self.citizens += citizens
+        self._shift("None", "Calm", citizens)
+
+    def remove(self, agent):
+        """
+        Uncounts a removed agent.
+        """
+        if agent.alignment == "Cop":
+            self.cops -= 1
+        elif agent.alignment == "Citizen":
+            self.citizens -= 1
+            self._shift(agent.status, agent.state, -1)
+
+    def transition(self, status, state, new_status, new_state):
+        """
+        Moves one citizen from (status, state) to (new_status, new_state).
+        """
+        self._shift(status, state, -1)
+        self._shift(new_status, new_state, 1)
+
+    def load(self, table, cops):
+        """
+        Replaces the counters with the given counts, the citizen counts are
+        listed in the (status, state) order of the table.
+        """
+        self.cops = cops
+        self.citizens = sum(table)
+        self.states = dict.fromkeys(STATES, 0)
+        self.statuses = dict.fromkeys(STATUSES, 0)
+        for (status, state), count in zip(self.table, table):
+            self.table[(status, state)] = count
+            self.states[state] += count
+            self.statuses[status] += count
+
+    def active(self, status):
+        """
+        Number of revolting citizens with the given status.
+        """
+        return self.table[(status, "Revolt")]
+
+    @classmethod
+    def recount(cls, agents):
+        """
+        Builds a new counter table from a full scan of the agents.
+        """
+        population = cls()
+        for agent in agents:
+            population.add(agent)
+        return population
+
+    def verify(self, agents):
+        """
+        Cross checks the counters against a full recount of the agents and
+        raises a RuntimeError naming the counters which drifted.
+        """
+        expected = self.recount(agents)
+        mismatches = []
+        if self.cops != expected.cops:
+            mismatches.append(f"cops {self.cops} != {expected.cops}")
+        if self.citizens != expected.citizens:
+            mismatches.append(f"citizens {self.citizens} != {expected.citizens}")
+        for key, count in expected.table.items():
+            if self.table[key] != count:
+                mismatches.append(f"{key} {self.table[key]} != {count}")
+        if mismatches:
+            raise RuntimeError(
+                "Population counters drifted from a full recount: "
+                + ", ".join(mismatches)
+            )
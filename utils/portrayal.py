@@ -1,6 +1,5 @@
-from env import World
+from functools import lru_cache
 from agents.citizen import Citizen
-from .params import model_params, gridsize, confidence_threshold
 from .gradient import linear_gradient
 
 # All agents will be circle in a 25x25 grid
@@ -16,16 +15,33 @@ RICH_COLOR = "#b30000"
 MIDDLE_COLOR = "#ff0000"
 POOR_COLOR = "#ffa64d"
 COP_COLOR = "#000000"
-GRIEVANCE_GRAD = linear_gradient("#ffffb7", "#9b870d", n=100)["hex"]
+
+
+@lru_cache(maxsize=None)
+def grievance_gradient():
+    """
+    Colors of the grievance levels, built the first time they are drawn.
+    """
+    return linear_gradient("#ffffb7", "#9b870d", n=100)["hex"]
+
+
+def agent_label(agent):
+    """
+    Hover text of an agent: status, confidence and grievance of a citizen,
+    id of a cop.
+    """
+    if isinstance(agent, Citizen):
+        return (
+            f"{agent.status} | {round(agent.confidence,2)} | {round(agent.grievance,2)}"
+        )
+    return f"Cop {agent.unique_id}"
 
 
 def agent_portrayal(agent):
     portrayal = {"Shape": "circle", "Filled": "True", "Layer": 0, "r": "0.5"}
 
     if isinstance(agent, Citizen):
-        portrayal[
-            "Text"
-        ] = f"{agent.status} | {round(agent.confidence,2)} | {round(agent.grievance,2)}"
+        portrayal["Text"] = agent_label(agent)
 
         if agent.state == "Revolt":
             portrayal["Color"] = "gray"
@@ -50,7 +66,7 @@ def agent_portrayal(agent):
                 portrayal["Color"] = "blue"
 
     elif agent.alignment == "Cop":
-        portrayal["Text"] = f"Cop {agent.unique_id}"
+        portrayal["Text"] = agent_label(agent)
         portrayal["Color"] = COP_COLOR
 
     return portrayal
@@ -67,7 +83,7 @@ def grievance_portrayal(agent):
 
     if isinstance(agent, Citizen):
         grievance_value = int(agent.grievance * 100)
-        color = GRIEVANCE_GRAD[grievance_value]
+        color = grievance_gradient()[grievance_value]
         portrayal["Color"] = color
         portrayal["w"] = 0.75
         portrayal["h"] = 0.75
@@ -0,0 +1,195 @@
+import time
+import weakref
+from agents.citizen import Citizen
+from agents.authority import Cop, Bank
+from agents.arrays import ArrayEngine
+from utils.market import Market
+
+# The file contains the per phase profiler of the World. While a World is being
+# profiled the methods of the phases below are replaced on their class by timed
+# wrappers which add their call count and wall time to the profiler of the
+# World they belong to. When no World is profiled the original methods are put
+# back, so profiling costs nothing when it is off. pandas is only imported to
+# build the reports.
+
+
+# Phase name -> (class, method). Phases nest: bank_settle and
+# arrays.balance_books include the bank_balance calls they make, step_agents
+# includes every agent phase and the step phase is the whole World.step.
+PHASES = {
+    "update_neighbors": (Citizen, "update_neighbors"),
+    "update_state": (Citizen, "update_state"),
+    "random_move": (Citizen, "random_move"),
+    "kill_cops": (Citizen, "kill_cops"),
+    "do_business": (Citizen, "do_business"),
+    "balance_books": (Citizen, "balance_books"),
+    "bank_balance": (Bank, "bank_balance"),
+    "bank_settle": (Bank, "settle"),
+    "market_trade": (Market, "trade"),
+    "update_status": (Citizen, "update_status"),
+    "measure_confidence": (Citizen, "measure_confidence"),
+    "cop_neighbors": (Cop, "get_neighbors"),
+    "cop_move": (Cop, "move"),
+    "jail_citizen": (Cop, "jail_citizen"),
+    "arrays.take_turns": (ArrayEngine, "take_turns"),
+    "arrays.do_business": (ArrayEngine, "do_business"),
+    "arrays.balance_books": (ArrayEngine, "balance_books"),
+    "arrays.update_status": (ArrayEngine, "update_status"),
+    "arrays.measure_confidence": (ArrayEngine, "measure_confidence"),
+}
+
+# Phases which are methods of World, imported late since env.py imports this file
+WORLD_PHASES = ("collect", "step_agents", "update_core", "remove_killed")
+
+# Original methods of the phases while the wrappers are installed
+_originals = {}
+# Number of open profilers, the wrappers are installed while it is above 0
+_users = 0
+
+
+def timed(phase, method, world):
+    """
+    Wraps a method to add its wall time to the profiler of the World the
+    object belongs to, if that World is being profiled. world tells whether
+    the object is the World itself or an object with a model attribute.
+    """
+    clock = time.perf_counter
+
+    def wrapper(self, *args, **kwargs):
+        profiler = getattr(self if world else self.model, "profiler", None)
+        if profiler is None:
+            return method(self, *args, **kwargs)
+        start = clock()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            profiler.add(phase, clock() - start)
+
+    wrapper.__wrapped__ = method
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+def phases():
+    """
+    Every phase as (name, class, method name, whether the class is World),
+    the World phases included.
+    """
+    from env import World
+
+    for name, (cls, method) in PHASES.items():
+        yield name, cls, method, False
+    for name in WORLD_PHASES:
+        yield name, World, name, True
+
+
+def acquire():
+    global _users
+    if _users == 0:
+        for name, cls, method, world in phases():
+            original = cls.__dict__[method]
+            _originals[(cls, method)] = original
+            setattr(cls, method, timed(name, original, world))
+    _users += 1
+
+
+def release():
+    global _users
+    _users -= 1
+    if _users == 0:
+        for (cls, method), original in _originals.items():
+            setattr(cls, method, original)
+        _originals.clear()
+
+
+class Profiler:
+    """
+    Call counts and wall time of every phase of a World, in total and per
+    step. Creating a profiler installs the timed wrappers, close() removes
+    them once no other profiler is open. A profiler dropped without close()
+    releases the wrappers when it is garbage collected.
+
+    Attributes:
+        calls, seconds: phase -> call count and wall time since the start
+        rows: one dict per step with the calls and seconds of every phase
+            during that step
+        open: whether the profiler still holds the wrappers installed
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.rows = []
+        self.step_calls = {}
+        self.step_seconds = {}
+        self.started = None
+        self.open = True
+        acquire()
+        self.finalizer = weakref.finalize(self, release)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["finalizer"]
+        return state
+
+    def __setstate__(self, state):
+        # A profiler restored from a checkpoint installs the wrappers again
+        self.__dict__.update(state)
+        self.finalizer = None
+        if self.open:
+            acquire()
+            self.finalizer = weakref.finalize(self, release)
+
+    def add(self, phase, seconds):
+        self.step_calls[phase] = self.step_calls.get(phase, 0) + 1
+        self.step_seconds[phase] = self.step_seconds.get(phase, 0) + seconds
+
+    def begin_step(self):
+        self.started = time.perf_counter()
+
+    def end_step(self, step):
+        """
+        Closes the row of the step and adds it to the totals. A step which
+        was already under way when profiling started is left out.
+        """
+        if self.started is None:
+            self.step_calls = {}
+            self.step_seconds = {}
+            return
+        self.add("step", time.perf_counter() - self.started)
+        row = {"Step": step}
+        for phase, seconds in self.step_seconds.items():
+            calls = self.step_calls[phase]
+            row[f"{phase} calls"] = calls
+            row[f"{phase} seconds"] = seconds
+            self.calls[phase] = self.calls.get(phase, 0) + calls
+            self.seconds[phase] = self.seconds.get(phase, 0) + seconds
+        self.rows.append(row)
+        self.step_calls = {}
+        self.step_seconds = {}
+        self.started = None
+
+    def close(self):
+        if self.open:
+            self.open = False
+            self.finalizer()
+
+    def report(self):
+        """
+        The per step report as a DataFrame indexed by step.
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.rows).set_index("Step").fillna(0)
+
+    def summary(self):
+        """
+        Total calls, seconds and seconds per call of every phase as a
+        DataFrame, slowest phase first.
+        """
+        import pandas as pd
+
+        frame = pd.DataFrame({"calls": self.calls, "seconds": self.seconds})
+        frame["per call"] = frame["seconds"] / frame["calls"]
+        return frame.sort_values("seconds", ascending=False)
@@ -0,0 +1,215 @@
+import base64
+import numpy as np
+import tornado.escape
+from mesa.visualization.ModularVisualization import (
+    ModularServer,
+    SocketHandler,
+    VisualizationElement,
+)
+from utils.population import STATES, STATUSES
+from utils.portrayal import (
+    RICH_COLOR,
+    MIDDLE_COLOR,
+    POOR_COLOR,
+    COP_COLOR,
+    grievance_gradient,
+    agent_label,
+)
+
+# The file contains a compact replacement of the CanvasGrid of mesa. Instead of
+# one portrayal dict per agent serialized as JSON at every frame, a RasterGrid
+# sends one byte per cell, the code of what is drawn in it, and after the first
+# frame only the cells whose code changed. The shape and color of every code are
+# sent once with the page. The hover labels are not part of the frames, the
+# browser asks for the label of a cell when the pointer stops on it.
+
+
+# Codes shared by the views, the other codes depend on the view
+EMPTY, COP = 0, 1
+
+# Codes of the "agents" view after COP: revolting, jailed, then calm citizens
+# by status in the order of STATUSES
+REVOLT_CODE, JAIL_CODE, CALM_CODE = 2, 3, 4
+
+# Code of a citizen with the lowest grievance in the "grievance" view, one code
+# per color of the gradient follows
+GRIEVANCE_CODE = 2
+
+# Shape and color of every code of every view, like the portrayals of
+# utils/portrayal.py
+PALETTES = {
+    "agents": [
+        None,
+        {"Shape": "circle", "Color": COP_COLOR, "r": 0.5},
+        {"Shape": "circle", "Color": "gray", "r": 0.5},
+        {"Shape": "rect", "Color": "black", "w": 0.5, "h": 0.5},
+        {"Shape": "circle", "Color": "blue", "r": 0.5},
+        {"Shape": "circle", "Color": RICH_COLOR, "r": 0.5},
+        {"Shape": "circle", "Color": MIDDLE_COLOR, "r": 0.5},
+        {"Shape": "circle", "Color": POOR_COLOR, "r": 0.5},
+    ],
+    "grievance": [
+        None,
+        {"Shape": "rect", "Color": COP_COLOR, "w": 0.75, "h": 0.75},
+    ]
+    + [
+        {"Shape": "rect", "Color": color, "w": 0.75, "h": 0.75}
+        for color in grievance_gradient()
+    ],
+}
+
+# Share of changed cells above which a full frame is sent instead of a delta
+FULL_FRAME_RATIO = 0.2
+
+
+def encode(array):
+    """
+    Little endian bytes of the array as base64 text, for the JSON frames.
+    """
+    little = array.astype(array.dtype.newbyteorder("<"))
+    return base64.b64encode(little.tobytes()).decode("ascii")
+
+
+class RasterGrid(VisualizationElement):
+    """
+    Grid visualization sending packed cell codes instead of portrayals. One
+    agent is drawn per cell, a cop over a citizen, the citizen scheduled last
+    over the others.
+
+    A frame is {"full": codes} with the code of every cell, cell id being
+    x * grid_height + y, or {"cells": ids, "codes": codes} with the cells
+    which changed since the previous frame, both base64 encoded.
+
+    Attributes:
+        view: "agents" draws the citizens by state and status like
+            agent_portrayal, "grievance" by grievance like grievance_portrayal
+        grid_width, grid_height: size of the grid, in cells
+        canvas_width, canvas_height: size of the canvas, in pixels
+        previous: codes of the previous frame, None before the first one
+        rendered: model of the previous frame
+    """
+
+    local_includes = ["utils/js/RasterGrid.js"]
+
+    def __init__(
+        self, view, grid_width, grid_height, canvas_width=500, canvas_height=500
+    ):
+        if view not in PALETTES:
+            raise ValueError(f"view must be one of {tuple(PALETTES)}, not {view!r}")
+        self.view = view
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.canvas_width = canvas_width
+        self.canvas_height = canvas_height
+        self.previous = None
+        self.rendered = None
+        # The index of the element is the length of the elements before it
+        self.js_code = "elements.push(new RasterGrid({}, {}, {}, {}, {}, {}));".format(
+            canvas_width,
+            canvas_height,
+            grid_width,
+            grid_height,
+            tornado.escape.json_encode(PALETTES[view]),
+            "elements.length",
+        )
+
+    def citizen_codes(self, state, status, grievance):
+        """
+        Codes of citizens from their state and status codes and grievance.
+        """
+        if self.view == "grievance":
+            buckets = (grievance * 100).astype(np.int64)
+            last = len(PALETTES["grievance"]) - 1
+            return np.clip(GRIEVANCE_CODE + buckets, GRIEVANCE_CODE, last)
+        return np.select(
+            [state == STATES.index("Revolt"), state == STATES.index("Jail")],
+            [REVOLT_CODE, JAIL_CODE],
+            CALM_CODE + status,
+        )
+
+    def cell_codes(self, model):
+        """
+        Code of every cell of the grid of the model, from its snapshot (see
+        utils/recording.py).
+        """
+        frame = model.snapshot()
+        codes = np.zeros(self.grid_width * self.grid_height, dtype=np.uint8)
+        codes[frame["x"] * self.grid_height + frame["y"]] = self.citizen_codes(
+            frame["state"], frame["status"], frame["grievance"]
+        )
+        codes[frame["cop_x"] * self.grid_height + frame["cop_y"]] = COP
+        return codes
+
+    def render(self, model):
+        codes = self.cell_codes(model)
+        previous, self.previous = self.previous, codes
+        fresh = self.rendered is not model
+        self.rendered = model
+        if not fresh:
+            changed = np.flatnonzero(codes != previous)
+            if len(changed) <= FULL_FRAME_RATIO * len(codes):
+                return {
+                    "cells": encode(changed.astype(np.uint32)),
+                    "codes": encode(codes[changed]),
+                }
+        return {"full": encode(codes)}
+
+    def label(self, model, x, y):
+        """
+        Hover labels of the agents in the cell, one per line. Without agents,
+        e.g. in the array engine, the labels are made from the snapshot.
+        """
+        if model.grid is not None:
+            agents = model.grid.get_cell_list_contents((x, y))
+            return "\n".join(agent_label(agent) for agent in agents)
+        frame = model.snapshot()
+        labels = [
+            f"{STATUSES[frame['status'][i]]} | {round(frame['confidence'][i],2)}"
+            f" | {round(frame['grievance'][i],2)}"
+            for i in np.flatnonzero((frame["x"] == x) & (frame["y"] == y))
+        ]
+        cops = np.count_nonzero((frame["cop_x"] == x) & (frame["cop_y"] == y))
+        return "\n".join(labels + ["Cop"] * cops)
+
+
+class LabelSocketHandler(SocketHandler):
+    """
+    Socket handler answering the label requests of the RasterGrid elements
+    with a {"type": "label"} message, other messages are handled like in the
+    SocketHandler.
+    """
+
+    def on_message(self, message):
+        msg = tornado.escape.json_decode(message)
+        if msg["type"] != "get_label":
+            return super().on_message(message)
+        x, y = msg["x"], msg["y"]
+        self.write_message(
+            {
+                "type": "label",
+                "element": msg["element"],
+                "x": x,
+                "y": y,
+                "text": self.application.label(msg["element"], x, y),
+            }
+        )
+
+
+class RasterServer(ModularServer):
+    """
+    ModularServer answering the label requests of its RasterGrid elements.
+    """
+
+    socket_handler = (r"/ws", LabelSocketHandler)
+    handlers = [
+        ModularServer.page_handler,
+        socket_handler,
+        ModularServer.static_handler,
+        ModularServer.local_handler,
+    ]
+
+    def label(self, element, x, y):
+        """
+        Label of the cell (x, y) of the element with the given index.
+        """
+        return self.visualization_elements[element].label(self.model, x, y)
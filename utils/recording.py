@@ -0,0 +1,286 @@
+import os
+import numpy as np
+from utils.population import STATES, STATUSES
+
+# The file contains the recordings of the World. While a run proceeds, headless
+# or not, a Recorder writes a compact snapshot of the grid at every recorded
+# step (position, state, status, grievance and confidence of every citizen and
+# position of every cop) together with the reporter row of that step. A Replay
+# reads a recording back and stands in for the World in the visualization (see
+# utils/replay.py), so a run can be inspected again without running any agent.
+#
+# A recording is a directory of .npz chunks, each holding a number of steps.
+# The snapshots of a chunk are concatenated, offsets[i]:offsets[i + 1] being
+# the citizens of its i-th step and cop_offsets the same for the cops.
+
+
+def snapshot(model):
+    """
+    Grid snapshot of the World as arrays: x, y, state and status codes (see
+    STATES and STATUSES), grievance and confidence of every citizen, and
+    cop_x, cop_y of every cop, in the order of the schedule or of the array
+    engine.
+    """
+    if model.arrays is not None:
+        arrays = model.arrays
+        return {
+            "x": arrays.x,
+            "y": arrays.y,
+            "state": arrays.state,
+            "status": arrays.status,
+            "grievance": arrays.grievance,
+            "confidence": arrays.confidence,
+            "cop_x": arrays.cop_x,
+            "cop_y": arrays.cop_y,
+        }
+
+    states = {state: code for code, state in enumerate(STATES)}
+    statuses = {status: code for code, status in enumerate(STATUSES)}
+    citizens, cops = [], []
+    for agent in model.schedule.agents:
+        if agent.alignment == "Citizen":
+            citizens.append(
+                (
+                    *agent.pos,
+                    states[agent.state],
+                    statuses[agent.status],
+                    agent.grievance,
+                    agent.confidence,
+                )
+            )
+        elif agent.alignment == "Cop":
+            cops.append(agent.pos)
+    columns = np.array(citizens, dtype=float).reshape(-1, 6).T
+    positions = np.array(cops, dtype=np.int64).reshape(-1, 2).T
+    return {
+        "x": columns[0].astype(np.int64),
+        "y": columns[1].astype(np.int64),
+        "state": columns[2].astype(np.int64),
+        "status": columns[3].astype(np.int64),
+        "grievance": columns[4],
+        "confidence": columns[5],
+        "cop_x": positions[0],
+        "cop_y": positions[1],
+    }
+
+
+# Stored type of every snapshot array
+DTYPES = {
+    "x": np.uint16,
+    "y": np.uint16,
+    "state": np.uint8,
+    "status": np.uint8,
+    "grievance": np.float16,
+    "confidence": np.float16,
+    "cop_x": np.uint16,
+    "cop_y": np.uint16,
+}
+
+
+class Recorder:
+    """
+    Records the snapshot and reporter row of every every-th collected step
+    of a World to a directory of .npz chunks, chunk_steps steps per chunk.
+    A chunk is written to a temporary file first and renamed, so a chunk on
+    disk is always complete.
+
+    Attributes:
+        path: directory of the chunk files
+        every: a step is recorded if its number is a multiple of every
+        chunk_steps: number of steps buffered before a chunk is written
+        buffer: (step, snapshot, reporter row) of the steps not yet written
+        columns: reporter columns of the rows, set by the first record
+        size: width and height of the grid, set by the first record
+        written: number of chunks written
+    """
+
+    def __init__(self, path, every=1, chunk_steps=100):
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        self.path = path
+        self.every = every
+        self.chunk_steps = chunk_steps
+        self.buffer = []
+        self.columns = None
+        self.size = None
+        self.written = 0
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.startswith("frames") and name.endswith(".npz"):
+                os.remove(os.path.join(path, name))
+
+    def record(self, model):
+        """
+        Records the current step of the model, after its reporters were
+        collected.
+        """
+        step = model.schedule.steps
+        if step % self.every:
+            return
+        if self.columns is None:
+            self.columns = list(model.metrics.values)
+            grid = model.arrays if model.arrays is not None else model.grid
+            self.size = (grid.width, grid.height)
+        values = model.metrics.values
+        row = [values[name] for name in self.columns]
+        # Converted right away, which also copies the arrays of the array engine
+        frame = {
+            name: value.astype(DTYPES[name]) for name, value in snapshot(model).items()
+        }
+        self.buffer.append((step, frame, row))
+        if len(self.buffer) >= self.chunk_steps:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered steps to a new chunk.
+        """
+        if not self.buffer:
+            return
+        steps, frames, rows = zip(*self.buffer)
+        citizens = [len(frame["x"]) for frame in frames]
+        cops = [len(frame["cop_x"]) for frame in frames]
+        arrays = {
+            name: np.concatenate([frame[name] for frame in frames])
+            for name in DTYPES
+        }
+        path = os.path.join(self.path, f"frames{self.written:06d}.npz")
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(
+                f,
+                steps=np.array(steps, dtype=np.int64),
+                offsets=np.cumsum([0] + citizens),
+                cop_offsets=np.cumsum([0] + cops),
+                size=np.array(self.size),
+                columns=np.array(self.columns),
+                table=np.array(rows, dtype=float),
+                **arrays,
+            )
+        os.replace(path + ".tmp", path)
+        self.written += 1
+        self.buffer = []
+
+    def truncate(self):
+        """
+        Drops the chunks written after the last chunk of this recorder, e.g.
+        by a run restored from an earlier checkpoint.
+        """
+        for name in os.listdir(self.path):
+            if name.startswith("frames") and name.endswith(".npz"):
+                if int(name[6:-4]) >= self.written:
+                    os.remove(os.path.join(self.path, name))
+
+
+class ReplayCollector:
+    """
+    Stands in for the DataCollector of a replayed World: model_vars holds the
+    reporter values of the current row, which is what the charts read.
+
+    Attributes:
+        replay: Replay the rows are read from
+    """
+
+    def __init__(self, replay):
+        self.replay = replay
+
+    @property
+    def model_vars(self):
+        row = self.replay.table[self.replay.row]
+        return {name: [value] for name, value in zip(self.replay.columns, row)}
+
+
+class ReplaySchedule:
+    """
+    Stands in for the schedule of a replayed World, steps is the recorded
+    step of the current row.
+
+    Attributes:
+        replay: Replay the steps are read from
+    """
+
+    def __init__(self, replay):
+        self.replay = replay
+
+    @property
+    def steps(self):
+        return int(self.replay.steps[self.replay.row])
+
+
+class Replay:
+    """
+    A recording read back, positioned on one of its rows (recorded steps).
+    The steps and reporter rows of the whole recording are read at once, the
+    snapshots one chunk at a time when they are asked for.
+
+    Attributes:
+        path: directory of the recording
+        steps: recorded step of every row
+        columns: reporter columns
+        table: reporter values, one row per recorded step
+        width, height: size of the grid
+        row: current row
+        running: whether the current row is not the last one
+        schedule, datacollector: stand ins for the ones of the World
+        arrays, grid: None, a replay has neither agents nor grid
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.chunks = []
+        steps, tables = [], []
+        for name in sorted(os.listdir(path)):
+            if not (name.startswith("frames") and name.endswith(".npz")):
+                continue
+            with np.load(os.path.join(path, name)) as chunk:
+                self.chunks.append((os.path.join(path, name), len(chunk["steps"])))
+                steps.append(chunk["steps"])
+                tables.append(chunk["table"])
+                self.columns = chunk["columns"].tolist()
+                self.width, self.height = chunk["size"].tolist()
+        if not self.chunks:
+            raise ValueError(f"{path} holds no recorded steps")
+        self.steps = np.concatenate(steps)
+        self.table = np.concatenate(tables)
+        self.starts = np.cumsum([0] + [rows for _, rows in self.chunks])
+        self.row = 0
+        self.loaded = (None, None)
+        self.schedule = ReplaySchedule(self)
+        self.datacollector = ReplayCollector(self)
+        self.arrays = None
+        self.grid = None
+
+    def __len__(self):
+        return len(self.steps)
+
+    @property
+    def running(self):
+        return self.row < len(self) - 1
+
+    def seek(self, row):
+        """
+        Moves to the given row, clipped to the rows of the recording.
+        """
+        self.row = min(max(row, 0), len(self) - 1)
+
+    def snapshot(self):
+        """
+        Snapshot of the current row, with the same arrays as snapshot().
+        """
+        index = int(np.searchsorted(self.starts, self.row, side="right")) - 1
+        number, chunk = self.loaded
+        if number != index:
+            with np.load(self.chunks[index][0]) as data:
+                chunk = {name: data[name] for name in data.files}
+            self.loaded = (index, chunk)
+        i = self.row - self.starts[index]
+        start, stop = chunk["offsets"][i : i + 2]
+        cop_start, cop_stop = chunk["cop_offsets"][i : i + 2]
+        frame = {}
+        for name in DTYPES:
+            if name.startswith("cop_"):
+                frame[name] = chunk[name][cop_start:cop_stop].astype(np.int64)
+            elif name in ("grievance", "confidence"):
+                frame[name] = chunk[name][start:stop].astype(float)
+            else:
+                frame[name] = chunk[name][start:stop].astype(np.int64)
+        return frame
@@ -0,0 +1,107 @@
+import tornado.escape
+from mesa.visualization.ModularVisualization import VisualizationElement
+from utils.background import BatchedChartModule
+from utils.raster import LabelSocketHandler, RasterServer
+from utils.recording import Replay
+
+# The file contains the replay mode of the visualization server. The server
+# shows a recording of utils/recording.py instead of a running World: every
+# frame moves the Replay to another recorded step, forward when the browser
+# plays it, anywhere with the ReplayControl slider, and renders the recorded
+# snapshot and reporters. No agent logic runs. The grids are RasterGrids and
+# the charts BatchedChartModules, which are redrawn when the replay jumps back.
+
+
+class ReplayControl(VisualizationElement):
+    """
+    Slider and buttons moving the replay to any recorded step, showing the
+    current step.
+    """
+
+    local_includes = ["utils/js/ReplayControl.js"]
+
+    def __init__(self):
+        self.js_code = "elements.push(new ReplayControl());"
+
+    def render(self, model):
+        return {"row": model.row, "rows": len(model), "step": model.schedule.steps}
+
+
+class ReplaySocketHandler(LabelSocketHandler):
+    """
+    Socket handler of the ReplayServer. A step request moves the replay
+    forward by the speed of the server, a seek request to the given row.
+    """
+
+    def on_message(self, message):
+        msg = tornado.escape.json_decode(message)
+        application = self.application
+        if msg["type"] == "get_step":
+            if not application.model.running:
+                self.write_message({"type": "end"})
+                return
+            application.move(application.model.row + application.speed)
+        elif msg["type"] == "seek":
+            application.move(int(msg["row"]))
+        else:
+            super().on_message(message)
+            return
+        self.write_message(self.viz_state_message)
+
+
+class ReplayServer(RasterServer):
+    """
+    Visualization server replaying a recording, see the top of the file.
+
+    Attributes:
+        speed: number of recorded steps a frame moves forward
+        batched_charts: the BatchedChartModule elements
+    """
+
+    socket_handler = (r"/ws", ReplaySocketHandler)
+    handlers = [
+        RasterServer.page_handler,
+        socket_handler,
+        RasterServer.static_handler,
+        RasterServer.local_handler,
+    ]
+
+    def __init__(self, visualization_elements, name, path, speed=1):
+        if speed < 1:
+            raise ValueError("speed must be at least 1")
+        self.speed = speed
+        self.batched_charts = [
+            element
+            for element in visualization_elements
+            if isinstance(element, BatchedChartModule)
+        ]
+        super().__init__(Replay, visualization_elements, name, {"path": path})
+
+    def reset_model(self):
+        """
+        Opens the recording again, on its first recorded step.
+        """
+        super().reset_model()
+        self.move(0)
+
+    def move(self, row):
+        """
+        Moves the replay to the given row. Moving forward the charts get the
+        rows in between, moving back they are redrawn up to the new row.
+        """
+        replay = self.model
+        previous = replay.row
+        replay.seek(row)
+        target = replay.row
+        if target > previous:
+            rows = range(previous + 1, target + 1)
+        else:
+            for chart in self.batched_charts:
+                chart.rewind()
+            window = max([chart.max_points for chart in self.batched_charts] + [1])
+            rows = range(max(target - window + 1, 0), target + 1)
+        for r in rows:
+            replay.seek(r)
+            for chart in self.batched_charts:
+                chart.collect(replay)
+        replay.seek(target)
@@ -0,0 +1,162 @@
+from mesa.time import SimultaneousActivation
+
+# The file contains the scheduler of the World. The agents are kept in a list
+# addressed by slot, so removing an agent only blanks its slot (a tombstone)
+# instead of touching the rest of the store. The tombstones are dropped in one
+# pass once they make up a good part of the store, between two steps.
+#
+# Agents can also be parked until a given step, e.g. jailed citizens until
+# their release. A parked agent keeps its slot, blanked, and waits in a timer
+# wheel keyed by its release step, so it costs nothing until then and is
+# stepped again in its own place.
+
+
+class AgentStore(SimultaneousActivation):
+    """
+    Simultaneous activation scheduler over an index addressed agent store.
+    Agents are stepped and advanced in the order they were added, like
+    mesa.time.SimultaneousActivation does.
+
+    Attributes:
+        model: World model
+        steps, time: number of steps made
+        slots: the agents by slot, None for the slot of a removed or parked
+            agent
+        index: unique_id -> slot of every agent in the store, parked agents
+            included
+        tombstones: number of None slots of removed agents
+        compact_ratio: share of tombstones in the slots above which the store
+            is compacted
+        wheel: release step -> {unique_id: agent} of the agents parked until
+            that step
+        parked: unique_id -> release step of every parked agent
+        cursor: slot being stepped, None outside of the agent steps
+    """
+
+    def __init__(self, model, compact_ratio=0.25):
+        super().__init__(model)
+        self.slots = []
+        self.index = {}
+        self.tombstones = 0
+        self.compact_ratio = compact_ratio
+        self.wheel = {}
+        self.parked = {}
+        self.cursor = None
+
+    def add(self, agent):
+        self.index[agent.unique_id] = len(self.slots)
+        self.slots.append(agent)
+
+    def add_many(self, agents):
+        """
+        Adds the agents in order, like add for every agent.
+        """
+        start = len(self.slots)
+        self.index.update(
+            (agent.unique_id, slot) for slot, agent in enumerate(agents, start)
+        )
+        self.slots.extend(agents)
+
+    def remove(self, agent):
+        """
+        Removes the agent in O(1) by leaving a tombstone in its slot.
+        """
+        slot = self.index.pop(agent.unique_id)
+        release = self.parked.pop(agent.unique_id, None)
+        if release is not None:
+            del self.wheel[release][agent.unique_id]
+        self.slots[slot] = None
+        self.tombstones += 1
+
+    def park(self, agent, release):
+        """
+        Leaves the agent out of the steps until the release step. The agent
+        is stepped again from that step on, in its own slot, after its wake()
+        method is called.
+        """
+        self.slots[self.index[agent.unique_id]] = None
+        self.wheel.setdefault(release, {})[agent.unique_id] = agent
+        self.parked[agent.unique_id] = release
+
+    def stepped(self, agent):
+        """
+        Whether the agent was already stepped during the current step.
+        """
+        return self.cursor is not None and self.index[agent.unique_id] < self.cursor
+
+    def wake(self):
+        """
+        Puts the agents released at the current step back in their slots.
+        """
+        for unique_id, agent in self.wheel.pop(self.steps, {}).items():
+            del self.parked[unique_id]
+            self.slots[self.index[unique_id]] = agent
+            agent.wake()
+
+    def compact(self):
+        """
+        Drops the tombstones and renumbers the slots, keeping the order. The
+        slots of parked agents are kept.
+        """
+        parked = {self.index[unique_id]: unique_id for unique_id in self.parked}
+        slots = []
+        index = {}
+        for slot, agent in enumerate(self.slots):
+            if agent is not None:
+                index[agent.unique_id] = len(slots)
+            elif slot in parked:
+                index[parked[slot]] = len(slots)
+            else:
+                continue
+            slots.append(agent)
+        self.slots = slots
+        self.index = index
+        self.tombstones = 0
+
+    def step(self):
+        if self.wheel:
+            self.wake()
+        if self.tombstones > self.compact_ratio * len(self.slots):
+            self.compact()
+
+        # Agents added during the step wait for the next one, like in mesa.
+        # The slots are read as the step goes, so an agent parked or removed
+        # before its turn is not stepped.
+        slots = self.slots
+        count = len(slots)
+        for slot in range(count):
+            agent = slots[slot]
+            if agent is not None:
+                self.cursor = slot
+                agent.step()
+        self.cursor = None
+        for slot in range(count):
+            agent = slots[slot]
+            if agent is not None:
+                agent.advance()
+        self.steps += 1
+        self.time += 1
+
+    def get_agent_count(self):
+        return len(self.index)
+
+    @property
+    def agents(self):
+        """
+        Every agent in the store in slot order, parked agents included.
+        """
+        if not self.parked:
+            return [agent for agent in self.slots if agent is not None]
+        agents = list(self.slots)
+        for parked in self.wheel.values():
+            for unique_id, agent in parked.items():
+                agents[self.index[unique_id]] = agent
+        return [agent for agent in agents if agent is not None]
+
+    def agent_buffer(self, shuffled=False):
+        agents = self.agents
+        if shuffled:
+            self.model.random.shuffle(agents)
+        for agent in agents:
+            if agent.unique_id in self.index:
+                yield agent
@@ -0,0 +1,203 @@
+import csv
+import os
+import time
+import numpy as np
+
+# The file contains the streaming sinks of the model reporters. Instead of
+# keeping every reporter value of the run in memory until the end, the rows are
+# buffered for a while and appended to a file on disk in chunks, so a long run
+# uses bounded memory and what was flushed survives the process dying. pandas
+# is only imported to read the rows back, a streaming run never loads it.
+
+
+class CSVSink:
+    """
+    Appends the rows to one CSV file with a header line, chunk by chunk.
+    The file is opened for every chunk, so the sink holds no open handle.
+
+    Attributes:
+        path: path of the CSV file
+        columns: names of the columns, the first one is the step
+        size: size of the file after the last chunk
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerow(self.columns)
+        self.size = os.path.getsize(path)
+
+    def write(self, rows):
+        with open(self.path, "a", newline="") as f:
+            csv.writer(f).writerows(rows)
+        self.size = os.path.getsize(self.path)
+
+    def truncate(self):
+        """
+        Drops whatever was appended to the file after the last chunk of this
+        sink, e.g. by a run restored from an earlier checkpoint.
+        """
+        os.truncate(self.path, self.size)
+
+    def chunks(self, rows=1000):
+        return read_run(self.path, rows)
+
+
+class NPZSink:
+    """
+    Writes every chunk of rows to its own .npz file in a directory, one array
+    per column. A chunk is written to a temporary file first and renamed, so
+    a chunk on disk is always complete.
+
+    Attributes:
+        path: directory of the chunk files
+        columns: names of the columns, the first one is the step
+        written: number of chunks written
+    """
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.written = 0
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.startswith("chunk") and name.endswith(".npz"):
+                os.remove(os.path.join(path, name))
+
+    def write(self, rows):
+        table = np.array(rows, dtype=float).reshape(-1, len(self.columns))
+        path = os.path.join(self.path, f"chunk{self.written:06d}.npz")
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, columns=np.array(self.columns), table=table)
+        os.replace(path + ".tmp", path)
+        self.written += 1
+
+    def truncate(self):
+        """
+        Drops the chunks written after the last chunk of this sink.
+        """
+        for name in os.listdir(self.path):
+            if name.startswith("chunk") and name.endswith(".npz"):
+                if int(name[5:-4]) >= self.written:
+                    os.remove(os.path.join(self.path, name))
+
+    def chunks(self, rows=1000):
+        return read_run(self.path, rows)
+
+
+def open_sink(path, columns):
+    """
+    A sink for the path, CSVSink for a .csv file and NPZSink for a directory
+    of .npz chunks otherwise.
+    """
+    if path.endswith(".csv"):
+        return CSVSink(path, columns)
+    return NPZSink(path, columns)
+
+
+def read_run(path, rows=1000):
+    """
+    Lazily reads back the reporters of a run written by a sink as
+    DataFrames indexed by step, without loading the whole run in memory.
+    A CSV file is read rows at a time, a directory of .npz chunks one chunk
+    at a time.
+    """
+    import pandas as pd
+
+    if path.endswith(".csv"):
+        yield from pd.read_csv(path, index_col=0, chunksize=rows)
+        return
+    for name in sorted(os.listdir(path)):
+        if not (name.startswith("chunk") and name.endswith(".npz")):
+            continue
+        with np.load(os.path.join(path, name)) as chunk:
+            columns = chunk["columns"].tolist()
+            frame = pd.DataFrame(chunk["table"], columns=columns)
+        frame = frame.set_index(columns[0])
+        frame.index = frame.index.astype(np.int64)
+        yield frame
+
+
+class StreamingCollector:
+    """
+    Drop in for the DataCollector of the World which streams the model
+    reporter rows to a sink. Rows are kept in a buffer which is flushed to the
+    sink every flush_every rows, or when flush_seconds have passed since the
+    last flush. Only the buffer and the latest row are kept in memory.
+
+    Attributes:
+        model_reporters: reporter column -> reporter callable
+        sink: CSVSink, NPZSink or any object with write(rows), chunks() and
+            truncate()
+        flush_every: maximum number of rows buffered in memory
+        flush_seconds: maximum time between two flushes, None for no limit
+        buffer: rows not yet flushed to the sink
+        steps: step of the next row
+        model_vars: reporter column -> list holding only its latest value,
+            which is what the charts of the server read
+    """
+
+    def __init__(
+        self, model_reporters, sink, flush_every=100, flush_seconds=None, start=0
+    ):
+        self.model_reporters = dict(model_reporters)
+        self.sink = sink
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.buffer = []
+        self.steps = start
+        self.flushed_at = time.monotonic()
+        self.model_vars = {name: [] for name in self.model_reporters}
+
+    @classmethod
+    def to_path(cls, model_reporters, path, **kwargs):
+        """
+        A collector streaming to the sink opened for the path, see open_sink.
+        """
+        sink = open_sink(path, ["Step", *model_reporters])
+        return cls(model_reporters, sink, **kwargs)
+
+    def collect(self, model):
+        row = [self.steps]
+        for name, reporter in self.model_reporters.items():
+            value = reporter(model)
+            row.append(value)
+            self.model_vars[name] = [value]
+        self.buffer.append(row)
+        self.steps += 1
+
+        if len(self.buffer) >= self.flush_every or (
+            self.flush_seconds is not None
+            and time.monotonic() - self.flushed_at >= self.flush_seconds
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered rows to the sink.
+        """
+        if self.buffer:
+            self.sink.write(self.buffer)
+            self.buffer = []
+        self.flushed_at = time.monotonic()
+
+    def iter_model_vars(self, rows=1000):
+        """
+        Lazily reads back the rows collected so far, chunk by chunk.
+        """
+        self.flush()
+        for frame in self.sink.chunks(rows):
+            frame.index.name = None
+            yield frame
+
+    def get_model_vars_dataframe(self):
+        """
+        All the rows collected so far, read back from the sink.
+        """
+        import pandas as pd
+
+        frames = list(self.iter_model_vars())
+        if not frames:
+            return pd.DataFrame(columns=list(self.model_reporters))
+        return pd.concat(frames)
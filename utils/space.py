@@ -0,0 +1,338 @@
+import numpy as np
+from mesa.space import MultiGrid
+
+# The file contains the grids of the World. ArrayGrid is a drop in for
+# mesa.space.MultiGrid for the methods used by env.py and agents/*, built for
+# large worlds where a Python set (or list) per cell dominates memory and time.
+# Both grids answer neighborhood queries from a NeighborhoodIndex built once
+# per grid, since the grid never changes shape during a run.
+
+
+def accept_tuple_argument(wrapped_function):
+    """
+    Allows the methods which take a list of (x, y) positions to also take
+    a single position, like mesa.space does.
+    """
+
+    def wrapper(grid, cell_list):
+        if isinstance(cell_list, tuple) and len(cell_list) == 2:
+            return wrapped_function(grid, [cell_list])
+        return wrapped_function(grid, cell_list)
+
+    return wrapper
+
+
+class NeighborhoodIndex:
+    """
+    Lookup tables of the neighbor cell ids of every cell, one table per
+    (radius, moore, include_center). A table is built on first use with NumPy
+    and stored as flat int arrays: the neighbors of cell c are
+    indices[indptr[c]:indptr[c + 1]], listed in the same order as
+    mesa.space.Grid.iter_neighborhood lists the positions.
+
+    Attributes:
+        width, height: dimensions of the grid, cell id is x * height + y
+        torus: whether the edges of the grid wrap around
+        tables: (radius, moore, include_center) -> (indptr, indices)
+    """
+
+    def __init__(self, width, height, torus):
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self.tables = {}
+
+    def offsets(self, radius, moore, include_center):
+        return [
+            (dx, dy)
+            for dy in range(-radius, radius + 1)
+            for dx in range(-radius, radius + 1)
+            if (dx or dy or include_center) and (moore or abs(dx) + abs(dy) <= radius)
+        ]
+
+    def build(self, radius, moore, include_center):
+        offsets = np.array(self.offsets(radius, moore, include_center)).reshape(-1, 2)
+        x, y = np.divmod(np.arange(self.width * self.height), self.height)
+        nx = x[:, None] + offsets[:, 0]
+        ny = y[:, None] + offsets[:, 1]
+        if self.torus:
+            nx %= self.width
+            ny %= self.height
+        valid = (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+        cells = nx * self.height + ny
+
+        if self.torus and 2 * radius + 1 > min(self.width, self.height):
+            # Small torus: the window wraps onto itself, keep the first of
+            # every repeated cell like Grid.iter_neighborhood does
+            rows = [list(dict.fromkeys(row)) for row in cells.tolist()]
+            indptr = np.cumsum([0] + [len(row) for row in rows])
+            indices = np.array([c for row in rows for c in row])
+        else:
+            indptr = np.concatenate(([0], np.cumsum(valid.sum(1))))
+            indices = cells[valid]
+        return indptr.astype(np.int64), indices.astype(np.int32)
+
+    def table(self, radius=1, moore=True, include_center=False):
+        key = (radius, moore, include_center)
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = self.build(radius, moore, include_center)
+        return table
+
+    def cells(self, cell, radius=1, moore=True, include_center=False):
+        """
+        Neighbor cell ids of the cell as a list.
+        """
+        indptr, indices = self.table(radius, moore, include_center)
+        return indices[indptr[cell] : indptr[cell + 1]].tolist()
+
+
+class Cell(dict):
+    """
+    The agents on one cell of an IndexedMultiGrid. Works like the set of
+    mesa.space.MultiGrid but lists the agents in the order they arrived on
+    the cell, an order which a pickled grid restores as it was. The order of
+    a set also depends on the agents which left it, which is lost on pickling.
+    """
+
+    __slots__ = ()
+
+    def add(self, agent):
+        self[agent] = None
+
+    def remove(self, agent):
+        del self[agent]
+
+    def discard(self, agent):
+        self.pop(agent, None)
+
+
+class IndexedMultiGrid(MultiGrid):
+    """
+    mesa.space.MultiGrid whose neighborhood queries read the neighborhood
+    index instead of walking the window with bounds checks on every call.
+    Cells are Cell objects instead of sets.
+
+    Attributes:
+        index: NeighborhoodIndex of the grid
+    """
+
+    def __init__(self, width, height, torus):
+        super().__init__(width, height, torus)
+        self.index = NeighborhoodIndex(width, height, torus)
+
+    @staticmethod
+    def default_val():
+        return Cell()
+
+    def cell_id(self, pos):
+        x, y = pos
+        return x * self.height + y
+
+    def position(self, cell):
+        return divmod(cell, self.height)
+
+    def neighborhood_cells(self, pos, moore, include_center=False, radius=1):
+        x, y = pos
+        return self.index.cells(x * self.height + y, radius, moore, include_center)
+
+    def iter_neighborhood(self, pos, moore, include_center=False, radius=1):
+        height = self.height
+        for cell in self.neighborhood_cells(pos, moore, include_center, radius):
+            yield divmod(cell, height)
+
+    def iter_neighbors(self, pos, moore, include_center=False, radius=1):
+        grid = self.grid
+        height = self.height
+        for cell in self.neighborhood_cells(pos, moore, include_center, radius):
+            x, y = divmod(cell, height)
+            yield from grid[x][y]
+
+    def empty_cells(self, cells):
+        """
+        The cell ids of the given cells which hold no agent.
+        """
+        grid = self.grid
+        height = self.height
+        empty = []
+        for cell in cells:
+            x, y = divmod(cell, height)
+            if not grid[x][y]:
+                empty.append(cell)
+        return empty
+
+    def is_cell_empty(self, pos):
+        x, y = pos
+        return not self.grid[x][y]
+
+    def place_agents(self, agents, cells):
+        """
+        Places the agents on the given cell ids at once and sets their pos.
+        """
+        x, y = np.divmod(np.asarray(cells, dtype=np.int64), self.height)
+        positions = list(zip(x.tolist(), y.tolist()))
+        grid = self.grid
+        for agent, pos in zip(agents, positions):
+            grid[pos[0]][pos[1]].add(agent)
+            agent.pos = pos
+        self.empties.difference_update(positions)
+
+
+class ArrayGrid:
+    """
+    Grid where each cell can contain more than one agent. The number of
+    agents on every cell is kept in a NumPy count array and the agents of the
+    occupied cells in buckets keyed by cell id, so empty cells cost nothing.
+    Agents of a cell are listed in the order they arrived on it.
+
+    Attributes:
+        width, height: dimensions of the grid, cell id is x * height + y
+        torus: whether the edges of the grid wrap around
+        counts: number of agents on every cell id
+        buckets: cell id -> list of the agents on that cell, occupied cells only
+        index: NeighborhoodIndex of the grid
+    """
+
+    def __init__(self, width, height, torus):
+        self.width = width
+        self.height = height
+        self.torus = torus
+        self.counts = np.zeros(width * height, dtype=np.int32)
+        self.buckets = {}
+        self.index = NeighborhoodIndex(width, height, torus)
+
+    def cell_id(self, pos):
+        x, y = pos
+        return x * self.height + y
+
+    def position(self, cell):
+        return divmod(cell, self.height)
+
+    def coord_iter(self):
+        """
+        Iterates over (cell contents, x, y) of every cell.
+        """
+        empty = []
+        for x in range(self.width):
+            for y in range(self.height):
+                yield self.buckets.get(x * self.height + y, empty), x, y
+
+    def torus_adj(self, pos):
+        if not self.out_of_bounds(pos):
+            return pos
+        if not self.torus:
+            raise ValueError("Point out of bounds, and space non-toroidal.")
+        return pos[0] % self.width, pos[1] % self.height
+
+    def out_of_bounds(self, pos):
+        x, y = pos
+        return x < 0 or x >= self.width or y < 0 or y >= self.height
+
+    def neighborhood_cells(self, pos, moore, include_center=False, radius=1):
+        x, y = pos
+        return self.index.cells(x * self.height + y, radius, moore, include_center)
+
+    def iter_neighborhood(self, pos, moore, include_center=False, radius=1):
+        """
+        Iterates over the positions in the neighborhood of pos in the same
+        order as mesa.space.Grid does.
+        """
+        height = self.height
+        for cell in self.neighborhood_cells(pos, moore, include_center, radius):
+            yield divmod(cell, height)
+
+    def get_neighborhood(self, pos, moore, include_center=False, radius=1):
+        return list(self.iter_neighborhood(pos, moore, include_center, radius))
+
+    def iter_neighbors(self, pos, moore, include_center=False, radius=1):
+        buckets = self.buckets
+        for cell in self.neighborhood_cells(pos, moore, include_center, radius):
+            bucket = buckets.get(cell)
+            if bucket:
+                yield from bucket
+
+    def get_neighbors(self, pos, moore, include_center=False, radius=1):
+        return list(self.iter_neighbors(pos, moore, include_center, radius))
+
+    @accept_tuple_argument
+    def iter_cell_list_contents(self, cell_list):
+        buckets = self.buckets
+        height = self.height
+        for x, y in cell_list:
+            bucket = buckets.get(x * height + y)
+            if bucket:
+                yield from bucket
+
+    @accept_tuple_argument
+    def get_cell_list_contents(self, cell_list):
+        return list(self.iter_cell_list_contents(cell_list))
+
+    def empty_cells(self, cells):
+        """
+        The cell ids of the given cells which hold no agent.
+        """
+        buckets = self.buckets
+        return [cell for cell in cells if cell not in buckets]
+
+    def is_cell_empty(self, pos):
+        x, y = pos
+        return x * self.height + y not in self.buckets
+
+    def place_agents(self, agents, cells):
+        """
+        Places the agents on the given cell ids at once and sets their pos.
+        """
+        cells = np.asarray(cells, dtype=np.int64)
+        x, y = np.divmod(cells, self.height)
+        buckets = self.buckets
+        positions = zip(x.tolist(), y.tolist())
+        for agent, cell, pos in zip(agents, cells.tolist(), positions):
+            bucket = buckets.get(cell)
+            if bucket is None:
+                buckets[cell] = [agent]
+            else:
+                bucket.append(agent)
+            agent.pos = pos
+        np.add.at(self.counts, cells, 1)
+
+    def exists_empty_cells(self):
+        return len(self.buckets) < self.width * self.height
+
+    def place_agent(self, agent, pos):
+        """
+        Places the agent on the grid at pos and sets its pos.
+        """
+        cell = self.cell_id(pos)
+        bucket = self.buckets.get(cell)
+        if bucket is None:
+            self.buckets[cell] = [agent]
+        else:
+            bucket.append(agent)
+        self.counts[cell] += 1
+        agent.pos = pos
+
+    def remove_agent(self, agent):
+        """
+        Removes the agent from the grid and resets its pos.
+        """
+        cell = self.cell_id(agent.pos)
+        bucket = self.buckets[cell]
+        bucket.remove(agent)
+        if not bucket:
+            del self.buckets[cell]
+        self.counts[cell] -= 1
+        agent.pos = None
+
+    def move_agent(self, agent, pos):
+        """
+        Moves the agent from its current position to pos.
+        """
+        pos = self.torus_adj(pos)
+        self.remove_agent(agent)
+        self.place_agent(agent, pos)
+
+    def occupancy(self):
+        """
+        Number of agents on every cell as a (width, height) array.
+        """
+        return self.counts.reshape(self.width, self.height)
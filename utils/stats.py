@@ -0,0 +1,149 @@
+import math
+import numpy as np
+
+# The file contains the online statistics of the metrics engine. They summarize
+# a stream of values in constant memory, so the variance and the quantiles of
+# the citizens can be followed over a whole run without keeping the values.
+
+
+class RunningStats:
+    """
+    Count, mean and variance of a stream of values. Single values are added
+    with Welford's update and batches are merged with the pairwise update of
+    Chan et al., so the mean and variance are read in O(1) at any time.
+
+    Attributes:
+        count: number of values
+        mean: mean of the values
+        m2: sum of the squared deviations from the mean
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def push_array(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values):
+            mean = values.mean()
+            self.combine(len(values), mean, float(((values - mean) ** 2).sum()))
+
+    def merge(self, other):
+        self.combine(other.count, other.mean, other.m2)
+
+    def combine(self, count, mean, m2):
+        """
+        Adds the moments of another batch of values.
+        """
+        if not count:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    @property
+    def variance(self):
+        """
+        Population variance of the values, nan without values.
+        """
+        return self.m2 / self.count if self.count else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative accuracy. Every value is counted
+    in a bucket of logarithmic width, so every quantile is within
+    relative_accuracy of the exact one and the memory grows with the log of
+    the range of the values, not with their number.
+
+    Attributes:
+        relative_accuracy: relative error of the quantiles
+        gamma: ratio between the bounds of a bucket
+        positive, negative: bucket key -> count of the positive values and of
+            the absolute negative values
+        zeros: count of the zeros
+        count: number of values
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def push_array(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.zeros += int(np.count_nonzero(values == 0))
+        log_gamma = math.log(self.gamma)
+        for buckets, part in (
+            (self.positive, values[values > 0]),
+            (self.negative, -values[values < 0]),
+        ):
+            if len(part):
+                keys = np.ceil(np.log(part) / log_gamma).astype(np.int64)
+                keys, counts = np.unique(keys, return_counts=True)
+                for key, count in zip(keys.tolist(), counts.tolist()):
+                    buckets[key] = buckets.get(key, 0) + count
+
+    def push(self, value):
+        self.push_array([value])
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Only sketches of the same accuracy can be merged")
+        for buckets, others in (
+            (self.positive, other.positive),
+            (self.negative, other.negative),
+        ):
+            for key, count in others.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def bucket_value(self, key):
+        # Value of a bucket within relative_accuracy of all its values
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Value at the quantile q between 0 and 1, nan without values.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self.bucket_value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self.bucket_value(key)
@@ -0,0 +1,180 @@
+from collections import deque
+
+# The file contains the stop rules of the World. A run with constant parameters
+# soon settles into a stationary regime, and a sweep keeps stepping it to its
+# horizon for nothing. Every rule follows the reporter row of every collected
+# step and returns the reason the run should stop once it applies, which the
+# World keeps in stop_reason (see World(stop=...)):
+#
+#   steady: the Revolt, Calm and Jail counts barely moved over a window
+#   legitimacy: the legitimacy of the state fell to 0
+#   no_cops: every cop was killed
+#   cycles: the revolts broke out and died down a number of times, the
+#       punctuated equilibrium of the model, so its cycle is established
+#
+# A rule only reads the reporter values, so the rules work the same with every
+# engine and cost a few operations per step.
+
+
+class SteadyState:
+    """
+    Applies when the standard deviation of every column over the last
+    window steps is at most tolerance times the number of citizens. The sums
+    over the window are updated as rows come in and go out of it.
+
+    Attributes:
+        window: number of steps the columns are followed over
+        tolerance: largest standard deviation, as a fraction of the citizens
+        columns: reporter columns which have to be steady
+        rows: values of the columns over the window
+        sums, squares: sum and sum of squares of every column over the window
+    """
+
+    reason = "steady"
+
+    def __init__(self, window=100, tolerance=0.01, columns=("Revolt", "Calm", "Jail")):
+        if window < 2:
+            raise ValueError("window must be at least 2")
+        self.window = window
+        self.tolerance = tolerance
+        self.columns = columns
+        self.rows = deque()
+        self.sums = [0.0] * len(columns)
+        self.squares = [0.0] * len(columns)
+
+    def update(self, values):
+        row = [float(values[name]) for name in self.columns]
+        self.rows.append(row)
+        for i, value in enumerate(row):
+            self.sums[i] += value
+            self.squares[i] += value * value
+        if len(self.rows) > self.window:
+            for i, value in enumerate(self.rows.popleft()):
+                self.sums[i] -= value
+                self.squares[i] -= value * value
+        if len(self.rows) < self.window:
+            return None
+
+        citizens = values["Calm"] + values["Revolt"] + values["Jail"]
+        limit = (self.tolerance * citizens) ** 2
+        for total, squares in zip(self.sums, self.squares):
+            mean = total / self.window
+            if squares / self.window - mean * mean > limit:
+                return None
+        return self.reason
+
+
+class LegitimacyCollapse:
+    """
+    Applies when the legitimacy of the state fell to 0.
+    """
+
+    reason = "legitimacy"
+
+    def update(self, values):
+        if values["Legitimacy"] <= 0:
+            return self.reason
+        return None
+
+
+class CopsKilled:
+    """
+    Applies when every cop was killed, in a World which had cops at its
+    first collected step.
+
+    Attributes:
+        had_cops: whether the World had cops at its first collected step
+    """
+
+    reason = "no_cops"
+
+    def __init__(self):
+        self.had_cops = None
+
+    def update(self, values):
+        if self.had_cops is None:
+            self.had_cops = values["Cops"] > 0
+        if self.had_cops and values["Cops"] == 0:
+            return self.reason
+        return None
+
+
+class Cycles:
+    """
+    Applies once the revolts broke out a number of times. An outburst starts
+    when the revolting citizens exceed threshold of the citizens and ends
+    when they fall under half of it again, so the noise around the threshold
+    does not count as new outbursts.
+
+    Attributes:
+        cycles: number of outbursts after which the rule applies
+        threshold: fraction of revolting citizens starting an outburst
+        outbursts: number of outbursts so far
+        revolting: whether an outburst is going on
+    """
+
+    reason = "cycles"
+
+    def __init__(self, cycles=5, threshold=0.1):
+        self.cycles = cycles
+        self.threshold = threshold
+        self.outbursts = 0
+        self.revolting = False
+
+    def update(self, values):
+        citizens = values["Calm"] + values["Revolt"] + values["Jail"]
+        if not citizens:
+            return None
+        share = values["Revolt"] / citizens
+        if not self.revolting and share > self.threshold:
+            self.revolting = True
+            self.outbursts += 1
+        elif self.revolting and share < self.threshold / 2:
+            self.revolting = False
+        if self.outbursts >= self.cycles:
+            return self.reason
+        return None
+
+
+# Rules by the name given to World(stop=...)
+RULES = {
+    "steady": SteadyState,
+    "legitimacy": LegitimacyCollapse,
+    "no_cops": CopsKilled,
+    "cycles": Cycles,
+}
+
+
+class StopRules:
+    """
+    The stop rules of a World, updated with every collected reporter row.
+
+    Attributes:
+        rules: the rule objects, in the order they are checked
+    """
+
+    def __init__(self, rules, window=100, tolerance=0.01):
+        self.rules = []
+        for rule in rules:
+            if not isinstance(rule, str):
+                self.rules.append(rule)
+            elif rule == "steady":
+                self.rules.append(SteadyState(window, tolerance))
+            elif rule in RULES:
+                self.rules.append(RULES[rule]())
+            else:
+                raise ValueError(
+                    f"Unknown stop rule {rule!r}, use one of {', '.join(RULES)}"
+                )
+
+    def update(self, values):
+        """
+        Feeds the row to every rule. Returns the reason of the first rule
+        which applies, None if none does.
+        """
+        reason = None
+        for rule in self.rules:
+            applies = rule.update(values)
+            if reason is None:
+                reason = applies
+        return reason